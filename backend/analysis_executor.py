@@ -0,0 +1,155 @@
+"""
+AI 瑜珈教練系統 - 分析工作執行器
+將 CPU 密集的姿勢評分移出 asyncio 事件迴圈，並以有上限的佇列提供背壓
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import ANALYSIS_EXECUTOR_MODE, ANALYSIS_MAX_WORKERS, ANALYSIS_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ('inline', 'thread', 'process')
+
+
+class AnalysisQueueFull(RuntimeError):
+    """等待中的分析工作已達上限"""
+
+
+def _timed_call(fn: Callable, *args) -> Tuple[float, Any]:
+    """
+    在 worker 中執行工作並回傳開始時間
+    
+    使用 time.time()，行程池的 worker 與主行程可比較。
+    """
+    started_at = time.time()
+    return started_at, fn(*args)
+
+
+class AnalysisExecutor:
+    """
+    分析工作執行器
+    
+    - inline：直接在呼叫端（事件迴圈）執行，與原本行為相同
+    - thread：執行緒池，NumPy 運算期間會釋放 GIL
+    - process：行程池，函式與參數需可 pickle（例如 pose_analyzer.score_frames）
+    
+    等待中與執行中的工作數達到 max_pending 時，run() 立即拋出 AnalysisQueueFull，
+    而不是讓工作無限排隊、延遲越來越高。
+    """
+    
+    def __init__(self, mode: str = ANALYSIS_EXECUTOR_MODE, max_workers: int = ANALYSIS_MAX_WORKERS,
+                 max_pending: int = ANALYSIS_MAX_PENDING):
+        """
+        Args:
+            mode: 執行模式（inline、thread 或 process）
+            max_workers: worker 數量
+            max_pending: 等待中與執行中的工作上限
+        """
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"不支援的執行模式：{mode}（可用：{', '.join(EXECUTOR_MODES)}）")
+        
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: Optional[Executor] = None
+        if mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pose-analysis')
+        elif mode == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        
+        # 統計
+        self.pending = 0
+        self.peak_pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+    
+    def check_capacity(self):
+        """
+        確認還能接受新工作（在事件迴圈中呼叫，檢查後到 run() 之間沒有 await 即不會超過上限）
+        
+        Raises:
+            AnalysisQueueFull: 等待中的工作已達上限
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise AnalysisQueueFull(f"分析佇列已滿（{self.pending}/{self.max_pending}）")
+    
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        執行分析工作
+        
+        Args:
+            fn: 工作函式
+            *args: 參數
+        
+        Returns:
+            Any: fn 的回傳值
+        
+        Raises:
+            AnalysisQueueFull: 等待中的工作已達上限
+        """
+        self.check_capacity()
+        
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        self.submitted += 1
+        submitted_at = time.time()
+        try:
+            if self._executor is None:
+                started_at, result = _timed_call(fn, *args)
+            else:
+                loop = asyncio.get_running_loop()
+                started_at, result = await loop.run_in_executor(self._executor, _timed_call, fn, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        
+        finished_at = time.time()
+        wait = max(0.0, started_at - submitted_at)
+        self.completed += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.total_run += finished_at - started_at
+        return result
+    
+    def stats(self) -> Dict:
+        """
+        執行器統計（佇列深度與等待時間）
+        
+        Returns:
+            Dict: 統計資料（時間單位為毫秒）
+        """
+        completed = max(1, self.completed)
+        return {
+            'mode': self.mode,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'peak_pending': self.peak_pending,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'avg_wait_ms': round(self.total_wait / completed * 1000, 3),
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+            'avg_run_ms': round(self.total_run / completed * 1000, 3),
+        }
+    
+    def shutdown(self):
+        """關閉 worker"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("分析執行器已關閉")
@@ -4,6 +4,7 @@ AI 瑜珈教練系統 - 設定檔
 """
 
 import os
+import socket
 from pathlib import Path
 
 # 專案根目錄
@@ -13,6 +14,21 @@ BASE_DIR = Path(__file__).parent.parent
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = "yoga_coach"
 COLLECTION_SESSIONS = "sessions"
+# 連線池與逾時（毫秒）
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "20"))  # 每個 worker 的連線上限
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))  # 找不到可用伺服器
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))  # 建立連線
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "10000"))  # 單次讀寫
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2000"))  # 等待連線池空出連線
+# API 的資料庫呼叫在專屬 I/O 執行緒池執行，不阻塞事件迴圈（執行緒數不應超過連線池上限）
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+# 寫入緩衝（write-behind）：session 與姿勢寫入先合併，再以 bulk_write 批次寫入
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "1") == "1"  # 0 表示每次呼叫直接寫入
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "200"))  # 緩衝中的寫入操作達此數量時立即寫入
+DB_WRITE_MAX_DELAY_SECONDS = float(os.getenv("DB_WRITE_MAX_DELAY_SECONDS", "1.0"))  # 最舊的操作最多等待多久
+# 讀取快取：session 詳情與歷史列表（寫入時失效；TTL 限制其他 worker 寫入後的過時時間）
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "256"))  # 每種查詢最多快取幾筆，0 表示停用
+DB_CACHE_TTL_SECONDS = float(os.getenv("DB_CACHE_TTL_SECONDS", "30"))
 
 # 影片設定
 VIDEO_DIR = BASE_DIR / "videos"
@@ -30,6 +46,44 @@ CAMERA_INDEX = 0  # 預設使用第一個 USB 相機
 CAMERA_WIDTH = 1920  # 1080p
 CAMERA_HEIGHT = 1080
 CAMERA_FPS = 30
+CAMERA_THREADED = True  # 以背景執行緒持續擷取，讀取端永遠拿到最新一幀
+CAPTURE_RING_SIZE = 8  # 擷取環形緩衝區幀數（1080p 每幀約 6 MB）
+# 分析串流：擷取執行緒把每幀縮小到預先配置的緩衝區，供姿勢推論與預覽使用（None 表示停用）
+# 直接縮放到此尺寸，不保留長寬比（例如 (256, 256) 給正方形輸入的模型；landmark 為正規化座標，不受影響）
+ANALYSIS_FRAME_SIZE = (640, 360)
+
+# 錄製設定（擷取端放入佇列，專屬編碼執行緒寫檔）
+RECORDING_QUEUE_SIZE = 60  # 佇列中的影格上限（約 2 秒）
+RECORDING_QUEUE_POLICY = "drop_oldest"  # 佇列已滿時：drop_oldest（丟棄最舊影格）或 block（等待編碼）
+
+# 編碼預設（依 session 選擇；codecs 依優先順序，啟動時偵測本機 OpenCV 支援哪些編碼器，都不支援時使用 mp4v）
+# width / height / fps 為 None 時沿用來源；OpenCV 沒有位元率設定，quality（0-100）只對 MJPG 有效
+ENCODER_PRESETS = {
+    'capture': {'codecs': ['MJPG', 'mp4v']},  # 快速擷取：每幀獨立壓縮，CPU 最低，檔案最大（.avi）
+    'archival': {'codecs': ['avc1', 'mp4v']},  # 封存：H.264（可用時），檔案小、瀏覽器可直接播放
+    'preview': {'codecs': ['avc1', 'mp4v'], 'width': 640, 'height': 360, 'fps': 15},  # 預覽：縮小並降幀
+}
+RECORDING_PRESET = os.getenv("RECORDING_PRESET", "archival")  # 片段錄製的預設
+EXPORT_PRESET = os.getenv("EXPORT_PRESET", "archival")  # 合併匯出的預設
+
+# 預錄設定（未錄製時保留最近幾秒，開始片段時寫在片段開頭）
+PREROLL_SECONDS = 3.0  # 保留秒數（0 表示停用）
+PREROLL_MAX_BYTES = 24 * 1024 * 1024  # 每個 session 的壓縮影格總大小上限
+PREROLL_JPEG_QUALITY = 80  # JPEG 品質
+PREROLL_SCALE = 1.0  # 儲存前縮放比例（例如 0.5 可再節省約 3/4 記憶體，寫入時放大回原尺寸）
+
+# 影片合併設定（每個片段由一個 worker 行程標註並編碼，再依序串接）
+MERGE_MAX_WORKERS = int(os.getenv("MERGE_MAX_WORKERS", str(os.cpu_count() or 1)))  # 同時處理的片段數上限
+MERGE_PROGRESS_INTERVAL = 15  # worker 每處理多少幀回報一次進度並檢查取消
+MERGE_PROGRESS_POLL_SECONDS = 0.2  # 呼叫端回報進度的間隔（秒）
+# 標註模式：burn_in（標註繪製在影片中，需重新編碼）或 sidecar（片段直接串接不重新編碼，標註寫入 JSON 時間軸由前端顯示）
+EXPORT_ANNOTATION_MODE = os.getenv("EXPORT_ANNOTATION_MODE", "burn_in")
+
+# 影片匯出工作設定（/merge_and_export 排入背景工作，避免同時結束的 session 佔滿 CPU）
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "1"))  # 同時執行的匯出工作數（每個工作內部再平行處理片段）
+EXPORT_MAX_QUEUED = int(os.getenv("EXPORT_MAX_QUEUED", "16"))  # 排隊中的匯出工作上限，超過時拒絕（HTTP 503）
+EXPORT_JOB_RETENTION = 100  # 保留多少個已結束的工作供 /jobs/{job_id} 查詢
+EXPORT_PROGRESS_STEP = 0.01  # 進度變化達到此值才推送
 
 # MediaPipe 設定
 MP_MIN_DETECTION_CONFIDENCE = 0.5
@@ -39,7 +93,20 @@ MP_MIN_TRACKING_CONFIDENCE = 0.5
 POSE_SCORE_THRESHOLD = 70  # 分數門檻，高於此值視為正確姿勢
 ANGLE_TOLERANCE = 15  # 角度容許誤差（度）
 
-# 支援的姿勢清單
+# 串流姿勢分析設定（每個 session 的時間平滑與遲滯）
+POSE_FILTER_MIN_CUTOFF = 1.0  # One-Euro 濾波最小截止頻率（Hz），越小越平滑
+POSE_FILTER_BETA = 0.05  # 速度係數，越大對快速動作反應越快
+POSE_FILTER_D_CUTOFF = 1.0  # 速度估計的截止頻率（Hz）
+POSE_SWITCH_FRAMES = 5  # 連續多少個影格偵測到新姿勢才切換
+POSE_CHANGE_EPSILON = 0.002  # landmark 最大位移（正規化座標）低於此值時沿用上次結果
+POSE_STREAM_IDLE_SECONDS = 300  # 其他 worker 持有的 session 超過此秒數沒有影格時，移除本 worker 的串流狀態
+
+# 姿勢分析執行設定（避免 NumPy 評分阻塞 asyncio 事件迴圈）
+ANALYSIS_EXECUTOR_MODE = "thread"  # inline（在事件迴圈執行）、thread（執行緒池）或 process（行程池）
+ANALYSIS_MAX_WORKERS = 2  # 執行緒池 / 行程池的 worker 數量
+ANALYSIS_MAX_PENDING = 64  # 等待中與執行中的分析工作上限，超過時拒絕新工作（HTTP 503）
+
+# 支援的姿勢清單（規則定義於 pose_definitions.POSE_DEFINITIONS，啟動時編譯）
 SUPPORTED_POSES = [
     "Warrior II",
     "Tree Pose",
@@ -65,5 +132,21 @@ CORS_ORIGINS = [
     "http://localhost:5173",  # Vite 預設 port
 ]
 
+# 多 worker 部署設定
+# memory：session 登錄與回饋推送都在同一行程內（單一 worker）
+# file：session 登錄存於共用目錄，回饋經由本機 UDP 轉送給持有 WebSocket 的 worker
+SESSION_REGISTRY_BACKEND = os.getenv("SESSION_REGISTRY_BACKEND", "memory")
+SESSION_REGISTRY_DIR = Path(os.getenv("SESSION_REGISTRY_DIR", str(BASE_DIR / "run" / "sessions")))
+# 持有 session 的 worker 每隔 HEARTBEAT 秒更新登錄；超過 TTL 未更新的項目（worker 已當機）在 worker 啟動時與定期清除
+SESSION_REGISTRY_HEARTBEAT_SECONDS = 30
+SESSION_REGISTRY_TTL_SECONDS = 120
+FEEDBACK_BUS_HOST = os.getenv("FEEDBACK_BUS_HOST", "127.0.0.1")  # 回饋轉送監聽位址（預設只在本機迴路）
+# 回饋轉送封包以共用金鑰簽章（HMAC-SHA256），未設定時由第一個 worker 在登錄目錄建立金鑰檔（僅擁有者可讀）
+FEEDBACK_BUS_SECRET = os.getenv("FEEDBACK_BUS_SECRET", "")
+FEEDBACK_BUS_KEY_FILE = SESSION_REGISTRY_DIR / "feedback_bus.key"
+# 影格由其他 worker 分析時，偵測到姿勢後經由回饋轉送通知持有相機的 worker 開始錄製（每個 session 的最短間隔）
+SEGMENT_REQUEST_INTERVAL_SECONDS = 0.5
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")  # 每個 worker 行程的識別碼
+
 # 預設使用者 ID
 DEFAULT_USER_ID = "default_user"
@@ -1,46 +1,554 @@
 """
 AI 瑜珈教練系統 - 資料庫模組
-使用 MongoDB 儲存 session 與姿勢資料
+使用 MongoDB 儲存 session 與姿勢資料（同步 Database 與供 API 使用的 AsyncDatabase）
 """
 
-from pymongo import MongoClient, DESCENDING
+from pymongo import MongoClient, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from datetime import datetime
-from typing import List, Dict, Optional
+from functools import partial
+from typing import Any, Callable, List, Dict, Optional, Tuple
+import asyncio
+import base64
+import json
 import logging
+import threading
+import time
 
-from config import MONGODB_URL, DATABASE_NAME, COLLECTION_SESSIONS
+from config import (
+    MONGODB_URL, DATABASE_NAME, COLLECTION_SESSIONS, MONGODB_MAX_POOL_SIZE, MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    MONGODB_CONNECT_TIMEOUT_MS, MONGODB_SOCKET_TIMEOUT_MS, MONGODB_WAIT_QUEUE_TIMEOUT_MS, DB_EXECUTOR_WORKERS,
+    DB_WRITE_BEHIND, DB_WRITE_BATCH_SIZE, DB_WRITE_MAX_DELAY_SECONDS, DB_CACHE_SIZE, DB_CACHE_TTL_SECONDS
+)
+from metrics import DB_CALL_SECONDS, DB_WRITE_BATCH_OPS
 
 # 設定日誌
 logger = logging.getLogger(__name__)
 
+# 緩衝中的寫入操作：('set', 欄位, 是否 upsert) 或 ('push', 姿勢資料, False)
+PendingWrite = Tuple[str, Dict, bool]
+
+# 歷史列表需要的欄位：姿勢段落只回傳數量、影片只回傳是否存在，不傳送 poses 陣列
+HISTORY_PROJECTION = {
+    '_id': 0,
+    'session_id': 1,
+    'start_time': 1,
+    'duration_seconds': 1,
+    'avg_score': 1,
+    'poses_count': {'$size': {'$ifNull': ['$poses', []]}},
+    'video_available': {'$ne': [{'$type': '$final_video_path'}, 'missing']}
+}
+
+# 歷史列表排序（session_id 讓相同 start_time 的順序固定），與 (user_id, start_time, session_id) 複合索引一致
+HISTORY_SORT = {'start_time': DESCENDING, 'session_id': DESCENDING}
+
+
+def encode_history_cursor(session: Dict, total: int) -> str:
+    """
+    將一頁最後一筆的排序鍵編碼為分頁游標（不透明字串）
+    
+    游標同時保存第一頁查到的總數，後續頁不必再計數。
+    
+    Args:
+        session: 該頁最後一筆 session 摘要
+        total: 總數量
+    
+    Returns:
+        str: 分頁游標
+    """
+    raw = json.dumps([session['start_time'], session['session_id'], total], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_history_cursor(cursor: str) -> Tuple[str, str, int]:
+    """
+    解析分頁游標
+    
+    游標由用戶端傳回，欄位型別必須檢查後才能放進查詢條件（避免以 dict 注入 $ne 等運算子）。
+    
+    Args:
+        cursor: encode_history_cursor 產生的游標
+    
+    Returns:
+        Tuple[str, str, int]: (start_time, session_id, 總數量)
+    
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        start_time, session_id, total = json.loads(raw)
+        if (not isinstance(start_time, str) or not isinstance(session_id, str)
+                or not isinstance(total, int) or isinstance(total, bool) or total < 0):
+            raise TypeError(cursor)
+        return start_time, session_id, total
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"無效的分頁游標：{cursor}") from e
+
+
+class WriteBehindBuffer:
+    """
+    session 寫入緩衝（write-behind）
+    
+    save_session / update_session_poses / update_session_final_info 先依 session 放入緩衝，
+    由背景執行緒合併為 bulk_write 批次寫入：
+    - 緩衝中的操作數達到 max_ops 時立即寫入
+    - 最舊的操作等待超過 max_delay 秒時寫入
+    - flush() / close() 時寫入全部
+    
+    同一 session 的操作依序寫入，連續的 $set 合併為一個、連續的 $push 合併為 $each。
+    讀取 session 時以 overlay() 套用尚未寫入的操作；寫入中（bulk_write 尚未回傳）的讀取會等待寫入完成，
+    避免同一操作被重複套用。跨 session 的查詢以 flush(user_id) 只寫入該使用者的 session
+    （由含 user_id 的 $set 得知擁有者；不知道擁有者的 session 一併寫入）。
+    """
+    
+    # 記住擁有者的 session 數上限（超過時忘記最舊的，之後視為擁有者不明）
+    MAX_KNOWN_OWNERS = 10000
+    
+    def __init__(self, collection, max_ops: int = DB_WRITE_BATCH_SIZE, max_delay: float = DB_WRITE_MAX_DELAY_SECONDS):
+        """
+        Args:
+            collection: MongoDB collection（提供 bulk_write）
+            max_ops: 緩衝中的操作數上限
+            max_delay: 最舊的操作最多等待秒數
+        """
+        self.collection = collection
+        self.max_ops = max(1, max_ops)
+        self.max_delay = max(0.0, max_delay)
+        
+        self._pending: Dict[str, List[PendingWrite]] = {}  # 依第一次寫入的順序
+        self._count = 0
+        self._oldest = 0.0
+        self._retry_after = 0.0  # 寫入失敗後，下一次重試的時間
+        self._inflight: set = set()  # 寫入中的 session
+        self._owners: OrderedDict = OrderedDict()  # session_id → user_id
+        self._cond = threading.Condition()
+        self._flush_lock = threading.RLock()  # 同一時間只有一個批次寫入
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        
+        # 統計
+        self.buffered = 0
+        self.flushed_ops = 0
+        self.batches = 0
+        self.failed_batches = 0
+    
+    @property
+    def pending(self) -> int:
+        """緩衝中尚未寫入的操作數"""
+        return self._count
+    
+    def add(self, session_id: str, kind: str, payload: Dict, upsert: bool = False):
+        """
+        放入一個寫入操作（立即返回）
+        
+        Args:
+            session_id: Session ID
+            kind: set（$set 欄位）或 push（$push 到 poses）
+            payload: 欄位或姿勢資料（會複製，呼叫端之後修改不影響）
+            upsert: session 不存在時是否建立（僅 set）
+        """
+        with self._cond:
+            if not self._running:
+                self._start()
+            if self._count == 0:
+                self._oldest = time.monotonic()
+            self._pending.setdefault(session_id, []).append((kind, deepcopy(payload), upsert))
+            if kind == 'set' and 'user_id' in payload:
+                self._owners[session_id] = payload['user_id']
+                self._owners.move_to_end(session_id)
+                if len(self._owners) > self.MAX_KNOWN_OWNERS:
+                    self._owners.popitem(last=False)
+            self._count += 1
+            self.buffered += 1
+            # 第一個操作（開始計時）或達到上限時喚醒寫入執行緒
+            if self._count == 1 or self._count >= self.max_ops:
+                self._cond.notify()
+    
+    def _start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, name='db-write-behind', daemon=True)
+        self._thread.start()
+    
+    def _flush_loop(self):
+        """寫入執行緒：等待數量或時間條件成立後寫入"""
+        while True:
+            with self._cond:
+                while self._running:
+                    if self._count == 0:
+                        self._cond.wait()
+                        continue
+                    due = self._oldest + self.max_delay if self._count < self.max_ops else 0.0
+                    remaining = max(due, self._retry_after) - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._running:
+                    return
+            self.flush()
+    
+    def has_pending(self, session_id: str) -> bool:
+        """session 是否有尚未寫入（或寫入中）的操作"""
+        with self._cond:
+            return session_id in self._pending or session_id in self._inflight
+    
+    @staticmethod
+    def _merge(ops: List[PendingWrite]) -> List[List]:
+        """合併同一 session 連續的同類操作：[[kind, payload, upsert, 原始操作數], ...]"""
+        merged: List[List] = []
+        for kind, payload, upsert in ops:
+            if merged and merged[-1][0] == kind:
+                if kind == 'set':
+                    merged[-1][1].update(payload)
+                    merged[-1][2] = merged[-1][2] or upsert
+                else:
+                    merged[-1][1].append(payload)
+                merged[-1][3] += 1
+            else:
+                merged.append([kind, dict(payload) if kind == 'set' else [payload], upsert, 1])
+        return merged
+    
+    @staticmethod
+    def _request(session_id: str, kind: str, payload, upsert: bool) -> UpdateOne:
+        if kind == 'set':
+            return UpdateOne({'session_id': session_id}, {'$set': payload}, upsert=upsert)
+        poses = payload[0] if len(payload) == 1 else {'$each': payload}
+        return UpdateOne({'session_id': session_id}, {'$push': {'poses': poses}})
+    
+    def _take(self, user_id: Optional[str]) -> Dict[str, List[PendingWrite]]:
+        """取出要寫入的操作（持有 _cond）：user_id 為 None 時取出全部，否則只取該使用者與擁有者不明的 session"""
+        if user_id is None:
+            batch, self._pending = self._pending, {}
+            return batch
+        batch = {}
+        for session_id in list(self._pending):
+            if self._owners.get(session_id, user_id) == user_id:
+                batch[session_id] = self._pending.pop(session_id)
+        return batch
+    
+    def flush(self, user_id: Optional[str] = None) -> int:
+        """
+        寫入緩衝中的操作（單一 bulk_write）
+        
+        寫入失敗時保留尚未寫入的操作，下一次再試；批次中單一操作被拒絕時只捨棄該操作。
+        
+        Args:
+            user_id: 只寫入此使用者的 session（歷史查詢前使用，其他使用者的操作繼續累積）；None 表示全部
+        
+        Returns:
+            int: 成功寫入的操作數
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch = self._take(user_id)
+                count = sum(len(ops) for ops in batch.values())
+                self._count -= count
+                self._inflight = set(batch)
+            if not batch:
+                return 0
+            
+            requests = []
+            sources: List[Tuple[str, int]] = []  # 每個請求對應的 (session_id, 原始操作數)
+            for session_id, ops in batch.items():
+                merged = self._merge(ops)
+                for kind, payload, upsert, n in merged:
+                    requests.append(self._request(session_id, kind, payload, upsert))
+                    sources.append((session_id, n))
+            
+            try:
+                with DB_CALL_SECONDS.time(operation='bulk_write'):
+                    self.collection.bulk_write(requests, ordered=True)
+                written = count
+            except BulkWriteError as e:
+                # ordered：失敗的請求之前都已寫入，之後的重新排入緩衝
+                failed_index = e.details['writeErrors'][0]['index']
+                logger.error(f"批次寫入被拒絕，捨棄 Session {sources[failed_index][0]} 的操作：{e.details['writeErrors'][0]}")
+                written = sum(n for _, n in sources[:failed_index])
+                self._requeue(batch, sources[failed_index + 1:])
+                self.failed_batches += 1
+            except Exception as e:
+                logger.error(f"批次寫入失敗，{count} 個操作保留在緩衝中：{e}")
+                written = 0
+                self._requeue(batch, sources)
+                self.failed_batches += 1
+            finally:
+                with self._cond:
+                    self._inflight = set()
+            
+            self.batches += 1
+            self.flushed_ops += written
+            DB_WRITE_BATCH_OPS.observe(count)
+            logger.debug(f"批次寫入 {written}/{count} 個操作（{len(requests)} 個請求）")
+            return written
+    
+    def _requeue(self, batch: Dict[str, List[PendingWrite]], sources: List[Tuple[str, int]]):
+        """把未寫入的請求對應的操作放回緩衝最前面（保持同一 session 的順序）"""
+        remaining: Dict[str, int] = {}
+        for session_id, n in sources:
+            remaining[session_id] = remaining.get(session_id, 0) + n
+        if not remaining:
+            return
+        
+        with self._cond:
+            pending = {session_id: batch[session_id][-n:] for session_id, n in remaining.items()}
+            for session_id, ops in self._pending.items():
+                pending.setdefault(session_id, []).extend(ops)
+            self._pending = pending
+            self._count += sum(remaining.values())
+            self._oldest = time.monotonic()
+            # 資料庫無法連線時避免持續重試
+            self._retry_after = self._oldest + max(self.max_delay, 1.0)
+    
+    def overlay(self, session_id: str, read: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """
+        讀取 session 並套用尚未寫入的操作
+        
+        Args:
+            session_id: Session ID
+            read: 從資料庫讀取 session 的函式
+        
+        Returns:
+            Optional[Dict]: 包含緩衝中寫入的 session 資料
+        """
+        if not self.has_pending(session_id):
+            return read()
+        
+        # 持有 flush 鎖期間不會有操作寫入資料庫，讀到的文件加上緩衝中的操作即為最新狀態
+        with self._flush_lock:
+            with self._cond:
+                ops = list(self._pending.get(session_id, ()))
+            document = read()
+        
+        for kind, payload, upsert in ops:
+            if document is None:
+                if not (kind == 'set' and upsert):
+                    continue
+                document = {'session_id': session_id}
+            if kind == 'set':
+                document.update(deepcopy(payload))
+            else:
+                document.setdefault('poses', []).append(deepcopy(payload))
+        return document
+    
+    def discard(self, session_id: str) -> int:
+        """
+        捨棄 session 尚未寫入的操作（刪除 session 前呼叫）
+        
+        Returns:
+            int: 捨棄的操作數
+        """
+        with self._flush_lock:
+            with self._cond:
+                ops = self._pending.pop(session_id, [])
+                self._count -= len(ops)
+        return len(ops)
+    
+    def stats(self) -> Dict:
+        """
+        緩衝統計
+        
+        Returns:
+            Dict: 統計資料
+        """
+        return {
+            'pending': self._count,
+            'buffered': self.buffered,
+            'flushed': self.flushed_ops,
+            'batches': self.batches,
+            'failed_batches': self.failed_batches,
+        }
+    
+    def close(self):
+        """停止寫入執行緒並寫入剩餘的操作"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.flush()
+        if self._count:
+            logger.error(f"關閉時仍有 {self._count} 個寫入操作未能寫入資料庫")
+
+
+class ReadCache:
+    """
+    讀取快取（read-through，LRU + TTL）
+    
+    get_or_load() 命中時直接回傳，否則呼叫 loader 並保存結果：
+    - 超過 max_entries 時淘汰最久未使用的項目
+    - 保存超過 ttl 秒的項目視為未命中
+    - loader 執行期間若有項目失效，結果不保存（避免寫入後又放回過時的資料）
+    
+    快取的值由所有呼叫端共用，不可修改。
+    """
+    
+    def __init__(self, max_entries: int = DB_CACHE_SIZE, ttl: float = DB_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_entries: 最多保存幾筆（0 表示停用，每次都呼叫 loader）
+            ttl: 保存秒數
+            clock: 時間來源（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[Any, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get_or_load(self, key, loader: Callable[[], Any]):
+        """
+        取得快取值，未命中時呼叫 loader（loader 回傳 None 或拋出例外時不保存）
+        
+        Args:
+            key: 快取鍵
+            loader: 讀取資料的函式
+        
+        Returns:
+            快取值或 loader 的結果
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() < entry[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            version = self._version
+        
+        value = loader()
+        if value is None or self.max_entries <= 0:
+            return value
+        
+        with self._lock:
+            if self._version == version:
+                self._entries[key] = (self.clock() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+    
+    def peek(self, key):
+        """取得未過期的快取值，不計入命中統計（沒有時回傳 None）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None and self.clock() < entry[0] else None
+    
+    def invalidate(self, key) -> bool:
+        """
+        使單一項目失效
+        
+        Returns:
+            bool: 是否有項目被移除
+        """
+        with self._lock:
+            self._version += 1
+            return self._entries.pop(key, None) is not None
+    
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> int:
+        """
+        使符合條件的項目失效
+        
+        Args:
+            predicate: 以快取鍵判斷是否移除
+        
+        Returns:
+            int: 移除的項目數
+        """
+        with self._lock:
+            self._version += 1
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+    
+    def stats(self) -> Dict:
+        """
+        快取統計
+        
+        Returns:
+            Dict: 統計資料（hit_rate 為命中次數 / 查詢次數）
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
 
 class Database:
     """MongoDB 資料庫管理類別"""
     
-    def __init__(self, connection_string=MONGODB_URL, db_name=DATABASE_NAME):
+    def __init__(self, connection_string=MONGODB_URL, db_name=DATABASE_NAME,
+                 max_pool_size: int = MONGODB_MAX_POOL_SIZE,
+                 server_selection_timeout_ms: int = MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                 connect_timeout_ms: int = MONGODB_CONNECT_TIMEOUT_MS,
+                 socket_timeout_ms: int = MONGODB_SOCKET_TIMEOUT_MS,
+                 wait_queue_timeout_ms: int = MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+                 write_behind: bool = DB_WRITE_BEHIND, cache_size: int = DB_CACHE_SIZE,
+                 cache_ttl: float = DB_CACHE_TTL_SECONDS):
         """
         初始化資料庫連接
         
         Args:
             connection_string: MongoDB 連接字串
             db_name: 資料庫名稱
+            max_pool_size: 連線池上限（MongoClient 可在多個執行緒中共用）
+            server_selection_timeout_ms: 找不到可用伺服器的逾時（毫秒）
+            connect_timeout_ms: 建立連線的逾時（毫秒）
+            socket_timeout_ms: 單次讀寫的逾時（毫秒）
+            wait_queue_timeout_ms: 等待連線池空出連線的逾時（毫秒）
+            write_behind: 是否以寫入緩衝批次寫入 session 與姿勢資料（見 WriteBehindBuffer）
+            cache_size: session 詳情與歷史列表快取各保存幾筆（0 表示停用，見 ReadCache）
+            cache_ttl: 快取保存秒數
         """
         try:
-            self.client = MongoClient(connection_string)
+            self.client = MongoClient(
+                connection_string,
+                maxPoolSize=max_pool_size,
+                serverSelectionTimeoutMS=server_selection_timeout_ms,
+                connectTimeoutMS=connect_timeout_ms,
+                socketTimeoutMS=socket_timeout_ms,
+                waitQueueTimeoutMS=wait_queue_timeout_ms
+            )
             self.db = self.client[db_name]
             self.sessions = self.db[COLLECTION_SESSIONS]
             
             # 建立索引（提升查詢效能）
             self.sessions.create_index([("session_id", 1)], unique=True)
-            self.sessions.create_index([("user_id", 1)])
             self.sessions.create_index([("start_time", DESCENDING)])
+            # 歷史列表的游標分頁：等值 user_id + 範圍 (start_time, session_id)，也涵蓋只查 user_id 的查詢
+            self.sessions.create_index([("user_id", 1), ("start_time", DESCENDING), ("session_id", DESCENDING)])
             
-            logger.info(f"資料庫連接成功：{db_name}")
+            self.write_buffer = WriteBehindBuffer(self.sessions) if write_behind else None
+            # 鍵：session_id / (user_id, limit, skip, cursor)
+            self.session_cache = ReadCache(cache_size, cache_ttl)
+            self.history_cache = ReadCache(cache_size, cache_ttl)
             
+            logger.info(f"資料庫連接成功：{db_name}")
+        
         except Exception as e:
             logger.error(f"資料庫連接失敗：{e}")
             raise
     
+    @DB_CALL_SECONDS.timed(operation='save_session')
     def save_session(self, session_data: Dict) -> bool:
         """
         儲存 session 資料
@@ -60,19 +568,27 @@ class Database:
                     return False
             
             # 使用 upsert 模式（如果存在則更新，否則插入）
+            if self.write_buffer is not None:
+                self.write_buffer.add(session_data['session_id'], 'set', session_data, upsert=True)
+                self._invalidate_cache(session_data['session_id'], session_data['user_id'])
+                logger.info(f"Session 已排入寫入緩衝：{session_data['session_id']}")
+                return True
+            
             result = self.sessions.update_one(
                 {'session_id': session_data['session_id']},
                 {'$set': session_data},
                 upsert=True
             )
+            self._invalidate_cache(session_data['session_id'], session_data['user_id'])
             
             logger.info(f"Session 已儲存：{session_data['session_id']}")
             return True
-            
+        
         except Exception as e:
             logger.error(f"儲存 session 失敗：{e}")
             return False
     
+    @DB_CALL_SECONDS.timed(operation='get_session')
     def get_session(self, session_id: str) -> Optional[Dict]:
         """
         取得單一 session 資料
@@ -81,19 +597,27 @@ class Database:
             session_id: Session ID
         
         Returns:
-            Dict: Session 資料或 None
+            Dict: Session 資料或 None（經由 session_cache，回傳值不可修改）
         """
         try:
-            session = self.sessions.find_one(
-                {'session_id': session_id},
-                {'_id': 0}  # 不回傳 MongoDB 的 _id
-            )
-            return session
-            
+            return self.session_cache.get_or_load(session_id, partial(self._read_session, session_id))
+        
         except Exception as e:
             logger.error(f"取得 session 失敗：{e}")
             return None
     
+    def _read_session(self, session_id: str) -> Optional[Dict]:
+        """從 MongoDB 讀取 session，並套用寫入緩衝中尚未寫入的操作"""
+        read = partial(
+            self.sessions.find_one,
+            {'session_id': session_id},
+            {'_id': 0}  # 不回傳 MongoDB 的 _id
+        )
+        if self.write_buffer is not None:
+            return self.write_buffer.overlay(session_id, read)
+        return read()
+    
+    @DB_CALL_SECONDS.timed(operation='get_user_history')
     def get_user_history(self, user_id: str, limit: int = 20, skip: int = 0) -> List[Dict]:
         """
         取得使用者歷史記錄
@@ -107,6 +631,7 @@ class Database:
             List[Dict]: Session 列表
         """
         try:
+            self._flush_before_query(user_id)
             sessions = list(
                 self.sessions.find(
                     {'user_id': user_id},
@@ -119,11 +644,89 @@ class Database:
             
             logger.info(f"取得使用者 {user_id} 的 {len(sessions)} 筆歷史記錄")
             return sessions
-            
+        
         except Exception as e:
             logger.error(f"取得歷史記錄失敗：{e}")
             return []
     
+    @DB_CALL_SECONDS.timed(operation='get_user_history_page')
+    def get_user_history_page(self, user_id: str, limit: int = 20, skip: int = 0,
+                              cursor: Optional[str] = None) -> Tuple[List[Dict], int, Optional[str]]:
+        """
+        以單一 aggregation 取得使用者歷史記錄的一頁與總數
+        
+        第一頁以 $facet 在同一次查詢中分頁與計數；帶 cursor 時改為 keyset 分頁：
+        從上一頁最後一筆的 (start_time, session_id) 之後沿複合索引讀取，成本與頁數深度無關，
+        總數沿用游標中保存的值。每筆只投影 HISTORY_PROJECTION 的欄位。
+        結果經由 history_cache 快取，該使用者的 session 寫入時失效。
+        
+        Args:
+            user_id: 使用者 ID
+            limit: 回傳筆數限制（0 表示不限制）
+            skip: 跳過筆數（未帶 cursor 時使用）
+            cursor: 上一頁回傳的 next_cursor
+        
+        Returns:
+            Tuple[List[Dict], int, Optional[str]]: (Session 摘要列表, 總數量, 下一頁游標；沒有下一頁時為 None)
+        
+        Raises:
+            ValueError: 游標格式錯誤
+        """
+        position = decode_history_cursor(cursor) if cursor else None
+        
+        try:
+            return self.history_cache.get_or_load(
+                (user_id, limit, skip, cursor),
+                partial(self._query_history_page, user_id, limit, skip, position)
+            )
+        
+        except Exception as e:
+            logger.error(f"取得歷史記錄失敗：{e}")
+            return [], 0, None
+    
+    def _query_history_page(self, user_id: str, limit: int, skip: int,
+                            position: Optional[Tuple[str, str, int]]) -> Tuple[List[Dict], int, Optional[str]]:
+        """執行 get_user_history_page 的 aggregation（position 為解析後的游標）"""
+        self._flush_before_query(user_id)
+        # 多取一筆判斷是否還有下一頁
+        page = [{'$limit': limit + 1}] if limit > 0 else []
+        page.append({'$project': HISTORY_PROJECTION})
+        
+        if position is None:
+            pipeline = [
+                {'$match': {'user_id': user_id}},
+                {'$sort': HISTORY_SORT},
+                {'$facet': {
+                    'sessions': [{'$skip': skip}] + page,
+                    'total': [{'$count': 'count'}]
+                }}
+            ]
+            result = next(self.sessions.aggregate(pipeline), {})
+            sessions = result.get('sessions', [])
+            total = result['total'][0]['count'] if result.get('total') else 0
+        else:
+            start_time, last_session_id, total = position
+            pipeline = [
+                {'$match': {
+                    'user_id': user_id,
+                    '$or': [
+                        {'start_time': {'$lt': start_time}},
+                        {'start_time': start_time, 'session_id': {'$lt': last_session_id}}
+                    ]
+                }},
+                {'$sort': HISTORY_SORT}
+            ] + page
+            sessions = list(self.sessions.aggregate(pipeline))
+        
+        next_cursor = None
+        if limit > 0 and len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = encode_history_cursor(sessions[-1], total)
+        
+        logger.info(f"取得使用者 {user_id} 的 {len(sessions)} 筆歷史記錄（共 {total} 筆）")
+        return sessions, total, next_cursor
+    
+    @DB_CALL_SECONDS.timed(operation='get_total_sessions_count')
     def get_total_sessions_count(self, user_id: str) -> int:
         """
         取得使用者總 session 數量
@@ -135,12 +738,14 @@ class Database:
             int: 總數量
         """
         try:
+            self._flush_before_query(user_id)
             count = self.sessions.count_documents({'user_id': user_id})
             return count
         except Exception as e:
             logger.error(f"取得總數失敗：{e}")
             return 0
     
+    @DB_CALL_SECONDS.timed(operation='update_session_poses')
     def update_session_poses(self, session_id: str, pose_data: Dict) -> bool:
         """
         更新 session 的姿勢資料（新增一個姿勢片段）
@@ -153,10 +758,17 @@ class Database:
             bool: 是否成功更新
         """
         try:
+            if self.write_buffer is not None:
+                self.write_buffer.add(session_id, 'push', pose_data)
+                self._invalidate_cache(session_id)
+                logger.info(f"Session {session_id} 姿勢資料已排入寫入緩衝")
+                return True
+            
             result = self.sessions.update_one(
                 {'session_id': session_id},
                 {'$push': {'poses': pose_data}}
             )
+            self._invalidate_cache(session_id)
             
             if result.modified_count > 0:
                 logger.info(f"Session {session_id} 已新增姿勢資料")
@@ -164,11 +776,12 @@ class Database:
             else:
                 logger.warning(f"Session {session_id} 未找到或未更新")
                 return False
-                
+        
         except Exception as e:
             logger.error(f"更新姿勢資料失敗：{e}")
             return False
     
+    @DB_CALL_SECONDS.timed(operation='update_session_final_info')
     def update_session_final_info(self, session_id: str, duration_seconds: int, 
                                   avg_score: float, video_path: str) -> bool:
         """
@@ -184,15 +797,23 @@ class Database:
             bool: 是否成功更新
         """
         try:
+            final_info = {
+                'duration_seconds': duration_seconds,
+                'avg_score': avg_score,
+                'final_video_path': video_path,
+                'end_time': datetime.utcnow().isoformat()
+            }
+            if self.write_buffer is not None:
+                self.write_buffer.add(session_id, 'set', final_info)
+                self._invalidate_cache(session_id)
+                logger.info(f"Session {session_id} 最終資訊已排入寫入緩衝")
+                return True
+            
             result = self.sessions.update_one(
                 {'session_id': session_id},
-                {'$set': {
-                    'duration_seconds': duration_seconds,
-                    'avg_score': avg_score,
-                    'final_video_path': video_path,
-                    'end_time': datetime.utcnow().isoformat()
-                }}
+                {'$set': final_info}
             )
+            self._invalidate_cache(session_id)
             
             if result.modified_count > 0:
                 logger.info(f"Session {session_id} 最終資訊已更新")
@@ -200,11 +821,12 @@ class Database:
             else:
                 logger.warning(f"Session {session_id} 未找到或未更新")
                 return False
-                
+        
         except Exception as e:
             logger.error(f"更新最終資訊失敗：{e}")
             return False
     
+    @DB_CALL_SECONDS.timed(operation='delete_session')
     def delete_session(self, session_id: str) -> bool:
         """
         刪除 session
@@ -216,7 +838,10 @@ class Database:
             bool: 是否成功刪除
         """
         try:
+            if self.write_buffer is not None:
+                self.write_buffer.discard(session_id)
             result = self.sessions.delete_one({'session_id': session_id})
+            self._invalidate_cache(session_id)
             
             if result.deleted_count > 0:
                 logger.info(f"Session {session_id} 已刪除")
@@ -224,34 +849,222 @@ class Database:
             else:
                 logger.warning(f"Session {session_id} 未找到")
                 return False
-                
+        
         except Exception as e:
             logger.error(f"刪除 session 失敗：{e}")
             return False
     
+    def _invalidate_cache(self, session_id: str, user_id: Optional[str] = None):
+        """
+        session 寫入後使快取失效（寫入之後才呼叫，讀取中的過時結果不會被保存）
+        
+        Args:
+            session_id: Session ID
+            user_id: 使用者 ID（未提供時由快取中的 session 取得；仍不知道時清除所有歷史列表）
+        """
+        if user_id is None:
+            cached = self.session_cache.peek(session_id)
+            user_id = cached.get('user_id') if cached else None
+        self.session_cache.invalidate(session_id)
+        if user_id is None:
+            self.history_cache.invalidate_where(lambda key: True)
+        else:
+            self.history_cache.invalidate_where(lambda key: key[0] == user_id)
+    
+    def cache_stats(self) -> Dict:
+        """
+        讀取快取統計
+        
+        Returns:
+            Dict: {'session': ..., 'history': ...}（見 ReadCache.stats）
+        """
+        return {'session': self.session_cache.stats(), 'history': self.history_cache.stats()}
+    
+    def _flush_before_query(self, user_id: str):
+        """使用者的跨 session 查詢（歷史、總數）前先寫入該使用者在緩衝中的操作，結果包含所有已接受的寫入"""
+        if self.write_buffer is not None:
+            self.write_buffer.flush(user_id)
+    
+    def flush(self) -> int:
+        """
+        立即寫入寫入緩衝中的操作
+        
+        Returns:
+            int: 寫入的操作數
+        """
+        if self.write_buffer is None:
+            return 0
+        return self.write_buffer.flush()
+    
     def close(self):
-        """關閉資料庫連接"""
+        """寫入緩衝中的操作並關閉資料庫連接"""
+        if self.write_buffer is not None:
+            self.write_buffer.close()
         if self.client:
             self.client.close()
             logger.info("資料庫連接已關閉")
 
 
+class AsyncDatabase:
+    """
+    非同步資料庫介面（供 async 端點使用）
+    
+    在專屬的 I/O 執行緒池中呼叫同步 Database 的方法，MongoDB 往返期間不阻塞事件迴圈；
+    同時到達的請求（例如多個歷史查詢）由不同執行緒並行處理，共用同一個 pymongo 連線池。
+    第一次呼叫時才在執行緒中建立 Database（連線與建立索引也不在事件迴圈執行）。
+    """
+    
+    def __init__(self, database_factory: Optional[Callable[[], Database]] = None,
+                 max_workers: int = DB_EXECUTOR_WORKERS):
+        """
+        Args:
+            database_factory: 取得同步 Database 的函式（預設為 get_database，與腳本共用同一個連線池）
+            max_workers: I/O 執行緒數
+        """
+        self.database_factory = database_factory or get_database
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._database: Optional[Database] = None  # 已建立的 Database（第一次呼叫後）
+        
+        # 統計
+        self.pending = 0
+        self.peak_pending = 0
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """I/O 執行緒池（shutdown 後再次呼叫時重新建立）"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='db-io')
+        return self._executor
+    
+    def _invoke(self, method: str, *args, **kwargs) -> Any:
+        """I/O 執行緒：呼叫同步 Database 的方法"""
+        self._database = self.database_factory()
+        return getattr(self._database, method)(*args, **kwargs)
+    
+    async def _call(self, method: str, *args, **kwargs) -> Any:
+        """在 I/O 執行緒池中執行 Database 方法"""
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await loop.run_in_executor(self.executor, partial(self._invoke, method, *args, **kwargs))
+        finally:
+            self.pending -= 1
+    
+    async def connect(self) -> Database:
+        """建立（或取得）資料庫連接"""
+        loop = asyncio.get_running_loop()
+        self._database = await loop.run_in_executor(self.executor, self.database_factory)
+        return self._database
+    
+    async def save_session(self, session_data: Dict) -> bool:
+        """儲存 session 資料（見 Database.save_session）"""
+        return await self._call('save_session', session_data)
+    
+    async def get_session(self, session_id: str) -> Optional[Dict]:
+        """取得單一 session 資料（見 Database.get_session）"""
+        return await self._call('get_session', session_id)
+    
+    async def get_user_history(self, user_id: str, limit: int = 20, skip: int = 0) -> List[Dict]:
+        """取得使用者歷史記錄（見 Database.get_user_history）"""
+        return await self._call('get_user_history', user_id, limit, skip)
+    
+    async def get_user_history_page(self, user_id: str, limit: int = 20, skip: int = 0,
+                                    cursor: Optional[str] = None) -> Tuple[List[Dict], int, Optional[str]]:
+        """取得使用者歷史記錄的一頁、總數與下一頁游標（見 Database.get_user_history_page）"""
+        return await self._call('get_user_history_page', user_id, limit, skip, cursor)
+    
+    async def get_total_sessions_count(self, user_id: str) -> int:
+        """取得使用者總 session 數量（見 Database.get_total_sessions_count）"""
+        return await self._call('get_total_sessions_count', user_id)
+    
+    async def update_session_poses(self, session_id: str, pose_data: Dict) -> bool:
+        """新增一個姿勢片段（見 Database.update_session_poses）"""
+        return await self._call('update_session_poses', session_id, pose_data)
+    
+    async def update_session_final_info(self, session_id: str, duration_seconds: int,
+                                        avg_score: float, video_path: str) -> bool:
+        """更新 session 最終資訊（見 Database.update_session_final_info）"""
+        return await self._call('update_session_final_info', session_id, duration_seconds, avg_score, video_path)
+    
+    async def delete_session(self, session_id: str) -> bool:
+        """刪除 session（見 Database.delete_session）"""
+        return await self._call('delete_session', session_id)
+    
+    async def flush(self) -> int:
+        """立即寫入寫入緩衝中的操作（見 Database.flush），尚未連線時不做任何事"""
+        if self._database is None:
+            return 0
+        return await self._call('flush')
+    
+    def stats(self) -> Dict:
+        """
+        I/O 執行緒池統計
+        
+        Returns:
+            Dict: 統計資料
+        """
+        return {
+            'max_workers': self.max_workers,
+            'pending': self.pending,
+            'peak_pending': self.peak_pending,
+        }
+    
+    def cache_stats(self) -> Dict:
+        """
+        讀取快取統計（尚未建立 Database 時為空）
+        
+        Returns:
+            Dict: 見 Database.cache_stats
+        """
+        if self._database is None or not hasattr(self._database, 'cache_stats'):
+            return {}
+        return self._database.cache_stats()
+    
+    def shutdown(self):
+        """等待進行中的呼叫完成並關閉 I/O 執行緒"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("資料庫 I/O 執行緒已關閉")
+
+
 # 全域資料庫實例（單例模式）
 _db_instance = None
+_async_db_instance = None
+_db_lock = threading.Lock()
 
 def get_database() -> Database:
     """
-    取得資料庫實例（單例模式）
+    取得資料庫實例（單例模式，可在多個執行緒中呼叫）
     
     Returns:
         Database: 資料庫實例
     """
     global _db_instance
     if _db_instance is None:
-        _db_instance = Database()
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = Database()
     return _db_instance
 
 
+def get_async_database() -> AsyncDatabase:
+    """
+    取得非同步資料庫介面（單例模式，與 get_database 共用連線）
+    
+    Returns:
+        AsyncDatabase: 非同步資料庫介面
+    """
+    global _async_db_instance
+    if _async_db_instance is None:
+        with _db_lock:
+            if _async_db_instance is None:
+                _async_db_instance = AsyncDatabase()
+    return _async_db_instance
+
+
 if __name__ == "__main__":
     # 測試資料庫連接
     logging.basicConfig(level=logging.INFO)
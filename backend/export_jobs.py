@@ -0,0 +1,258 @@
+"""
+AI 瑜珈教練系統 - 影片匯出工作模組
+將影片合併與匯出改為背景工作：立即回傳工作 ID，以有上限的佇列與並行數控制 CPU 使用
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import EXPORT_MAX_CONCURRENT, EXPORT_MAX_QUEUED, EXPORT_JOB_RETENTION, EXPORT_PROGRESS_STEP, WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+# 工作狀態
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# 工作函式：(進度回呼, 取消旗標) -> 結果，在工作執行緒中執行
+JobFunction = Callable[[Callable[[float], None], threading.Event], Dict]
+# 工作狀態改變時的處理函式（在事件迴圈中執行）
+JobListener = Callable[[Dict], Awaitable[None]]
+
+
+class ExportQueueFull(RuntimeError):
+    """等待中與執行中的匯出工作已達上限"""
+
+
+class ExportJobManager:
+    """
+    匯出工作管理器
+    
+    同時最多執行 max_concurrent 個工作，其餘排隊；排隊數達到 max_queued 時拒絕新工作。
+    工作狀態寫入 store（session 登錄），多個 worker 時任一 worker 都能查詢。
+    """
+    
+    def __init__(self, store, max_concurrent: int = EXPORT_MAX_CONCURRENT, max_queued: int = EXPORT_MAX_QUEUED,
+                 on_update: Optional[JobListener] = None, retention: int = EXPORT_JOB_RETENTION):
+        """
+        Args:
+            store: 工作狀態儲存（提供 set_job / get_job / remove_job，例如 SessionRegistry）
+            max_concurrent: 同時執行的工作數
+            max_queued: 排隊中的工作上限
+            on_update: 工作狀態或進度改變時的處理函式（例如推送到 WebSocket）
+            retention: 保留多少個已結束的工作供查詢
+        """
+        self.store = store
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.on_update = on_update
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='export-job')
+        self._jobs: Dict[str, Dict] = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._session_jobs: Dict[str, str] = {}
+        self._finished = deque()
+        
+        # 統計
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+    
+    @property
+    def active(self) -> int:
+        """排隊中與執行中的工作數"""
+        return len(self._cancel_events)
+    
+    @property
+    def running(self) -> int:
+        """執行中的工作數"""
+        return sum(1 for job_id in self._cancel_events if self._jobs[job_id]['status'] == JOB_RUNNING)
+    
+    def has_active_job(self, session_id: str) -> bool:
+        """session 是否有排隊中或執行中的工作（只包含本 worker 的工作）"""
+        return session_id in self._session_jobs
+    
+    def submit(self, session_id: str, fn: JobFunction) -> Dict:
+        """
+        新增匯出工作（在事件迴圈中呼叫）
+        
+        同一 session 已有未結束的工作時回傳該工作，不重複建立。
+        
+        Args:
+            session_id: Session ID
+            fn: 工作函式
+        
+        Returns:
+            Dict: 工作狀態
+        
+        Raises:
+            ExportQueueFull: 排隊中的工作已達上限
+        """
+        existing = self._session_jobs.get(session_id)
+        if existing is not None:
+            return dict(self._jobs[existing])
+        
+        if self.active >= self.max_concurrent + self.max_queued:
+            self.rejected += 1
+            raise ExportQueueFull(f"匯出佇列已滿（{self.active}/{self.max_concurrent + self.max_queued}）")
+        
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'session_id': session_id,
+            'worker_id': WORKER_ID,
+            'status': JOB_QUEUED,
+            'progress': 0.0,
+            'result': None,
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+        }
+        job_id = job['job_id']
+        self._jobs[job_id] = job
+        self._cancel_events[job_id] = threading.Event()
+        self._session_jobs[session_id] = job_id
+        self.submitted += 1
+        self.store.set_job(job_id, job)
+        
+        asyncio.ensure_future(self._run(job, fn))
+        logger.info(f"匯出工作已排入：{job_id}（Session {session_id}）")
+        return dict(job)
+    
+    async def _run(self, job: Dict, fn: JobFunction):
+        """執行工作並更新狀態"""
+        loop = asyncio.get_running_loop()
+        cancel_event = self._cancel_events[job['job_id']]
+        
+        def report_progress(fraction: float):
+            # 事件迴圈已關閉（server 正在關閉）時略過，不中斷工作
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._set_progress, job, fraction)
+        
+        def call() -> Optional[Dict]:
+            # 工作執行緒：排隊期間被取消時不執行
+            if cancel_event.is_set():
+                return None
+            loop.call_soon_threadsafe(partial(self._update, job, status=JOB_RUNNING, started_at=time.time()))
+            return fn(report_progress, cancel_event)
+        
+        try:
+            result = await loop.run_in_executor(self._executor, call)
+            if cancel_event.is_set():
+                self.cancelled += 1
+                self._update(job, status=JOB_CANCELLED, finished_at=time.time())
+            else:
+                self.completed += 1
+                self._update(job, status=JOB_COMPLETED, progress=1.0, result=result, finished_at=time.time())
+        except Exception as e:
+            if cancel_event.is_set():
+                self.cancelled += 1
+                self._update(job, status=JOB_CANCELLED, finished_at=time.time())
+            else:
+                logger.error(f"匯出工作失敗：{job['job_id']}，{e}")
+                self.failed += 1
+                self._update(job, status=JOB_FAILED, error=str(e), finished_at=time.time())
+        finally:
+            self._release(job)
+    
+    def _set_progress(self, job: Dict, fraction: float):
+        """更新進度（變化小於 EXPORT_PROGRESS_STEP 時不發布）"""
+        fraction = round(min(max(fraction, 0.0), 1.0), 3)
+        if job['status'] == JOB_RUNNING and fraction - job['progress'] >= EXPORT_PROGRESS_STEP:
+            self._update(job, progress=fraction)
+    
+    def _update(self, job: Dict, **changes):
+        """更新工作狀態，寫入 store 並通知"""
+        job.update(changes)
+        try:
+            self.store.set_job(job['job_id'], job)
+        except Exception as e:
+            logger.warning(f"寫入匯出工作狀態失敗：{job['job_id']}，{e}")
+        if self.on_update is not None:
+            asyncio.ensure_future(self._notify(dict(job)))
+    
+    async def _notify(self, job: Dict):
+        try:
+            await self.on_update(job)
+        except Exception as e:
+            logger.warning(f"推送匯出工作狀態失敗：{job['job_id']}，{e}")
+    
+    def _release(self, job: Dict):
+        """工作結束：釋放 session，超過保留數時移除最舊的工作"""
+        job_id = job['job_id']
+        self._cancel_events.pop(job_id, None)
+        if self._session_jobs.get(job['session_id']) == job_id:
+            del self._session_jobs[job['session_id']]
+        
+        self._finished.append(job_id)
+        while len(self._finished) > self.retention:
+            old_id = self._finished.popleft()
+            self._jobs.pop(old_id, None)
+            self.store.remove_job(old_id)
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        取得工作狀態（包含其他 worker 的工作）
+        
+        Args:
+            job_id: 工作 ID
+        
+        Returns:
+            Optional[Dict]: 工作狀態，不存在時回傳 None
+        """
+        if job_id in self._jobs:
+            return dict(self._jobs[job_id])
+        return self.store.get_job(job_id)
+    
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消本 worker 上未結束的工作
+        
+        Returns:
+            bool: 是否已送出取消
+        """
+        cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        return True
+    
+    def stats(self) -> Dict:
+        """
+        匯出工作統計
+        
+        Returns:
+            Dict: 統計資料
+        """
+        running = self.running
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queued': self.max_queued,
+            'running': running,
+            'queued': self.active - running,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'rejected': self.rejected,
+        }
+    
+    def shutdown(self):
+        """取消所有工作並關閉工作執行緒"""
+        for cancel_event in self._cancel_events.values():
+            cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("匯出工作管理器已關閉")
@@ -0,0 +1,195 @@
+"""
+AI 瑜珈教練系統 - 回饋轉送模組
+把姿勢回饋送到持有該 session WebSocket 的 worker（pub/sub）
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import (
+    SESSION_REGISTRY_BACKEND, FEEDBACK_BUS_HOST, FEEDBACK_BUS_SECRET, FEEDBACK_BUS_KEY_FILE, WORKER_ID
+)
+
+logger = logging.getLogger(__name__)
+
+# 收到回饋時的處理函式：(session_id, message)
+FeedbackHandler = Callable[[str, Dict], Awaitable[None]]
+
+# 封包簽章長度（HMAC-SHA256）
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+class FeedbackBus:
+    """
+    行程內回饋轉送（預設，單一 worker）
+    
+    address 為此 worker 的轉送位址，寫入 session 登錄的回饋路由；
+    其他 worker 以 publish(address, ...) 把回饋送到這裡。
+    """
+    
+    def __init__(self, worker_id: str = WORKER_ID):
+        """
+        Args:
+            worker_id: 此 worker 的識別碼
+        """
+        self.worker_id = worker_id
+        self.address: Optional[Any] = worker_id
+        self._handler: Optional[FeedbackHandler] = None
+    
+    async def start(self, handler: FeedbackHandler):
+        """開始接收回饋"""
+        self._handler = handler
+    
+    async def publish(self, address: Any, session_id: str, message: Dict) -> bool:
+        """
+        送出回饋
+        
+        Args:
+            address: 目標 worker 的轉送位址（session 登錄中的回饋路由）
+            session_id: Session ID
+            message: 要推送給 WebSocket 的訊息
+        
+        Returns:
+            bool: 是否已送出
+        """
+        if address == self.address and self._handler is not None:
+            await self._handler(session_id, message)
+            return True
+        return False
+    
+    async def stop(self):
+        """停止接收回饋"""
+        self._handler = None
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """把收到的 UDP 封包交給 UdpFeedbackBus"""
+    
+    def __init__(self, bus: 'UdpFeedbackBus'):
+        self.bus = bus
+    
+    def datagram_received(self, data: bytes, addr):
+        self.bus._receive(data)
+    
+    def error_received(self, exc: Exception):
+        logger.warning(f"回饋轉送錯誤：{exc}")
+
+
+class UdpFeedbackBus(FeedbackBus):
+    """
+    本機 UDP 回饋轉送（同一台機器上的多個 worker）
+    
+    每個 worker 綁定一個臨時 port，位址 [host, port] 記錄在 session 登錄的回饋路由。
+    回饋為單一 JSON 封包（約 1 KB），送達失敗時直接丟棄；下一次結果改變時會再推送。
+    
+    封包開頭為以共用金鑰計算的 HMAC-SHA256 簽章，簽章不符的封包（例如本機其他程式送出的
+    start_segment 控制訊息）直接丟棄。
+    """
+    
+    def __init__(self, secret: bytes, worker_id: str = WORKER_ID, host: str = FEEDBACK_BUS_HOST):
+        """
+        Args:
+            secret: 所有 worker 共用的簽章金鑰
+            worker_id: 此 worker 的識別碼
+            host: 監聽位址
+        """
+        super().__init__(worker_id)
+        self.secret = secret
+        self.host = host
+        self.address = None
+        self._transport: Optional[asyncio.DatagramTransport] = None
+    
+    async def start(self, handler: FeedbackHandler):
+        await super().start(handler)
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=(self.host, 0)
+        )
+        host, port = self._transport.get_extra_info('sockname')[:2]
+        self.address = [host, port]
+        logger.info(f"回饋轉送已啟動：worker {self.worker_id}，位址 {host}:{port}")
+    
+    def _sign(self, payload: bytes) -> bytes:
+        """計算封包簽章"""
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()
+    
+    def _receive(self, data: bytes):
+        """處理收到的封包（先驗證簽章）"""
+        signature, payload = data[:SIGNATURE_SIZE], data[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            logger.warning("回饋封包簽章錯誤，已丟棄")
+            return
+        try:
+            packet = json.loads(payload)
+            session_id, message = packet['session_id'], packet['message']
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"回饋封包格式錯誤：{e}")
+            return
+        if self._handler is not None:
+            asyncio.ensure_future(self._handler(session_id, message))
+    
+    async def publish(self, address: Any, session_id: str, message: Dict) -> bool:
+        if address == self.address or self._transport is None:
+            return await super().publish(address, session_id, message)
+        
+        payload = json.dumps({'session_id': session_id, 'message': message}, ensure_ascii=False).encode('utf-8')
+        self._transport.sendto(self._sign(payload) + payload, tuple(address))
+        return True
+    
+    async def stop(self):
+        await super().stop()
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+def load_shared_secret(path: Path = FEEDBACK_BUS_KEY_FILE) -> bytes:
+    """
+    讀取同一台機器上所有 worker 共用的簽章金鑰，不存在時建立
+    
+    金鑰先寫入暫存檔再以 os.link 建立，同時啟動的 worker 只會有一個建立成功，其餘讀取既有的金鑰。
+    
+    Args:
+        path: 金鑰檔路徑
+    
+    Returns:
+        bytes: 金鑰
+    """
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            tmp_path.unlink()
+    return path.read_bytes()
+
+
+def create_feedback_bus(backend: str = SESSION_REGISTRY_BACKEND) -> FeedbackBus:
+    """
+    依 session 登錄類型建立對應的回饋轉送
+    
+    Args:
+        backend: memory 或 file
+    
+    Returns:
+        FeedbackBus: 回饋轉送
+    """
+    if backend == 'memory':
+        return FeedbackBus()
+    if backend == 'file':
+        secret = FEEDBACK_BUS_SECRET.encode('utf-8') if FEEDBACK_BUS_SECRET else load_shared_secret()
+        return UdpFeedbackBus(secret)
+    raise ValueError(f"不支援的 session 登錄類型：{backend}（可用：memory、file）")
@@ -0,0 +1,108 @@
+"""
+AI 瑜珈教練系統 - Landmark 二進位編碼模組
+定義 WebSocket 上傳送 landmark 影格的緊湊二進位格式
+
+格式（little-endian）：
+    標頭 12 bytes：
+        magic       2 bytes   b'YL'
+        version     uint8     目前為 1
+        dtype       uint8     0 = float32, 1 = float16
+        count       uint16    landmark 數量（應為 33）
+        reserved    uint16    保留，填 0
+        timestamp   uint32    客戶端時間（毫秒，可溢位循環）
+    資料：count × 4 個數值（x, y, z, visibility），依 dtype 編碼
+
+33 個點以 float32 傳送共 540 bytes，float16 則為 276 bytes。
+"""
+
+import struct
+import numpy as np
+from typing import NamedTuple
+
+from pose_analyzer import LANDMARK_COUNT
+
+FRAME_MAGIC = b'YL'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<2sBBHHI')
+
+# dtype 代碼 → NumPy 型別（little-endian）
+FRAME_DTYPES = {
+    0: np.dtype('<f4'),
+    1: np.dtype('<f2'),
+}
+_DTYPE_CODES = {dtype: code for code, dtype in FRAME_DTYPES.items()}
+
+
+class LandmarkFrameError(ValueError):
+    """二進位 landmark 影格格式錯誤"""
+
+
+class LandmarkFrame(NamedTuple):
+    """解碼後的 landmark 影格"""
+    points: np.ndarray  # (33, 4) float32
+    timestamp_ms: int
+
+
+def encode_landmark_frame(points: np.ndarray, timestamp_ms: int = 0, dtype=np.float32) -> bytes:
+    """
+    將 landmark 陣列編碼為二進位影格
+    
+    Args:
+        points: (33, 4) landmark 陣列
+        timestamp_ms: 客戶端時間（毫秒）
+        dtype: 傳輸精度（np.float32 或 np.float16）
+    
+    Returns:
+        bytes: 二進位影格
+    """
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if dtype not in _DTYPE_CODES:
+        raise LandmarkFrameError(f"不支援的資料型別：{dtype}")
+    
+    points = np.asarray(points)
+    if points.shape != (LANDMARK_COUNT, 4):
+        raise LandmarkFrameError(f"Landmark 陣列形狀應為 ({LANDMARK_COUNT}, 4)，實際為 {points.shape}")
+    
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, _DTYPE_CODES[dtype], LANDMARK_COUNT, 0, timestamp_ms & 0xFFFFFFFF
+    )
+    return header + points.astype(dtype).tobytes()
+
+
+def decode_landmark_frame(data: bytes) -> LandmarkFrame:
+    """
+    解碼二進位 landmark 影格
+    
+    Args:
+        data: 二進位影格
+    
+    Returns:
+        LandmarkFrame: (33, 4) float32 陣列與時間戳記
+    
+    Raises:
+        LandmarkFrameError: 格式錯誤或含有非有限數值
+    """
+    if len(data) < FRAME_HEADER.size:
+        raise LandmarkFrameError(f"影格長度不足：{len(data)} bytes")
+    
+    magic, version, dtype_code, count, _, timestamp_ms = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise LandmarkFrameError("影格標頭錯誤")
+    if version != FRAME_VERSION:
+        raise LandmarkFrameError(f"不支援的影格版本：{version}")
+    if dtype_code not in FRAME_DTYPES:
+        raise LandmarkFrameError(f"不支援的資料型別代碼：{dtype_code}")
+    if count != LANDMARK_COUNT:
+        raise LandmarkFrameError(f"Landmark 數量應為 {LANDMARK_COUNT}，實際為 {count}")
+    
+    dtype = FRAME_DTYPES[dtype_code]
+    expected = FRAME_HEADER.size + count * 4 * dtype.itemsize
+    if len(data) != expected:
+        raise LandmarkFrameError(f"影格長度錯誤：應為 {expected} bytes，實際為 {len(data)} bytes")
+    
+    points = np.frombuffer(data, dtype=dtype, count=count * 4, offset=FRAME_HEADER.size)
+    points = points.reshape(count, 4).astype(np.float32)
+    # NaN / inf（包含 float16 溢位）會污染串流的濾波狀態
+    if not np.isfinite(points).all():
+        raise LandmarkFrameError("Landmark 含有非有限數值（NaN 或 inf）")
+    return LandmarkFrame(points, timestamp_ms)
@@ -5,24 +5,41 @@ AI 瑜珈教練系統 - FastAPI 主程式
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+import numpy as np
+import json
 import logging
 import asyncio
+import time
 import uvicorn
+from functools import partial
 from pathlib import Path
 
 # 匯入自訂模組
 from config import (
     API_HOST, API_PORT, CORS_ORIGINS, DEFAULT_USER_ID,
-    VIDEO_SESSIONS_DIR, VIDEO_SEGMENTS_DIR, AUDIO_DIR, LOG_FILE, LOG_LEVEL
+    VIDEO_SESSIONS_DIR, VIDEO_SEGMENTS_DIR, AUDIO_DIR, LOG_FILE, LOG_LEVEL, WORKER_ID, EXPORT_ANNOTATION_MODE,
+    ENCODER_PRESETS, RECORDING_PRESET, EXPORT_PRESET, SEGMENT_REQUEST_INTERVAL_SECONDS, POSE_STREAM_IDLE_SECONDS,
+    SESSION_REGISTRY_HEARTBEAT_SECONDS, SESSION_REGISTRY_TTL_SECONDS
 )
-from pose_analyzer import analyze_pose
-from video_processor import VideoProcessor
-from database import get_database
+from pose_analyzer import (
+    analyze_pose_batch, landmarks_to_array, score_frames, unknown_result, LandmarksInput, LANDMARK_COUNT,
+    UNKNOWN_POSE
+)
+from pose_stream import StreamingPoseAnalyzer
+from analysis_executor import AnalysisExecutor, AnalysisQueueFull
+from session_registry import create_session_registry
+from feedback_bus import create_feedback_bus
+from export_jobs import ExportJobManager, ExportQueueFull, FINISHED_STATUSES
+from landmark_codec import decode_landmark_frame, LandmarkFrameError
+from metrics import METRICS, POSE_ANALYSIS_SECONDS, WEBSOCKET_SEND_SECONDS
+from video_processor import VideoProcessor, ANNOTATION_MODES, timeline_path_for
+from video_encoders import detect_codecs, describe_presets
+from database import get_database, get_async_database
 from tts_service import get_tts_service
 
 # 設定日誌
@@ -57,14 +74,279 @@ app.mount("/videos", StaticFiles(directory=str(VIDEO_SESSIONS_DIR.parent)), name
 app.mount("/audio", StaticFiles(directory=str(AUDIO_DIR)), name="audio")
 
 # 全域變數
+# active_sessions、websocket_connections 只包含本 worker 持有的物件（相機與連線無法跨行程共用），
+# 所有 worker 共用的 session 資訊與回饋路由記錄在 session_registry
 active_sessions: Dict[str, VideoProcessor] = {}
 websocket_connections: Dict[str, WebSocket] = {}
+# 串流分析狀態（平滑與遲滯）只存在處理影格的 worker：同一 session 的 HTTP 影格需黏著路由到同一個 worker，
+# /ws 的影格則固定由持有該連線的 worker 處理（見 QUICKSTART 多 worker 部署）
+pose_streams: Dict[str, StreamingPoseAnalyzer] = {}
+# 串流最後分析影格的時間；其他 worker 持有的 session 結束時本 worker 不會收到通知，閒置後由 evict_idle_streams 移除
+stream_last_used: Dict[str, float] = {}
+stream_eviction_task: Optional[asyncio.Task] = None
+registry_heartbeat_task: Optional[asyncio.Task] = None
+analysis_executor = AnalysisExecutor()
+async_db = get_async_database()
+session_registry = create_session_registry()
+feedback_bus = create_feedback_bus()
+
+# 讀取時才計算的指標
+METRICS.gauge('yoga_active_sessions', '本 worker 持有的 session 數', lambda: len(active_sessions))
+METRICS.gauge('yoga_websocket_connections', '本 worker 的 WebSocket 連線數', lambda: len(websocket_connections))
+METRICS.gauge('yoga_analysis_queue_depth', '等待中與執行中的分析工作數', lambda: analysis_executor.pending)
+METRICS.gauge('yoga_analysis_rejected_total', '分析佇列已滿而拒絕的工作數',
+              lambda: analysis_executor.rejected, 'counter')
+METRICS.gauge('yoga_recording_dropped_frames_total', '錄製佇列已滿而丟棄的影格數',
+              lambda: sum(processor.encoder.dropped_count for processor in active_sessions.values()), 'counter')
+METRICS.gauge('yoga_db_pending_calls', '等待中與執行中的資料庫呼叫數', lambda: async_db.pending)
+
+
+def db_cache_samples(field: str) -> List[Tuple[Dict, float]]:
+    """讀取快取統計（依快取種類分標籤）"""
+    return [({'cache': name}, stats[field]) for name, stats in async_db.cache_stats().items()]
+
+
+METRICS.gauge('yoga_db_cache_hits_total', '資料庫讀取快取命中次數', lambda: db_cache_samples('hits'), 'counter')
+METRICS.gauge('yoga_db_cache_misses_total', '資料庫讀取快取未命中次數', lambda: db_cache_samples('misses'), 'counter')
+METRICS.gauge('yoga_db_cache_hit_ratio', '資料庫讀取快取命中率', lambda: db_cache_samples('hit_rate'))
+METRICS.gauge('yoga_db_cache_entries', '資料庫讀取快取項目數', lambda: db_cache_samples('entries'))
+METRICS.gauge('yoga_pose_cache_hits_total', '串流分析沿用上次結果的影格數',
+              lambda: sum(stream.cache_hits for stream in pose_streams.values()), 'counter')
+
+
+def session_exists(session_id: str) -> bool:
+    """session 是否存在（由任一 worker 持有）"""
+    return session_id in active_sessions or session_id in session_registry
+
+
+def get_local_session(session_id: str) -> VideoProcessor:
+    """
+    取得本 worker 持有的 VideoProcessor
+    
+    Raises:
+        HTTPException: session 不存在（404）或由其他 worker 持有（409）
+    """
+    if session_id in active_sessions:
+        return active_sessions[session_id]
+    
+    info = session_registry.get(session_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Session 不存在")
+    raise HTTPException(status_code=409, detail=f"Session 由 worker {info.get('worker_id')} 持有，請將請求送到該 worker")
+
+
+async def send_websocket(websocket: WebSocket, message: Dict, route: str):
+    """
+    發送 WebSocket 訊息並記錄發送時間
+    
+    Args:
+        websocket: WebSocket 連線
+        message: 訊息
+        route: 指標標籤（local：本 worker 推送、forwarded：其他 worker 轉送、reply：回覆二進位影格）
+    """
+    with WEBSOCKET_SEND_SECONDS.time(route=route):
+        await websocket.send_json(message)
+
+
+async def push_feedback(session_id: str, message: Dict):
+    """
+    推送即時回饋給 session 的 WebSocket（連線在其他 worker 時經由回饋轉送）
+    
+    Args:
+        session_id: Session ID
+        message: 訊息
+    """
+    if session_id in websocket_connections:
+        await send_websocket(websocket_connections[session_id], message, 'local')
+        return
+    
+    address = session_registry.get_route(session_id)
+    if address is not None:
+        with WEBSOCKET_SEND_SECONDS.time(route='bus'):
+            await feedback_bus.publish(address, session_id, message)
+
+
+# 經由回饋轉送送給持有相機的 worker 的控制訊息：開始錄製片段
+START_SEGMENT_MESSAGE = 'start_segment'
+
+# 本 worker 分析、但相機在其他 worker 的 session：上次送出開始錄製通知的時間
+segment_requests: Dict[str, float] = {}
+
+
+def start_local_segment(session_id: str):
+    """本 worker 持有相機、尚未錄製且尚未匯出時開始錄製片段"""
+    video_processor = active_sessions.get(session_id)
+    if video_processor is None or video_processor.recording or export_jobs.has_active_job(session_id):
+        return
+    video_processor.start_segment_recording()
+
+
+async def request_segment_recording(session_id: str):
+    """
+    偵測到姿勢：開始錄製片段
+    
+    相機在本 worker 時直接開始；在其他 worker 時，經由 session 資訊中的控制位址（回饋轉送）通知該 worker，
+    每個 session 最多每 SEGMENT_REQUEST_INTERVAL_SECONDS 秒通知一次（持有的 worker 會略過已在錄製的 session）。
+    
+    Args:
+        session_id: Session ID
+    """
+    if session_id in active_sessions:
+        start_local_segment(session_id)
+        return
+    
+    now = time.monotonic()
+    if now - segment_requests.get(session_id, float('-inf')) < SEGMENT_REQUEST_INTERVAL_SECONDS:
+        return
+    segment_requests[session_id] = now
+    
+    # 已呼叫 /merge_and_export 的 session 相機已停止，不再通知
+    info = session_registry.get(session_id)
+    address = info.get('control_address') if info and not info.get('exporting') else None
+    if address is not None:
+        await feedback_bus.publish(address, session_id, {'type': START_SEGMENT_MESSAGE})
+
+
+async def deliver_feedback(session_id: str, message: Dict):
+    """處理其他 worker 轉送過來的回饋與控制訊息"""
+    if message.get('type') == START_SEGMENT_MESSAGE:
+        start_local_segment(session_id)
+        return
+    
+    websocket = websocket_connections.get(session_id)
+    if websocket is None:
+        return
+    try:
+        await send_websocket(websocket, message, 'forwarded')
+    except Exception as e:
+        logger.warning(f"轉送回饋失敗：Session {session_id}，{e}")
+
+
+async def on_export_job_update(job: Dict):
+    """匯出工作狀態改變：推送進度給 session 的 WebSocket，工作結束（完成、失敗或取消）時釋放 session"""
+    session_id = job['session_id']
+    await push_feedback(session_id, {'type': 'export_progress', 'data': job})
+    
+    # 相機已在 /merge_and_export 停止，失敗或取消的 session 也無法再錄製，一併釋放
+    if job['status'] in FINISHED_STATUSES:
+        active_sessions.pop(session_id, None)
+        pose_streams.pop(session_id, None)
+        stream_last_used.pop(session_id, None)
+        segment_requests.pop(session_id, None)
+        session_registry.unregister(session_id)
+
+
+# 影片匯出工作（狀態記錄在 session_registry，任一 worker 都能查詢）
+export_jobs = ExportJobManager(session_registry, on_update=on_export_job_update)
+METRICS.gauge('yoga_export_jobs', '排隊中與執行中的匯出工作數',
+              lambda: [({'status': 'running'}, export_jobs.running),
+                       ({'status': 'queued'}, export_jobs.active - export_jobs.running)])
+
+
+def evict_idle_streams(now: float) -> int:
+    """
+    移除不在本 worker、且已結束或閒置超過 POSE_STREAM_IDLE_SECONDS 的 session 串流狀態
+    
+    Args:
+        now: 目前時間（time.monotonic）
+    
+    Returns:
+        int: 移除的串流數
+    """
+    evicted = 0
+    for session_id, last_used in list(stream_last_used.items()):
+        if session_id in active_sessions:
+            continue
+        if now - last_used >= POSE_STREAM_IDLE_SECONDS or not session_exists(session_id):
+            stream_last_used.pop(session_id, None)
+            pose_streams.pop(session_id, None)
+            segment_requests.pop(session_id, None)
+            evicted += 1
+    if evicted:
+        logger.info(f"已移除 {evicted} 個閒置的串流狀態")
+    return evicted
+
+
+async def run_stream_eviction():
+    """定期移除閒置的串流狀態"""
+    while True:
+        await asyncio.sleep(POSE_STREAM_IDLE_SECONDS / 2)
+        try:
+            evict_idle_streams(time.monotonic())
+        except Exception as e:
+            logger.error(f"移除閒置串流狀態失敗：{e}")
+
+
+def refresh_registry() -> int:
+    """
+    更新本 worker 持有的 session 登錄，並清除逾時未更新的項目（持有的 worker 已當機）
+    
+    Returns:
+        int: 清除的 session 數
+    """
+    for session_id in list(active_sessions):
+        session_registry.touch(session_id)
+    return session_registry.sweep(SESSION_REGISTRY_TTL_SECONDS)
+
+
+async def run_registry_heartbeat():
+    """定期更新與清除 session 登錄"""
+    while True:
+        await asyncio.sleep(SESSION_REGISTRY_HEARTBEAT_SECONDS)
+        try:
+            refresh_registry()
+        except Exception as e:
+            logger.error(f"更新 session 登錄失敗：{e}")
+
+
+async def analyze_stream_frame(session_id: str, landmarks: LandmarksInput, pose_hint: Optional[str] = None,
+                               timestamp: Optional[float] = None) -> Tuple[Dict, bool, StreamingPoseAnalyzer]:
+    """
+    分析 session 的一個影格
+    
+    濾波、遲滯與回饋組合在事件迴圈執行（輕量、需要串流狀態），
+    特徵計算與評分交給分析執行器，避免阻塞其他請求與 WebSocket。
+    
+    Args:
+        session_id: Session ID
+        landmarks: 33 個關鍵點
+        pose_hint: 姿勢提示（可選）
+        timestamp: 影格時間（秒，可選）
+    
+    Returns:
+        Tuple[Dict, bool, StreamingPoseAnalyzer]: (姿勢分析結果, 結果是否改變, 分析所用的串流)；
+            評分期間串流可能已被移除（閒置或匯出結束），呼叫端不應再從 pose_streams 查詢
+    
+    Raises:
+        AnalysisQueueFull: 分析佇列已滿
+    """
+    # 先確認佇列容量，被拒絕的影格不會更新串流狀態
+    analysis_executor.check_capacity()
+    
+    with POSE_ANALYSIS_SECONDS.time(path='stream'):
+        stream = pose_streams.setdefault(session_id, StreamingPoseAnalyzer())
+        stream_last_used[session_id] = time.monotonic()
+        sequence, smoothed = stream.begin(landmarks, pose_hint, timestamp)
+        scored = await analysis_executor.run(score_frames, smoothed) if smoothed is not None else None
+        result, changed = stream.finish(sequence, pose_hint, scored)
+    
+    if result is None:
+        # 串流尚無任何評分完成的結果時不沿用（不應發生，避免回傳 None 造成 500）
+        result, changed = unknown_result(), False
+    
+    # 偵測到姿勢時開始錄製片段（預錄緩衝區保留進入姿勢前的過程）
+    if result['pose_name'] != UNKNOWN_POSE:
+        await request_segment_recording(session_id)
+    
+    return result, changed, stream
 
 
 # ==================== Pydantic 模型 ====================
 
 class StartSessionRequest(BaseModel):
     user_id: str = DEFAULT_USER_ID
+    # 片段錄製的編碼預設（見 GET /encoder_presets），預設依 RECORDING_PRESET
+    recording_preset: Optional[str] = None
 
 
 class PoseAnalysisRequest(BaseModel):
@@ -74,6 +356,16 @@ class PoseAnalysisRequest(BaseModel):
     pose_hint: Optional[str] = None
 
 
+class PoseBatchAnalysisRequest(BaseModel):
+    # 每個影格所屬的 session（可為同一 session 的連續影格，或多個 session）
+    session_ids: List[str]
+    # (N, 33, 4) landmark 陣列，每點為 [x, y, z, visibility]
+    landmarks: List[List[List[float]]]
+    pose_hint: Optional[str] = None
+    # 逐影格姿勢提示（可選），提供時覆蓋 pose_hint
+    pose_hints: Optional[List[Optional[str]]] = None
+
+
 class EndSegmentRequest(BaseModel):
     session_id: str
     pose_name: str
@@ -83,6 +375,10 @@ class EndSegmentRequest(BaseModel):
 
 class MergeExportRequest(BaseModel):
     session_id: str
+    # burn_in（標註繪製在影片中）或 sidecar（不重新編碼，標註寫入時間軸），預設依 EXPORT_ANNOTATION_MODE
+    annotation_mode: Optional[str] = None
+    # 匯出的編碼預設（見 GET /encoder_presets），預設依 EXPORT_PRESET
+    export_preset: Optional[str] = None
 
 
 class TTSRequest(BaseModel):
@@ -108,18 +404,30 @@ async def start_session(request: StartSessionRequest):
     開始新的練習 session
     """
     try:
+        recording_preset = request.recording_preset or RECORDING_PRESET
+        if recording_preset not in ENCODER_PRESETS:
+            raise HTTPException(status_code=400, detail=f"不支援的編碼預設：{recording_preset}")
+        
         # 生成 session_id（格式：YYYYMMDD_HHMMSS）
         session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         # 建立 VideoProcessor
-        video_processor = VideoProcessor(session_id)
+        video_processor = VideoProcessor(session_id, recording_preset)
         
-        # 啟動相機
+        # 啟動相機（偵測到姿勢時才開始錄製片段）
         if not video_processor.start_camera():
             raise HTTPException(status_code=500, detail="相機啟動失敗")
         
-        # 儲存到 active_sessions
+        # 儲存到 active_sessions，並登錄到共用的 session_registry
         active_sessions[session_id] = video_processor
+        pose_streams[session_id] = StreamingPoseAnalyzer()
+        session_registry.register(session_id, {
+            'session_id': session_id,
+            'user_id': request.user_id,
+            'worker_id': WORKER_ID,
+            # 其他 worker 分析影格時，經由此位址通知本 worker 開始錄製（見 request_segment_recording）
+            'control_address': feedback_bus.address
+        })
         
         # 建立初始 session 資料
         session_data = {
@@ -132,17 +440,19 @@ async def start_session(request: StartSessionRequest):
         }
         
         # 儲存到資料庫
-        db = get_database()
-        db.save_session(session_data)
+        await async_db.save_session(session_data)
         
         logger.info(f"Session 已建立：{session_id}")
         
         return {
             "session_id": session_id,
             "start_time": session_data['start_time'],
+            "recording_preset": recording_preset,
             "status": "started"
         }
-        
+    
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"建立 session 失敗：{e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -155,31 +465,95 @@ async def pose_analysis(request: PoseAnalysisRequest):
     """
     try:
         # 檢查 session 是否存在
-        if request.session_id not in active_sessions:
+        if not session_exists(request.session_id):
             raise HTTPException(status_code=404, detail="Session 不存在")
         
         # 檢查 landmarks 數量
         if len(request.landmarks) != 33:
             raise HTTPException(status_code=400, detail="Landmarks 數量應為 33")
         
-        # 分析姿勢
-        result = analyze_pose(request.landmarks, request.pose_hint)
+        # 轉換為陣列（含 NaN / inf 時拒絕，不進入串流的濾波狀態）
+        try:
+            points = landmarks_to_array(request.landmarks)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # 分析姿勢（時間平滑 + 姿勢遲滯）
+        result, changed, stream = await analyze_stream_frame(request.session_id, points, request.pose_hint)
         
-        # 透過 WebSocket 推送即時回饋（如果有連接）
-        if request.session_id in websocket_connections:
-            await websocket_connections[request.session_id].send_json({
+        # 結果改變時才透過 WebSocket 推送即時回饋（如果有連接）
+        if changed:
+            await push_feedback(request.session_id, {
                 'type': 'pose_feedback',
                 'data': result
             })
+            
+            logger.info(f"姿勢分析結果改變：{result['pose_name']}, 分數：{result['score']}")
+        
+        return {**result, 'cache': stream.cache_stats()}
+    
+    except HTTPException as he:
+        raise he
+    except AnalysisQueueFull as e:
+        logger.warning(f"姿勢分析過載：{e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"姿勢分析失敗：{e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/pose_analysis_batch")
+async def pose_analysis_batch(request: PoseBatchAnalysisRequest):
+    """
+    批次姿勢分析（一次向量化評分 N 個影格）
+    """
+    try:
+        # 檢查 session 是否存在
+        unknown_sessions = {session_id for session_id in set(request.session_ids) if not session_exists(session_id)}
+        if unknown_sessions:
+            raise HTTPException(status_code=404, detail=f"Session 不存在：{', '.join(sorted(unknown_sessions))}")
         
-        logger.info(f"姿勢分析完成：{result['pose_name']}, 分數：{result['score']}")
+        # 檢查 landmarks 形狀
+        points = np.asarray(request.landmarks, dtype=np.float32)
+        if points.ndim != 3 or points.shape[1:] != (LANDMARK_COUNT, 4):
+            raise HTTPException(status_code=400, detail="Landmarks 形狀應為 (N, 33, 4)")
+        if not np.isfinite(points).all():
+            raise HTTPException(status_code=400, detail="Landmark 含有非有限數值（NaN 或 inf）")
+        if len(request.session_ids) != len(points):
+            raise HTTPException(status_code=400, detail="session_ids 數量應與影格數量相同")
+        if request.pose_hints is not None and len(request.pose_hints) != len(points):
+            raise HTTPException(status_code=400, detail="pose_hints 數量應與影格數量相同")
         
-        return result
+        # 分析姿勢
+        hints = request.pose_hints if request.pose_hints is not None else request.pose_hint
+        with POSE_ANALYSIS_SECONDS.time(path='batch'):
+            results = await analysis_executor.run(analyze_pose_batch, points, hints)
         
+        # 每個 session 只推送最新一個影格的回饋
+        latest_results = dict(zip(request.session_ids, results))
+        for session_id, result in latest_results.items():
+            await push_feedback(session_id, {
+                'type': 'pose_feedback',
+                'data': result
+            })
+        
+        logger.info(f"批次姿勢分析完成：{len(results)} 個影格，{len(latest_results)} 個 session")
+        
+        return {
+            "count": len(results),
+            "results": [
+                {'session_id': session_id, **result}
+                for session_id, result in zip(request.session_ids, results)
+            ]
+        }
+    
     except HTTPException as he:
         raise he
+    except AnalysisQueueFull as e:
+        logger.warning(f"批次姿勢分析過載：{e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        logger.error(f"姿勢分析失敗：{e}")
+        logger.error(f"批次姿勢分析失敗：{e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -189,21 +563,28 @@ async def end_segment(request: EndSegmentRequest):
     結束姿勢片段
     """
     try:
-        # 檢查 session 是否存在
-        if request.session_id not in active_sessions:
-            raise HTTPException(status_code=404, detail="Session 不存在")
+        # 檢查 session 是否存在（相機與錄影只在建立 session 的 worker 上）
+        video_processor = get_local_session(request.session_id)
         
-        video_processor = active_sessions[request.session_id]
-        
-        # 停止片段錄製
-        video_processor.stop_segment_recording(
+        # 停止片段錄製（立即返回，檔案由編碼執行緒關閉）
+        stopped = video_processor.stop_segment_recording(
             request.pose_name,
             request.avg_score,
             "姿勢完成"
         )
         
+        # 沒有錄製中的片段：不儲存姿勢資料，避免資料庫的段落與影片片段對不上
+        if not stopped:
+            logger.warning(f"結束片段時未在錄製：Session {request.session_id}")
+            return {
+                "segment_id": None,
+                "status": "not_recording",
+                "video_path": ""
+            }
+        
         # 儲存姿勢資料到資料庫
         segment_id = video_processor.segment_count
+        segment_path = video_processor.segment_paths[-1] if video_processor.segment_paths else None
         pose_data = {
             'segment_id': segment_id,
             'pose_name': request.pose_name,
@@ -213,17 +594,16 @@ async def end_segment(request: EndSegmentRequest):
             'duration_seconds': request.duration_seconds
         }
         
-        db = get_database()
-        db.update_session_poses(request.session_id, pose_data)
+        await async_db.update_session_poses(request.session_id, pose_data)
         
         logger.info(f"片段已結束：Session {request.session_id}, Segment {segment_id}")
         
         return {
             "segment_id": segment_id,
             "status": "saved",
-            "video_path": str(video_processor.segment_paths[-1]) if video_processor.segment_paths else ""
+            "video_path": str(segment_path) if segment_path else ""
         }
-        
+    
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -231,80 +611,144 @@ async def end_segment(request: EndSegmentRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/merge_and_export")
+def export_session_video(session_id: str, video_processor: VideoProcessor, annotation_mode: str,
+                         export_preset: str, progress_callback, cancel_event) -> Dict:
+    """
+    合併影片並更新 session 最終資訊（在匯出工作執行緒中執行）
+    
+    Args:
+        session_id: Session ID
+        video_processor: session 的 VideoProcessor
+        annotation_mode: burn_in 或 sidecar
+        export_preset: 編碼預設名稱
+        progress_callback: 進度回呼（0.0 ~ 1.0）
+        cancel_event: 取消旗標
+    
+    Returns:
+        Dict: 匯出結果
+    """
+    output_path = video_processor.merge_final_video(progress_callback, cancel_event, annotation_mode, export_preset)
+    
+    if not output_path or not output_path.exists():
+        raise RuntimeError("影片合併失敗")
+    
+    # 計算總時長與平均分數
+    db = get_database()
+    session_data = db.get_session(session_id)
+    
+    if session_data:
+        poses = session_data.get('poses', [])
+        total_duration = sum(p.get('duration_seconds', 0) for p in poses)
+        avg_score = sum(p.get('score', 0) for p in poses) / len(poses) if poses else 0
+        
+        # 更新最終資訊
+        db.update_session_final_info(
+            session_id,
+            total_duration,
+            round(avg_score, 1),
+            str(output_path)
+        )
+    
+    # 取得檔案大小
+    file_size_mb = output_path.stat().st_size / (1024 * 1024)
+    
+    logger.info(f"影片已合併：{output_path}")
+    
+    return {
+        "video_url": f"/videos/sessions/{output_path.name}",
+        "timeline_url": f"/videos/sessions/{timeline_path_for(output_path).name}",
+        "annotation_mode": annotation_mode,
+        "export_preset": export_preset,
+        "download_path": str(output_path),
+        "duration_seconds": total_duration if session_data else 0,
+        "file_size_mb": round(file_size_mb, 2)
+    }
+
+
+@app.post("/merge_and_export", status_code=202)
 async def merge_and_export(request: MergeExportRequest):
     """
-    合併並匯出影片
+    合併並匯出影片（排入背景工作後立即回傳工作 ID，進度由 /jobs/{job_id} 查詢或經由 WebSocket 推送）
     """
     try:
-        # 檢查 session 是否存在
-        if request.session_id not in active_sessions:
-            raise HTTPException(status_code=404, detail="Session 不存在")
+        annotation_mode = request.annotation_mode or EXPORT_ANNOTATION_MODE
+        if annotation_mode not in ANNOTATION_MODES:
+            raise HTTPException(status_code=400, detail=f"不支援的標註模式：{annotation_mode}")
+        export_preset = request.export_preset or EXPORT_PRESET
+        if export_preset not in ENCODER_PRESETS:
+            raise HTTPException(status_code=400, detail=f"不支援的編碼預設：{export_preset}")
         
-        video_processor = active_sessions[request.session_id]
+        # 檢查 session 是否存在（相機與錄影只在建立 session 的 worker 上）
+        video_processor = get_local_session(request.session_id)
         
-        # 停止相機
-        video_processor.stop_camera()
+        # 標記為匯出中，其他 worker 偵測到姿勢時不再通知開始錄製
+        info = session_registry.get(request.session_id)
+        if info is not None:
+            session_registry.register(request.session_id, {**info, 'exporting': True})
         
-        # 合併影片
-        output_path = video_processor.merge_final_video()
+        # 停止相機（等待擷取執行緒結束與錄製管線寫完，在執行緒中進行，不阻塞事件迴圈）
+        await asyncio.get_running_loop().run_in_executor(None, video_processor.stop_camera)
         
-        if not output_path or not output_path.exists():
-            raise HTTPException(status_code=500, detail="影片合併失敗")
-        
-        # 計算總時長與平均分數
-        db = get_database()
-        session_data = db.get_session(request.session_id)
-        
-        if session_data:
-            poses = session_data.get('poses', [])
-            total_duration = sum(p.get('duration_seconds', 0) for p in poses)
-            avg_score = sum(p.get('score', 0) for p in poses) / len(poses) if poses else 0
-            
-            # 更新最終資訊
-            db.update_session_final_info(
-                request.session_id,
-                total_duration,
-                round(avg_score, 1),
-                str(output_path)
-            )
-        
-        # 移除 active session
-        del active_sessions[request.session_id]
-        
-        # 取得檔案大小
-        file_size_mb = output_path.stat().st_size / (1024 * 1024)
-        
-        logger.info(f"影片已合併：{output_path}")
+        # 排入匯出工作（同一 session 重複呼叫時回傳既有的工作）
+        job = export_jobs.submit(
+            request.session_id,
+            partial(export_session_video, request.session_id, video_processor, annotation_mode, export_preset)
+        )
         
         return {
-            "video_url": f"/videos/sessions/{output_path.name}",
-            "download_path": str(output_path),
-            "duration_seconds": total_duration if session_data else 0,
-            "file_size_mb": round(file_size_mb, 2),
-            "status": "completed"
+            "job_id": job['job_id'],
+            "status": job['status'],
+            "status_url": f"/jobs/{job['job_id']}"
         }
-        
+    
     except HTTPException as he:
         raise he
+    except ExportQueueFull as e:
+        logger.warning(f"匯出工作已滿：{e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"合併影片失敗：{e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    查詢匯出工作狀態（queued、running、completed、failed、cancelled）
+    """
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    取消匯出工作（只能由執行該工作的 worker 取消）
+    """
+    if export_jobs.cancel(job_id):
+        return {"job_id": job_id, "status": "cancelling"}
+    
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在")
+    if job['status'] in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"工作已結束（{job['status']}），無法取消")
+    raise HTTPException(status_code=409, detail=f"工作由 worker {job.get('worker_id')} 執行，請將請求送到該 worker")
+
+
 @app.get("/user_history")
-async def get_user_history(user_id: str = DEFAULT_USER_ID, limit: int = 20, skip: int = 0):
+async def get_user_history(user_id: str = DEFAULT_USER_ID, limit: int = 20, skip: int = 0,
+                           cursor: Optional[str] = None):
     """
     查詢使用者歷史記錄
+    
+    下一頁請帶上回應中的 next_cursor（keyset 分頁）；skip 仍可用，但深頁成本隨頁數增加。
     """
     try:
-        db = get_database()
-        
-        # 取得歷史記錄
-        sessions = db.get_user_history(user_id, limit, skip)
-        
-        # 取得總數
-        total = db.get_total_sessions_count(user_id)
+        # 取得歷史記錄與總數（單一 aggregation，不傳送 poses 陣列）
+        sessions, total, next_cursor = await async_db.get_user_history_page(user_id, limit, skip, cursor)
         
         # 格式化回應
         formatted_sessions = []
@@ -314,15 +758,18 @@ async def get_user_history(user_id: str = DEFAULT_USER_ID, limit: int = 20, skip
                 'date': session.get('start_time'),
                 'duration_seconds': session.get('duration_seconds', 0),
                 'avg_score': session.get('avg_score', 0),
-                'poses_count': len(session.get('poses', [])),
-                'video_available': 'final_video_path' in session
+                'poses_count': session.get('poses_count', 0),
+                'video_available': session.get('video_available', False)
             })
         
         return {
             "total": total,
-            "sessions": formatted_sessions
+            "sessions": formatted_sessions,
+            "next_cursor": next_cursor
         }
-        
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"查詢歷史記錄失敗：{e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -334,8 +781,7 @@ async def get_session_detail(session_id: str):
     取得 session 詳細資訊
     """
     try:
-        db = get_database()
-        session = db.get_session(session_id)
+        session = await async_db.get_session(session_id)
         
         if not session:
             raise HTTPException(status_code=404, detail="Session 不存在")
@@ -350,12 +796,15 @@ async def get_session_detail(session_id: str):
             'accuracy_rate': (correct_poses / len(poses) * 100) if poses else 0
         }
         
-        # 格式化影片 URL
+        # 格式化影片 URL（標註時間軸與影片放在同一目錄）
         video_url = None
+        timeline_url = None
         if 'final_video_path' in session:
             video_path = Path(session['final_video_path'])
             if video_path.exists():
                 video_url = f"/videos/sessions/{video_path.name}"
+            if timeline_path_for(video_path).exists():
+                timeline_url = f"/videos/sessions/{timeline_path_for(video_path).name}"
         
         return {
             "session_id": session.get('session_id'),
@@ -364,10 +813,11 @@ async def get_session_detail(session_id: str):
             "duration_seconds": session.get('duration_seconds', 0),
             "avg_score": session.get('avg_score', 0),
             "video_url": video_url,
+            "timeline_url": timeline_url,
             "poses": poses,
             "stats": stats
         }
-        
+    
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -397,7 +847,7 @@ async def tts_feedback(request: TTSRequest):
             "audio_path": str(audio_path),
             "duration_seconds": round(duration, 1)
         }
-        
+    
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -405,8 +855,74 @@ async def tts_feedback(request: TTSRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/analysis_stats")
+async def get_analysis_stats():
+    """
+    姿勢分析執行器統計（佇列深度、等待時間、拒絕次數）
+    """
+    return analysis_executor.stats()
+
+
+@app.get("/encoder_presets")
+async def get_encoder_presets():
+    """
+    影片編碼預設與本機支援的編碼器
+    """
+    return {
+        "available_codecs": list(detect_codecs()),
+        "recording_preset": RECORDING_PRESET,
+        "export_preset": EXPORT_PRESET,
+        "presets": describe_presets()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    效能指標（Prometheus 文字格式）
+    """
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ==================== WebSocket 端點 ====================
 
+async def _handle_landmark_frame(websocket: WebSocket, session_id: str, data: bytes, pose_hint: Optional[str]):
+    """
+    分析 WebSocket 收到的二進位 landmark 影格，結果改變時在同一連線回覆
+    
+    Args:
+        websocket: WebSocket 連線
+        session_id: Session ID
+        data: 二進位影格
+        pose_hint: 姿勢提示（可選）
+    """
+    if not session_exists(session_id):
+        await websocket.send_json({'type': 'error', 'error': 'Session 不存在'})
+        return
+    
+    try:
+        frame = decode_landmark_frame(data)
+    except LandmarkFrameError as e:
+        await websocket.send_json({'type': 'error', 'error': str(e)})
+        return
+    
+    # 客戶端時間戳記為 0 時使用伺服器接收時間
+    timestamp = frame.timestamp_ms / 1000.0 if frame.timestamp_ms else None
+    try:
+        result, changed, _ = await analyze_stream_frame(session_id, frame.points, pose_hint, timestamp)
+    except AnalysisQueueFull:
+        # 過載時丟棄影格，下一個影格很快就會到
+        return
+    
+    if changed:
+        await send_websocket(websocket, {
+            'type': 'pose_feedback',
+            'timestamp_ms': frame.timestamp_ms,
+            'data': result
+        }, 'reply')
+        logger.info(f"姿勢分析結果改變：{result['pose_name']}, 分數：{result['score']}")
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -425,23 +941,38 @@ async def websocket_endpoint(websocket: WebSocket):
             await websocket.close()
             return
         
-        # 註冊連接
+        # 註冊連接，其他 worker 的回饋經由回饋路由轉送到這裡
         websocket_connections[session_id] = websocket
+        if session_exists(session_id):
+            session_registry.set_route(session_id, feedback_bus.address)
         logger.info(f"WebSocket 已連接：Session {session_id}")
         
-        # 保持連接
+        # 接收訊息：二進位訊息為 landmark 影格（格式見 landmark_codec），文字訊息用於設定姿勢提示或保持連線
+        pose_hint = data.get('pose_hint')
         while True:
-            # 接收客戶端訊息（保持連線用）
-            data = await websocket.receive_text()
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
             
+            if message.get('bytes') is not None:
+                await _handle_landmark_frame(websocket, session_id, message['bytes'], pose_hint)
+            elif message.get('text'):
+                try:
+                    data = json.loads(message['text'])
+                except ValueError:
+                    continue
+                if isinstance(data, dict) and data.get('type') == 'pose_hint':
+                    pose_hint = data.get('pose_hint')
+    
     except WebSocketDisconnect:
         logger.info(f"WebSocket 已斷開：Session {session_id}")
     except Exception as e:
         logger.error(f"WebSocket 錯誤：{e}")
     finally:
         # 移除連接
-        if session_id and session_id in websocket_connections:
+        if session_id and websocket_connections.get(session_id) is websocket:
             del websocket_connections[session_id]
+            session_registry.clear_route(session_id, feedback_bus.address)
 
 
 # ==================== 錯誤處理 ====================
@@ -465,11 +996,28 @@ async def global_exception_handler(request, exc):
 @app.on_event("startup")
 async def startup_event():
     """應用啟動事件"""
-    logger.info("AI 瑜珈教練系統 API 已啟動")
+    global stream_eviction_task, registry_heartbeat_task
+    logger.info(f"AI 瑜珈教練系統 API 已啟動（worker {WORKER_ID}）")
+    
+    # 開始接收其他 worker 轉送的回饋
+    await feedback_bus.start(deliver_feedback)
+    
+    # 定期移除其他 worker 持有、已閒置的 session 串流狀態
+    stream_eviction_task = asyncio.ensure_future(run_stream_eviction())
+    
+    # 清除當機 worker 留下的 session 登錄，之後定期更新本 worker 持有的 session
+    try:
+        refresh_registry()
+    except Exception as e:
+        logger.error(f"清除 session 登錄失敗：{e}")
+    registry_heartbeat_task = asyncio.ensure_future(run_registry_heartbeat())
+    
+    # 偵測本機 OpenCV 支援的影片編碼器（結果快取，編碼預設依此選擇編碼器）
+    await asyncio.get_running_loop().run_in_executor(None, detect_codecs)
     
-    # 測試資料庫連接
+    # 測試資料庫連接（在 I/O 執行緒中連線與建立索引）
     try:
-        db = get_database()
+        await async_db.connect()
         logger.info("資料庫連接成功")
     except Exception as e:
         logger.error(f"資料庫連接失敗：{e}")
@@ -484,12 +1032,32 @@ async def shutdown_event():
     for session_id, video_processor in active_sessions.items():
         try:
             video_processor.stop_camera()
+            session_registry.unregister(session_id)
             logger.info(f"Session {session_id} 已停止")
         except Exception as e:
             logger.error(f"停止 Session {session_id} 失敗：{e}")
     
+    for session_id in websocket_connections:
+        session_registry.clear_route(session_id, feedback_bus.address)
+    
     active_sessions.clear()
     websocket_connections.clear()
+    pose_streams.clear()
+    stream_last_used.clear()
+    segment_requests.clear()
+    for task in (stream_eviction_task, registry_heartbeat_task):
+        if task is not None:
+            task.cancel()
+    analysis_executor.shutdown()
+    export_jobs.shutdown()
+    
+    # 寫入資料庫寫入緩衝中的操作
+    try:
+        await async_db.flush()
+    except Exception as e:
+        logger.error(f"寫入資料庫緩衝失敗：{e}")
+    async_db.shutdown()
+    await feedback_bus.stop()
 
 
 # ==================== 主程式入口 ====================
@@ -0,0 +1,226 @@
+"""
+AI 瑜珈教練系統 - 效能指標模組
+收集熱路徑延遲並以 Prometheus 文字格式輸出（GET /metrics）
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 百分位數（p50 / p95 / p99）
+QUANTILES = (0.5, 0.95, 0.99)
+# 每組標籤保留最近多少筆樣本計算百分位數（固定記憶體）
+WINDOW_SIZE = 1024
+
+LabelValues = Tuple[str, ...]
+GaugeValue = Union[float, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    """跳脫標籤值中的反斜線、引號與換行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """組合 Prometheus 標籤字串，例如 {operation="save_session",quantile="0.5"}"""
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Window:
+    """單一標籤組合的樣本：最近 WINDOW_SIZE 筆（環形緩衝區）加上累計次數與總和"""
+    
+    __slots__ = ('samples', 'count', 'total')
+    
+    def __init__(self):
+        self.samples = np.zeros(WINDOW_SIZE, dtype=np.float64)
+        self.count = 0
+        self.total = 0.0
+    
+    def add(self, value: float):
+        self.samples[self.count % WINDOW_SIZE] = value
+        self.count += 1
+        self.total += value
+    
+    def quantiles(self) -> np.ndarray:
+        return np.quantile(self.samples[:min(self.count, WINDOW_SIZE)], QUANTILES)
+
+
+class Histogram:
+    """
+    延遲分布（以 Prometheus summary 輸出 p50 / p95 / p99、_sum 與 _count）
+    
+    百分位數以最近 WINDOW_SIZE 筆樣本計算，反映目前的延遲而非啟動以來的平均。
+    可在多個執行緒中使用。
+    """
+    
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        """
+        Args:
+            name: 指標名稱
+            documentation: 說明
+            label_names: 標籤名稱
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._windows: Dict[LabelValues, _Window] = {}
+        self._lock = threading.Lock()
+    
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"指標 {self.name} 的標籤應為 {self.label_names}，實際為 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+    
+    def observe(self, value: float, **labels: str):
+        """
+        記錄一筆樣本
+        
+        Args:
+            value: 樣本值（時間以秒為單位）
+            **labels: 標籤值
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = _Window()
+            window.add(value)
+    
+    @contextmanager
+    def time(self, **labels: str):
+        """計時區塊（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def timed(self, **labels: str) -> Callable:
+        """計時函式呼叫的裝飾器"""
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def snapshot(self) -> Dict[LabelValues, Dict]:
+        """
+        目前的統計
+        
+        Returns:
+            Dict: 標籤值 → {'count', 'sum', 'quantiles': {0.5: ..., 0.95: ..., 0.99: ...}}
+        """
+        with self._lock:
+            return {
+                key: {
+                    'count': window.count,
+                    'sum': window.total,
+                    'quantiles': dict(zip(QUANTILES, window.quantiles().tolist())),
+                }
+                for key, window in self._windows.items()
+            }
+    
+    def render(self) -> List[str]:
+        """Prometheus 文字格式"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} summary']
+        for key, stats in sorted(self.snapshot().items()):
+            for q, value in stats['quantiles'].items():
+                lines.append(f"{self.name}{_format_labels(self.label_names, key, ('quantile', str(q)))} {value:.9g}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {stats['sum']:.9g}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {stats['count']}")
+        return lines
+
+
+class GaugeCallback:
+    """
+    讀取時才計算的指標（例如佇列深度、累計次數）
+    
+    callback 回傳單一數值，或 [(標籤 dict, 數值), ...]。
+    """
+    
+    def __init__(self, name: str, documentation: str, callback: Callable[[], GaugeValue],
+                 metric_type: str = 'gauge'):
+        """
+        Args:
+            name: 指標名稱
+            documentation: 說明
+            callback: 取值函式
+            metric_type: gauge 或 counter
+        """
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.metric_type = metric_type
+    
+    def render(self) -> List[str]:
+        """Prometheus 文字格式"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        value = self.callback()
+        samples = value if isinstance(value, list) else [({}, value)]
+        for labels, sample in samples:
+            lines.append(f"{self.name}{_format_labels(tuple(labels), tuple(labels.values()))} {float(sample):.9g}")
+        return lines
+
+
+class MetricsRegistry:
+    """指標登錄，依登錄順序輸出"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Union[Histogram, GaugeCallback]] = {}
+        self._lock = threading.Lock()
+    
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Histogram:
+        """取得或建立延遲分布"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, label_names)
+            return self._metrics[name]
+    
+    def gauge(self, name: str, documentation: str, callback: Callable[[], GaugeValue],
+              metric_type: str = 'gauge') -> GaugeCallback:
+        """登錄（或取代）讀取時計算的指標"""
+        with self._lock:
+            self._metrics[name] = GaugeCallback(name, documentation, callback, metric_type)
+            return self._metrics[name]
+    
+    def render(self) -> str:
+        """
+        輸出所有指標
+        
+        Returns:
+            str: Prometheus 文字格式（text/plain; version=0.0.4）
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 全域指標登錄
+METRICS = MetricsRegistry()
+
+POSE_ANALYSIS_SECONDS = METRICS.histogram(
+    'yoga_pose_analysis_seconds', '姿勢分析時間（含等待執行器）', ('path',))
+WEBSOCKET_SEND_SECONDS = METRICS.histogram(
+    'yoga_websocket_send_seconds', 'WebSocket 訊息發送時間', ('route',))
+DB_CALL_SECONDS = METRICS.histogram(
+    'yoga_db_call_seconds', '資料庫呼叫延遲', ('operation',))
+TTS_SYNTHESIS_SECONDS = METRICS.histogram(
+    'yoga_tts_synthesis_seconds', '語音合成時間')
+DB_WRITE_BATCH_OPS = METRICS.histogram(
+    'yoga_db_write_batch_ops', '每次 bulk_write 合併的寫入操作數')
+VIDEO_MERGE_FPS = METRICS.histogram(
+    'yoga_video_merge_fps', '影片合併速度（每秒處理影格數）')
@@ -3,10 +3,11 @@ AI 瑜珈教練系統 - 姿勢分析模組
 使用 MediaPipe 進行姿勢估計與分析
 """
 
-import math
-import cv2
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union, Sequence
+
+from config import SUPPORTED_POSES
+from pose_definitions import JOINT_ANGLE_DEFINITIONS, POSE_DEFINITIONS
 # import mediapipe as mp
 
 # MediaPipe Pose 解決方案
@@ -51,6 +52,142 @@ class PoseLandmark:
     RIGHT_FOOT_INDEX = 32
 
 
+# 無法識別時的姿勢名稱
+UNKNOWN_POSE = 'Unknown'
+
+# 自動偵測時的最低分數，所有姿勢都低於此分數則視為未知姿勢
+MIN_DETECTION_SCORE = 50
+
+# Landmark 數量與陣列欄位順序
+LANDMARK_COUNT = 33
+LANDMARK_FIELDS = ('x', 'y', 'z', 'visibility')
+
+
+def landmarks_to_array(landmarks: List[Dict]) -> np.ndarray:
+    """
+    將 MediaPipe 格式的 landmark dict 列表轉換為 (N, 4) float32 陣列
+    
+    Args:
+        landmarks: [{x, y, z, visibility}, ...]
+    
+    Returns:
+        np.ndarray: 欄位順序為 x, y, z, visibility 的陣列
+    
+    Raises:
+        ValueError: 含有非有限數值（NaN 或 inf，JSON 可傳入），避免污染串流的濾波狀態
+    """
+    array = np.array(
+        [(lm['x'], lm['y'], lm.get('z', 0.0), lm.get('visibility', 1.0)) for lm in landmarks],
+        dtype=np.float32
+    ).reshape(-1, 4)
+    if not np.isfinite(array).all():
+        raise ValueError("Landmark 含有非有限數值（NaN 或 inf）")
+    return array
+
+
+class PoseLandmarks:
+    """
+    單一影格的姿勢關鍵點
+    
+    以一個 (33, 4) float32 陣列儲存 x, y, z, visibility，
+    每個請求只建立一次，所有關節角度都由此陣列批次計算。
+    """
+    
+    __slots__ = ('array',)
+    
+    def __init__(self, array: np.ndarray):
+        """
+        Args:
+            array: (33, 4) landmark 陣列
+        """
+        array = np.asarray(array, dtype=np.float32)
+        if array.shape != (LANDMARK_COUNT, 4):
+            raise ValueError(f"Landmark 陣列形狀應為 ({LANDMARK_COUNT}, 4)，實際為 {array.shape}")
+        self.array = array
+    
+    @classmethod
+    def from_dicts(cls, landmarks: List[Dict]) -> 'PoseLandmarks':
+        """由 MediaPipe 格式的 dict 列表建立"""
+        return cls(landmarks_to_array(landmarks))
+    
+    def __len__(self) -> int:
+        return LANDMARK_COUNT
+    
+    def __getitem__(self, index: int) -> Dict:
+        """以 dict 形式取得單一 landmark（相容舊版介面）"""
+        return dict(zip(LANDMARK_FIELDS, self.array[index].tolist()))
+    
+    def angles(self, triplets: np.ndarray) -> np.ndarray:
+        """
+        批次計算多組關節角度
+        
+        Args:
+            triplets: (K, 3) landmark 索引陣列
+        
+        Returns:
+            np.ndarray: (K,) 夾角度數
+        """
+        return calculate_angles(self.array, triplets)
+
+
+LandmarksInput = Union[List[Dict], PoseLandmarks, np.ndarray]
+
+
+def as_pose_landmarks(landmarks: LandmarksInput) -> PoseLandmarks:
+    """將 dict 列表或陣列轉換為 PoseLandmarks（已是 PoseLandmarks 則直接回傳）"""
+    if isinstance(landmarks, PoseLandmarks):
+        return landmarks
+    if isinstance(landmarks, np.ndarray):
+        return PoseLandmarks(landmarks)
+    return PoseLandmarks.from_dicts(landmarks)
+
+
+def calculate_angles(points: np.ndarray, triplets: np.ndarray) -> np.ndarray:
+    """
+    批次計算多組三點夾角（度數）
+    
+    Args:
+        points: (..., 33, 4) landmark 陣列，只使用 x, y
+        triplets: (K, 3) 整數陣列，每列為 (a, b, c) 的 landmark 索引，b 為夾角頂點
+    
+    Returns:
+        np.ndarray: (..., K) 夾角度數 (0-180)
+    """
+    xy = points[..., :2]
+    b_pos = xy[..., triplets[:, 1], :]
+    
+    # 計算向量
+    ba = xy[..., triplets[:, 0], :] - b_pos
+    bc = xy[..., triplets[:, 2], :] - b_pos
+    
+    # 計算夾角
+    dot = np.einsum('...i,...i->...', ba, bc)
+    norm = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1) + 1e-6
+    cosine_angle = np.clip(dot / norm, -1.0, 1.0)  # 避免數值誤差
+    
+    return np.degrees(np.arccos(cosine_angle))
+
+
+# 每個影格只計算一次的關節角度，所有姿勢規則共用（順序即特徵向量欄位順序）
+# 特徵名稱 → (a, b, c) landmark 索引，b 為夾角頂點
+JOINT_ANGLES = {
+    name: tuple(getattr(PoseLandmark, landmark) for landmark in triplet)
+    for name, triplet in JOINT_ANGLE_DEFINITIONS.items()
+}
+_JOINT_TRIPLETS = np.array(list(JOINT_ANGLES.values()))
+
+# 特徵向量欄位：關節角度 + 由角度與座標衍生的特徵
+FEATURE_NAMES = (
+    *JOINT_ANGLES,
+    'bent_leg_angle',      # 較彎的腿的角度
+    'straight_leg_angle',  # 較直的腿的角度
+    'wrist_height_diff',   # 左右手腕高度差
+    'left_leg_bent',       # 左腿比右腿彎（1.0 / 0.0）
+    'right_leg_bent',      # 右腿比左腿彎（1.0 / 0.0）
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+
 def calculate_angle(a: Dict, b: Dict, c: Dict) -> float:
     """
     計算三點 a-b-c 的夾角（度數）
@@ -81,20 +218,215 @@ def calculate_angle(a: Dict, b: Dict, c: Dict) -> float:
     return np.degrees(angle)
 
 
-def get_landmark(landmarks: List[Dict], index: int) -> Dict:
-    """取得指定索引的 landmark"""
-    return landmarks[index]
+def compute_pose_features(points: np.ndarray) -> np.ndarray:
+    """
+    計算每個影格的共用特徵向量
+    
+    每個不同的關節角度只計算一次，所有姿勢規則都從此特徵向量讀取，
+    因此自動偵測（評分所有姿勢）的成本與只檢查單一姿勢相近。
+    
+    Args:
+        points: (N, 33, 4) landmark 陣列
+    
+    Returns:
+        np.ndarray: (N, len(FEATURE_NAMES)) float32 特徵矩陣
+    """
+    features = np.empty(points.shape[:-2] + (len(FEATURE_NAMES),), dtype=np.float32)
+    features[..., :len(JOINT_ANGLES)] = calculate_angles(points, _JOINT_TRIPLETS)
+    
+    left_leg = features[..., FEATURE_INDEX['left_leg_angle']]
+    right_leg = features[..., FEATURE_INDEX['right_leg_angle']]
+    features[..., FEATURE_INDEX['bent_leg_angle']] = np.minimum(left_leg, right_leg)
+    features[..., FEATURE_INDEX['straight_leg_angle']] = np.maximum(left_leg, right_leg)
+    features[..., FEATURE_INDEX['wrist_height_diff']] = np.abs(
+        points[..., PoseLandmark.LEFT_WRIST, 1] - points[..., PoseLandmark.RIGHT_WRIST, 1]
+    )
+    features[..., FEATURE_INDEX['left_leg_bent']] = left_leg < right_leg
+    features[..., FEATURE_INDEX['right_leg_bent']] = right_leg < left_leg
+    
+    return features
+
+
+def _frame_labels(row: np.ndarray) -> Dict[str, str]:
+    """
+    單一影格的文字資訊，供回饋模板與詳細資訊使用
+    
+    Args:
+        row: (F,) 單一影格的特徵向量
+    """
+    left_leg_bent = row[FEATURE_INDEX['left_leg_bent']] > 0
+    right_leg_bent = row[FEATURE_INDEX['right_leg_bent']] > 0
+    return {
+        'bent_leg_name': "左腿" if left_leg_bent else "右腿",
+        'straight_leg_name': "右腿" if left_leg_bent else "左腿",
+        'support_side': "left" if right_leg_bent else "right",
+    }
+
+
+FRAME_LABELS = ('bent_leg_name', 'straight_leg_name', 'support_side')
 
 
-def check_warrior_ii(landmarks: List[Dict]) -> Dict:
+def _format_result(pose_name: str, score: int, feedback_points: List[str], details: Dict,
+                   messages: Dict[str, str]) -> Dict:
+    """組合單一影格的姿勢分析結果"""
+    # 判斷是否正確
+    correct = score >= 70
+    
+    # 生成回饋
+    if score >= 90:
+        feedback = messages['perfect']
+    elif score >= 70:
+        feedback = messages['good_prefix'] + "，".join(feedback_points) if feedback_points else messages['hold']
+    else:
+        feedback = "需要調整：" + "，".join(feedback_points)
+    
+    return {
+        'pose_name': pose_name,
+        'correct': bool(correct),
+        'score': int(score),
+        'feedback': feedback,
+        'details': details
+    }
+
+
+def _error_result(pose_name: str, error: Exception) -> Dict:
+    """姿勢分析失敗時的結果"""
+    return {
+        'pose_name': pose_name,
+        'correct': False,
+        'score': 0,
+        'feedback': f'姿勢分析錯誤：{str(error)}',
+        'details': {}
+    }
+
+
+class CompiledPoseRules:
     """
-    檢查 Warrior II（戰士二式）姿勢
+    編譯後的姿勢規則
+    
+    所有姿勢的規則攤平成 R 條，以陣列儲存特徵索引、可接受範圍與扣分權重，
+    評分時以一次矩陣乘法算出 N 個影格 × P 個姿勢的分數；
+    回饋文字只為實際回傳的姿勢組合。
+    """
+    
+    def __init__(self, definitions: List[Dict]):
+        """
+        Args:
+            definitions: 姿勢定義列表（格式見 pose_definitions.POSE_DEFINITIONS）
+        """
+        self.pose_names = [definition['name'] for definition in definitions]
+        self.pose_index = {name: p for p, name in enumerate(self.pose_names)}
+        self.messages = [definition['messages'] for definition in definitions]
+        self.details = [definition.get('details', {}) for definition in definitions]
+        
+        rules = [(p, rule) for p, definition in enumerate(definitions) for rule in definition['rules']]
+        for p, rule in rules:
+            if rule['feature'] not in FEATURE_INDEX:
+                raise ValueError(f"姿勢 {self.pose_names[p]} 使用未知的特徵：{rule['feature']}")
+        for p, details in enumerate(self.details):
+            for source in details.values():
+                if source not in FEATURE_INDEX and source not in FRAME_LABELS:
+                    raise ValueError(f"姿勢 {self.pose_names[p]} 的詳細資訊使用未知的欄位：{source}")
+        
+        # (R,) 規則所讀取的特徵欄位與可接受範圍
+        self.feature_columns = np.array([FEATURE_INDEX[rule['feature']] for _, rule in rules], dtype=np.intp)
+        self.low = np.array([rule['range'][0] for _, rule in rules], dtype=np.float64)
+        self.high = np.array([rule['range'][1] for _, rule in rules], dtype=np.float64)
+        self.feedback = [rule['feedback'] for _, rule in rules]
+        
+        # (R, P) 扣分權重矩陣：規則 r 屬於姿勢 p 時為其扣分，否則為 0
+        self.weights = np.zeros((len(rules), len(definitions)), dtype=np.int32)
+        for r, (p, rule) in enumerate(rules):
+            self.weights[r, p] = rule['penalty']
+        
+        # 各姿勢的規則索引（組合回饋時使用）
+        self.pose_rules = [[r for r, (rule_pose, _) in enumerate(rules) if rule_pose == p]
+                           for p in range(len(definitions))]
+    
+    def score(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        以一次矩陣運算評分所有姿勢
+        
+        Args:
+            features: (N, F) 共用特徵矩陣
+        
+        Returns:
+            Tuple: (scores (N, P) 分數（不低於 0）, violations (N, R) 各規則是否違反)
+        """
+        values = features[:, self.feature_columns]
+        violations = ~((values >= self.low) & (values <= self.high))
+        scores = np.maximum(0, 100 - violations.astype(np.int32) @ self.weights)
+        return scores, violations
+    
+    def build_result(self, pose: int, row: np.ndarray, score: int, violations: np.ndarray) -> Dict:
+        """
+        組合單一影格、單一姿勢的分析結果
+        
+        Args:
+            pose: 姿勢索引
+            row: (F,) 該影格的特徵向量
+            score: 該姿勢分數
+            violations: (R,) 該影格各規則是否違反
+        """
+        labels = _frame_labels(row)
+        feedback_points = [self.feedback[r].format(**labels) for r in self.pose_rules[pose] if violations[r]]
+        details = {
+            key: labels[source] if source in labels else round(float(row[FEATURE_INDEX[source]]), 1)
+            for key, source in self.details[pose].items()
+        }
+        return _format_result(self.pose_names[pose], score, feedback_points, details, self.messages[pose])
+
+
+def compile_pose_rules(pose_names: Sequence[str]) -> CompiledPoseRules:
+    """
+    依姿勢名稱編譯姿勢規則
     
-    標準：
-    - 雙臂水平展開（肩膀-手肘-手腕約 170-180 度）
-    - 前腿膝蓋彎曲 90 度
-    - 後腿伸直
-    - 軀幹直立
+    Args:
+        pose_names: 要啟用的姿勢名稱（順序即自動偵測時分數相同的優先順序）
+    
+    Returns:
+        CompiledPoseRules: 編譯後的規則
+    """
+    definitions_by_name = {definition['name']: definition for definition in POSE_DEFINITIONS}
+    missing = [name for name in pose_names if name not in definitions_by_name]
+    if missing:
+        raise ValueError(f"找不到姿勢定義：{', '.join(missing)}")
+    return CompiledPoseRules([definitions_by_name[name] for name in pose_names])
+
+
+# 啟動時編譯所有支援的姿勢
+POSE_RULES = compile_pose_rules(SUPPORTED_POSES)
+
+
+def score_frames(points: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    計算特徵並評分所有姿勢（不含回饋文字，無狀態，可在其他執行緒或行程中執行）
+    
+    Args:
+        points: (N, 33, 4) landmark 陣列
+    
+    Returns:
+        Tuple: (features (N, F), scores (N, P), violations (N, R))
+    """
+    features = compute_pose_features(points)
+    scores, violations = POSE_RULES.score(features)
+    return features, scores, violations
+
+
+def _check_single(pose_name: str, landmarks: LandmarksInput) -> Dict:
+    """以單一影格檢查指定姿勢"""
+    try:
+        if pose_name not in POSE_RULES.pose_index:
+            raise ValueError(f"不支援的姿勢：{pose_name}")
+        features = compute_pose_features(as_pose_landmarks(landmarks).array[np.newaxis])
+        return _analyze_group(features, pose_name)[0]
+    except Exception as e:
+        return _error_result(pose_name, e)
+
+
+def check_warrior_ii(landmarks: LandmarksInput) -> Dict:
+    """
+    檢查 Warrior II（戰士二式）姿勢
     
     Returns:
         Dict: {
@@ -105,303 +437,114 @@ def check_warrior_ii(landmarks: List[Dict]) -> Dict:
             'details': dict
         }
     """
-    try:
-        # 取得關鍵點
-        left_shoulder = get_landmark(landmarks, PoseLandmark.LEFT_SHOULDER)
-        left_elbow = get_landmark(landmarks, PoseLandmark.LEFT_ELBOW)
-        left_wrist = get_landmark(landmarks, PoseLandmark.LEFT_WRIST)
-        
-        right_shoulder = get_landmark(landmarks, PoseLandmark.RIGHT_SHOULDER)
-        right_elbow = get_landmark(landmarks, PoseLandmark.RIGHT_ELBOW)
-        right_wrist = get_landmark(landmarks, PoseLandmark.RIGHT_WRIST)
-        
-        left_hip = get_landmark(landmarks, PoseLandmark.LEFT_HIP)
-        left_knee = get_landmark(landmarks, PoseLandmark.LEFT_KNEE)
-        left_ankle = get_landmark(landmarks, PoseLandmark.LEFT_ANKLE)
-        
-        right_hip = get_landmark(landmarks, PoseLandmark.RIGHT_HIP)
-        right_knee = get_landmark(landmarks, PoseLandmark.RIGHT_KNEE)
-        right_ankle = get_landmark(landmarks, PoseLandmark.RIGHT_ANKLE)
-        
-        # 計算手臂角度（應接近 180 度，即伸直）
-        left_arm_angle = calculate_angle(left_shoulder, left_elbow, left_wrist)
-        right_arm_angle = calculate_angle(right_shoulder, right_elbow, right_wrist)
-        
-        # 計算腿部角度
-        left_leg_angle = calculate_angle(left_hip, left_knee, left_ankle)
-        right_leg_angle = calculate_angle(right_hip, right_knee, right_ankle)
-        
-        # 評分邏輯
-        score = 100
-        feedback_points = []
-        
-        # 檢查手臂是否伸直（170-180 度）
-        if not (170 <= left_arm_angle <= 180):
-            score -= 15
-            feedback_points.append("左手臂需要更伸直")
-        
-        if not (170 <= right_arm_angle <= 180):
-            score -= 15
-            feedback_points.append("右手臂需要更伸直")
-        
-        # 檢查腿部（一腿彎曲約 90 度，一腿伸直約 170-180 度）
-        # 判斷哪條腿是前腿（彎曲）
-        if left_leg_angle < right_leg_angle:
-            # 左腿是前腿
-            if not (80 <= left_leg_angle <= 110):
-                score -= 20
-                feedback_points.append("前腿（左腿）膝蓋應彎曲成 90 度")
-            if not (160 <= right_leg_angle <= 180):
-                score -= 15
-                feedback_points.append("後腿（右腿）應保持伸直")
-        else:
-            # 右腿是前腿
-            if not (80 <= right_leg_angle <= 110):
-                score -= 20
-                feedback_points.append("前腿（右腿）膝蓋應彎曲成 90 度")
-            if not (160 <= left_leg_angle <= 180):
-                score -= 15
-                feedback_points.append("後腿（左腿）應保持伸直")
-        
-        # 確保分數不低於 0
-        score = max(0, score)
-        
-        # 判斷是否正確
-        correct = score >= 70
-        
-        # 生成回饋
-        if score >= 90:
-            feedback = "完美的 Warrior II！姿勢非常標準。"
-        elif score >= 70:
-            feedback = "很好！" + "，".join(feedback_points) if feedback_points else "保持這個姿勢。"
-        else:
-            feedback = "需要調整：" + "，".join(feedback_points)
-        
-        return {
-            'pose_name': 'Warrior II',
-            'correct': correct,
-            'score': int(score),
-            'feedback': feedback,
-            'details': {
-                'left_arm_angle': round(left_arm_angle, 1),
-                'right_arm_angle': round(right_arm_angle, 1),
-                'left_leg_angle': round(left_leg_angle, 1),
-                'right_leg_angle': round(right_leg_angle, 1),
-            }
-        }
-        
-    except Exception as e:
-        return {
-            'pose_name': 'Warrior II',
-            'correct': False,
-            'score': 0,
-            'feedback': f'姿勢分析錯誤：{str(e)}',
-            'details': {}
-        }
+    return _check_single('Warrior II', landmarks)
 
 
-def check_tree_pose(landmarks: List[Dict]) -> Dict:
+def check_tree_pose(landmarks: LandmarksInput) -> Dict:
     """
     檢查 Tree Pose（樹式）姿勢
     
-    標準：
-    - 單腿站立，另一腿彎曲腳掌貼於支撐腿大腿內側
-    - 雙手合十於胸前或高舉過頭
-    - 身體保持直立平衡
-    
     Returns:
         Dict: 姿勢分析結果
     """
-    try:
-        # 取得關鍵點
-        left_hip = get_landmark(landmarks, PoseLandmark.LEFT_HIP)
-        left_knee = get_landmark(landmarks, PoseLandmark.LEFT_KNEE)
-        left_ankle = get_landmark(landmarks, PoseLandmark.LEFT_ANKLE)
-        
-        right_hip = get_landmark(landmarks, PoseLandmark.RIGHT_HIP)
-        right_knee = get_landmark(landmarks, PoseLandmark.RIGHT_KNEE)
-        right_ankle = get_landmark(landmarks, PoseLandmark.RIGHT_ANKLE)
-        
-        left_shoulder = get_landmark(landmarks, PoseLandmark.LEFT_SHOULDER)
-        left_wrist = get_landmark(landmarks, PoseLandmark.LEFT_WRIST)
-        
-        # 計算腿部角度
-        left_leg_angle = calculate_angle(left_hip, left_knee, left_ankle)
-        right_leg_angle = calculate_angle(right_hip, right_knee, right_ankle)
-        
-        # 判斷哪條腿是支撐腿（較直的那條）
-        if left_leg_angle > right_leg_angle:
-            # 左腿支撐，右腿彎曲
-            support_leg = "left"
-            support_angle = left_leg_angle
-            bent_angle = right_leg_angle
-        else:
-            # 右腿支撐，左腿彎曲
-            support_leg = "right"
-            support_angle = right_leg_angle
-            bent_angle = left_leg_angle
-        
-        # 評分
-        score = 100
-        feedback_points = []
-        
-        # 支撐腿應接近伸直（160-180 度）
-        if not (160 <= support_angle <= 180):
-            score -= 20
-            feedback_points.append("支撐腿需要伸直")
-        
-        # 彎曲腿應彎曲（30-90 度）
-        if not (30 <= bent_angle <= 90):
-            score -= 25
-            feedback_points.append("彎曲腿的角度需要調整")
-        
-        # 檢查平衡（簡單檢查：手腕高度應接近）
-        wrist_height_diff = abs(left_wrist['y'] - landmarks[PoseLandmark.RIGHT_WRIST]['y'])
-        if wrist_height_diff > 0.1:
-            score -= 15
-            feedback_points.append("保持身體平衡，雙手高度一致")
-        
-        score = max(0, score)
-        correct = score >= 70
-        
-        if score >= 90:
-            feedback = "完美的 Tree Pose！平衡感極佳。"
-        elif score >= 70:
-            feedback = "不錯！" + "，".join(feedback_points) if feedback_points else "保持平衡。"
-        else:
-            feedback = "需要調整：" + "，".join(feedback_points)
-        
-        return {
-            'pose_name': 'Tree Pose',
-            'correct': correct,
-            'score': int(score),
-            'feedback': feedback,
-            'details': {
-                'support_leg': support_leg,
-                'support_angle': round(support_angle, 1),
-                'bent_angle': round(bent_angle, 1),
-            }
-        }
-        
-    except Exception as e:
-        return {
-            'pose_name': 'Tree Pose',
-            'correct': False,
-            'score': 0,
-            'feedback': f'姿勢分析錯誤：{str(e)}',
-            'details': {}
-        }
+    return _check_single('Tree Pose', landmarks)
 
 
-def check_downward_dog(landmarks: List[Dict]) -> Dict:
+def check_downward_dog(landmarks: LandmarksInput) -> Dict:
     """
     檢查 Downward Dog（下犬式）姿勢
     
-    標準：
-    - 身體呈倒 V 字形
-    - 雙手與雙腳著地，臀部抬高
-    - 手臂與軀幹接近一直線
-    - 腿部盡量伸直
-    
     Returns:
         Dict: 姿勢分析結果
     """
-    try:
-        # 取得關鍵點
-        left_shoulder = get_landmark(landmarks, PoseLandmark.LEFT_SHOULDER)
-        left_elbow = get_landmark(landmarks, PoseLandmark.LEFT_ELBOW)
-        left_wrist = get_landmark(landmarks, PoseLandmark.LEFT_WRIST)
-        left_hip = get_landmark(landmarks, PoseLandmark.LEFT_HIP)
-        left_knee = get_landmark(landmarks, PoseLandmark.LEFT_KNEE)
-        left_ankle = get_landmark(landmarks, PoseLandmark.LEFT_ANKLE)
-        
-        right_shoulder = get_landmark(landmarks, PoseLandmark.RIGHT_SHOULDER)
-        right_hip = get_landmark(landmarks, PoseLandmark.RIGHT_HIP)
-        right_knee = get_landmark(landmarks, PoseLandmark.RIGHT_KNEE)
-        
-        # 計算角度
-        # 上半身角度（肩膀-臀部-膝蓋應小於 90 度，形成倒 V）
-        left_body_angle = calculate_angle(left_shoulder, left_hip, left_knee)
-        
-        # 腿部角度（應接近伸直）
-        left_leg_angle = calculate_angle(left_hip, left_knee, left_ankle)
-        right_leg_angle = calculate_angle(right_hip, right_knee, landmarks[PoseLandmark.RIGHT_ANKLE])
-        
-        # 手臂角度（應伸直）
-        left_arm_angle = calculate_angle(left_shoulder, left_elbow, left_wrist)
-        right_arm_angle = calculate_angle(right_shoulder, landmarks[PoseLandmark.RIGHT_ELBOW], landmarks[PoseLandmark.RIGHT_WRIST])
-        
-        # 評分
-        score = 100
-        feedback_points = []
-        
-        # 檢查倒 V 形狀（身體角度應小於 90 度）
-        if not (30 <= left_body_angle <= 80):
-            score -= 25
-            feedback_points.append("臀部需要抬高，形成倒 V 字形")
-        
-        # 檢查腿部伸直
-        if not (160 <= left_leg_angle <= 180):
-            score -= 15
-            feedback_points.append("左腿需要伸直")
-        if not (160 <= right_leg_angle <= 180):
-            score -= 15
-            feedback_points.append("右腿需要伸直")
-        
-        # 檢查手臂伸直
-        if not (160 <= left_arm_angle <= 180):
-            score -= 15
-            feedback_points.append("左手臂需要伸直")
-        if not (160 <= right_arm_angle <= 180):
-            score -= 15
-            feedback_points.append("右手臂需要伸直")
-        
-        score = max(0, score)
-        correct = score >= 70
-        
-        if score >= 90:
-            feedback = "完美的 Downward Dog！姿勢標準。"
-        elif score >= 70:
-            feedback = "不錯！" + "，".join(feedback_points) if feedback_points else "保持這個姿勢。"
+    return _check_single('Downward Dog', landmarks)
+
+
+def unknown_result() -> Dict:
+    """無法識別姿勢時的結果"""
+    return {
+        'pose_name': UNKNOWN_POSE,
+        'correct': False,
+        'score': 0,
+        'feedback': '無法識別標準瑜珈姿勢，請調整姿勢',
+        'details': {}
+    }
+
+
+def _analyze_group(features: np.ndarray, pose_hint: Optional[str]) -> List[Dict]:
+    """以相同姿勢提示分析一批影格的特徵"""
+    # 一次矩陣運算評分所有姿勢
+    scores, violations = POSE_RULES.score(features)
+    
+    # 如果有姿勢提示，直接回傳該姿勢
+    if pose_hint in POSE_RULES.pose_index:
+        pose = POSE_RULES.pose_index[pose_hint]
+        return [
+            POSE_RULES.build_result(pose, features[i], scores[i, pose], violations[i])
+            for i in range(len(features))
+        ]
+    
+    # 否則，選擇分數最高的姿勢
+    best = np.argmax(scores, axis=-1)
+    
+    results = []
+    for i, pose in enumerate(best.tolist()):
+        # 如果所有姿勢分數都很低，回傳未知姿勢
+        if scores[i, pose] < MIN_DETECTION_SCORE:
+            results.append(unknown_result())
         else:
-            feedback = "需要調整：" + "，".join(feedback_points)
-        
-        return {
-            'pose_name': 'Downward Dog',
-            'correct': correct,
-            'score': int(score),
-            'feedback': feedback,
-            'details': {
-                'body_angle': round(left_body_angle, 1),
-                'left_leg_angle': round(left_leg_angle, 1),
-                'right_leg_angle': round(right_leg_angle, 1),
-                'left_arm_angle': round(left_arm_angle, 1),
-                'right_arm_angle': round(right_arm_angle, 1),
-            }
-        }
-        
-    except Exception as e:
-        return {
-            'pose_name': 'Downward Dog',
-            'correct': False,
-            'score': 0,
-            'feedback': f'姿勢分析錯誤：{str(e)}',
-            'details': {}
-        }
+            results.append(POSE_RULES.build_result(pose, features[i], scores[i, pose], violations[i]))
+    return results
+
+
+def analyze_pose_batch(points: np.ndarray,
+                       pose_hint: Union[None, str, Sequence[Optional[str]]] = None) -> List[Dict]:
+    """
+    批次姿勢分析介面
+    
+    一次向量化評分 N 個影格，影格可來自同一個 session 的連續畫面，或多個 session。
+    
+    Args:
+        points: (N, 33, 4) landmark 陣列（x, y, z, visibility）
+        pose_hint: 姿勢提示（可選），可為單一字串套用到所有影格，或長度為 N 的列表
+    
+    Returns:
+        List[Dict]: N 個姿勢分析結果，順序與輸入相同
+    """
+    points = np.asarray(points, dtype=np.float32)
+    if points.ndim != 3 or points.shape[1:] != (LANDMARK_COUNT, 4):
+        raise ValueError(f"Landmark 陣列形狀應為 (N, {LANDMARK_COUNT}, 4)，實際為 {points.shape}")
+    
+    # 每個影格的關節角度只計算一次
+    features = compute_pose_features(points)
+    
+    if pose_hint is None or isinstance(pose_hint, str):
+        return _analyze_group(features, pose_hint)
+    
+    if len(pose_hint) != len(points):
+        raise ValueError(f"pose_hint 數量 ({len(pose_hint)}) 與影格數量 ({len(points)}) 不符")
+    
+    # 依姿勢提示分組，每組各做一次向量化評分
+    results: List[Optional[Dict]] = [None] * len(points)
+    for hint in set(pose_hint):
+        indices = [i for i, h in enumerate(pose_hint) if h == hint]
+        for i, result in zip(indices, _analyze_group(features[indices], hint)):
+            results[i] = result
+    return results
 
 
-def analyze_pose(landmarks: List[Dict], pose_hint: Optional[str] = None) -> Dict:
+def analyze_pose(landmarks: LandmarksInput, pose_hint: Optional[str] = None) -> Dict:
     """
     統一姿勢分析介面
     
     Args:
-        landmarks: MediaPipe 偵測到的 33 個關鍵點
+        landmarks: MediaPipe 偵測到的 33 個關鍵點（dict 列表、(33, 4) 陣列或 PoseLandmarks）
         pose_hint: 姿勢提示（可選），如果提供則只檢查該姿勢
     
     Returns:
         Dict: 姿勢分析結果
     """
-    if len(landmarks) != 33:
+    if len(landmarks) != LANDMARK_COUNT:
         return {
             'pose_name': 'Unknown',
             'correct': False,
@@ -410,36 +553,13 @@ def analyze_pose(landmarks: List[Dict], pose_hint: Optional[str] = None) -> Dict
             'details': {}
         }
     
-    # 如果有姿勢提示，直接檢查該姿勢
-    if pose_hint:
-        if pose_hint == "Warrior II":
-            return check_warrior_ii(landmarks)
-        elif pose_hint == "Tree Pose":
-            return check_tree_pose(landmarks)
-        elif pose_hint == "Downward Dog":
-            return check_downward_dog(landmarks)
-    
-    # 否則，嘗試所有姿勢並回傳分數最高的
-    results = [
-        check_warrior_ii(landmarks),
-        check_tree_pose(landmarks),
-        check_downward_dog(landmarks)
-    ]
-    
-    # 選擇分數最高的姿勢
-    best_result = max(results, key=lambda x: x['score'])
-    
-    # 如果所有姿勢分數都很低，回傳未知姿勢
-    if best_result['score'] < 50:
-        return {
-            'pose_name': 'Unknown',
-            'correct': False,
-            'score': 0,
-            'feedback': '無法識別標準瑜珈姿勢，請調整姿勢',
-            'details': {}
-        }
+    # 只轉換一次，各姿勢評分共用同一個陣列
+    try:
+        pose = as_pose_landmarks(landmarks)
+    except (KeyError, TypeError, ValueError) as e:
+        return _error_result('Unknown', e)
     
-    return best_result
+    return analyze_pose_batch(pose.array[np.newaxis], pose_hint)[0]
 
 
 # 注意：以下 PoseAnalyzer 類別使用舊版 MediaPipe API
@@ -0,0 +1,102 @@
+"""
+AI 瑜珈教練系統 - 姿勢定義
+以資料描述關節角度與各姿勢的評分規則，由 pose_analyzer 於啟動時編譯為陣列
+"""
+
+# 關節角度定義：特徵名稱 → (a, b, c) landmark 名稱（PoseLandmark 屬性），b 為夾角頂點
+# 每個影格每個角度只計算一次，所有姿勢規則共用
+JOINT_ANGLE_DEFINITIONS = {
+    'left_arm_angle': ('LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST'),
+    'right_arm_angle': ('RIGHT_SHOULDER', 'RIGHT_ELBOW', 'RIGHT_WRIST'),
+    'left_leg_angle': ('LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE'),
+    'right_leg_angle': ('RIGHT_HIP', 'RIGHT_KNEE', 'RIGHT_ANKLE'),
+    'body_angle': ('LEFT_SHOULDER', 'LEFT_HIP', 'LEFT_KNEE'),
+}
+
+# 姿勢定義
+#
+# 每個姿勢包含：
+# - name: 姿勢名稱（需與 config.SUPPORTED_POSES 一致）
+# - rules: 評分規則列表，特徵值不在 range [low, high] 內時扣 penalty 分並加入 feedback
+#          feature 可為關節角度或衍生特徵（見 pose_analyzer.FEATURE_NAMES）
+#          feedback 可使用 {bent_leg_name}、{straight_leg_name} 等影格資訊
+# - messages: perfect（≥ 90 分）、good_prefix（≥ 70 分時的回饋前綴）、hold（無需調整時）
+# - details: 回傳的詳細資訊，值為特徵名稱（回傳角度）或影格資訊名稱（回傳字串）
+POSE_DEFINITIONS = [
+    {
+        # 標準：雙臂水平展開、前腿膝蓋彎曲 90 度、後腿伸直、軀幹直立
+        'name': 'Warrior II',
+        'rules': [
+            {'feature': 'left_arm_angle', 'range': (170, 180), 'penalty': 15,
+             'feedback': '左手臂需要更伸直'},
+            {'feature': 'right_arm_angle', 'range': (170, 180), 'penalty': 15,
+             'feedback': '右手臂需要更伸直'},
+            # 較彎的腿為前腿
+            {'feature': 'bent_leg_angle', 'range': (80, 110), 'penalty': 20,
+             'feedback': '前腿（{bent_leg_name}）膝蓋應彎曲成 90 度'},
+            {'feature': 'straight_leg_angle', 'range': (160, 180), 'penalty': 15,
+             'feedback': '後腿（{straight_leg_name}）應保持伸直'},
+        ],
+        'messages': {
+            'perfect': '完美的 Warrior II！姿勢非常標準。',
+            'good_prefix': '很好！',
+            'hold': '保持這個姿勢。',
+        },
+        'details': {
+            'left_arm_angle': 'left_arm_angle',
+            'right_arm_angle': 'right_arm_angle',
+            'left_leg_angle': 'left_leg_angle',
+            'right_leg_angle': 'right_leg_angle',
+        },
+    },
+    {
+        # 標準：單腿站立，另一腿彎曲腳掌貼於支撐腿大腿內側、雙手高度一致、身體保持直立平衡
+        'name': 'Tree Pose',
+        'rules': [
+            {'feature': 'straight_leg_angle', 'range': (160, 180), 'penalty': 20,
+             'feedback': '支撐腿需要伸直'},
+            {'feature': 'bent_leg_angle', 'range': (30, 90), 'penalty': 25,
+             'feedback': '彎曲腿的角度需要調整'},
+            {'feature': 'wrist_height_diff', 'range': (0.0, 0.1), 'penalty': 15,
+             'feedback': '保持身體平衡，雙手高度一致'},
+        ],
+        'messages': {
+            'perfect': '完美的 Tree Pose！平衡感極佳。',
+            'good_prefix': '不錯！',
+            'hold': '保持平衡。',
+        },
+        'details': {
+            'support_leg': 'support_side',
+            'support_angle': 'straight_leg_angle',
+            'bent_angle': 'bent_leg_angle',
+        },
+    },
+    {
+        # 標準：身體呈倒 V 字形、臀部抬高、手臂與腿部伸直
+        'name': 'Downward Dog',
+        'rules': [
+            {'feature': 'body_angle', 'range': (30, 80), 'penalty': 25,
+             'feedback': '臀部需要抬高，形成倒 V 字形'},
+            {'feature': 'left_leg_angle', 'range': (160, 180), 'penalty': 15,
+             'feedback': '左腿需要伸直'},
+            {'feature': 'right_leg_angle', 'range': (160, 180), 'penalty': 15,
+             'feedback': '右腿需要伸直'},
+            {'feature': 'left_arm_angle', 'range': (160, 180), 'penalty': 15,
+             'feedback': '左手臂需要伸直'},
+            {'feature': 'right_arm_angle', 'range': (160, 180), 'penalty': 15,
+             'feedback': '右手臂需要伸直'},
+        ],
+        'messages': {
+            'perfect': '完美的 Downward Dog！姿勢標準。',
+            'good_prefix': '不錯！',
+            'hold': '保持這個姿勢。',
+        },
+        'details': {
+            'body_angle': 'body_angle',
+            'left_leg_angle': 'left_leg_angle',
+            'right_leg_angle': 'right_leg_angle',
+            'left_arm_angle': 'left_arm_angle',
+            'right_arm_angle': 'right_arm_angle',
+        },
+    },
+]
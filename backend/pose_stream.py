@@ -0,0 +1,318 @@
+"""
+AI 瑜珈教練系統 - 串流姿勢分析模組
+為每個 session 提供時間平滑與姿勢遲滯，只在結果改變時才推送回饋
+"""
+
+import math
+import time
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from config import (
+    POSE_FILTER_MIN_CUTOFF, POSE_FILTER_BETA, POSE_FILTER_D_CUTOFF, POSE_SWITCH_FRAMES,
+    POSE_CHANGE_EPSILON
+)
+from pose_analyzer import (
+    LandmarksInput, as_pose_landmarks, score_frames, unknown_result,
+    POSE_RULES, UNKNOWN_POSE, MIN_DETECTION_SCORE
+)
+
+
+class OneEuroFilter:
+    """
+    One-Euro 濾波器（逐元素作用於整個 landmark 陣列）
+    
+    靜止時以低截止頻率抑制抖動，快速移動時提高截止頻率以降低延遲。
+    狀態只有上一個輸出、上一個速度與時間戳記。
+    """
+    
+    def __init__(self, min_cutoff: float = POSE_FILTER_MIN_CUTOFF, beta: float = POSE_FILTER_BETA,
+                 d_cutoff: float = POSE_FILTER_D_CUTOFF):
+        """
+        Args:
+            min_cutoff: 最小截止頻率（Hz）
+            beta: 速度係數
+            d_cutoff: 速度估計的截止頻率（Hz）
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.x_prev: Optional[np.ndarray] = None
+        self.dx_prev: Optional[np.ndarray] = None
+        self.t_prev: Optional[float] = None
+    
+    @staticmethod
+    def _alpha(cutoff, dt: float):
+        """由截止頻率計算平滑係數"""
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+    
+    def reset(self):
+        """清除濾波狀態"""
+        self.x_prev = None
+        self.dx_prev = None
+        self.t_prev = None
+    
+    def __call__(self, x: np.ndarray, t: float) -> np.ndarray:
+        """
+        濾波一個影格
+        
+        Args:
+            x: landmark 陣列
+            t: 時間戳記（秒）
+        
+        Returns:
+            np.ndarray: 濾波後的陣列（與 x 同形狀，新配置）
+        """
+        # 非有限數值（NaN / inf）不進入濾波狀態，否則之後每個影格的輸出都會是 NaN：
+        # 這些元素沿用上一個輸出，尚無狀態時原樣回傳、不初始化
+        finite = np.isfinite(x)
+        if not finite.all():
+            if self.x_prev is None:
+                return np.array(x, dtype=np.float32)
+            x = np.where(finite, x, self.x_prev)
+        
+        if self.x_prev is None or t <= self.t_prev:
+            self.x_prev = np.array(x, dtype=np.float32)
+            self.dx_prev = np.zeros_like(self.x_prev)
+            self.t_prev = t
+            return self.x_prev
+        
+        dt = t - self.t_prev
+        
+        # 平滑速度估計
+        dx = (x - self.x_prev) / dt
+        dx_hat = self.dx_prev + self._alpha(self.d_cutoff, dt) * (dx - self.dx_prev)
+        
+        # 依速度調整截止頻率
+        cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+        x_hat = self.x_prev + self._alpha(cutoff, dt) * (x - self.x_prev)
+        
+        self.x_prev = x_hat.astype(np.float32, copy=False)
+        self.dx_prev = dx_hat
+        self.t_prev = t
+        return self.x_prev
+
+
+class StreamingPoseAnalyzer:
+    """
+    單一 session 的串流姿勢分析器
+    
+    - 以 One-Euro 濾波平滑 landmark 抖動
+    - 姿勢遲滯：新姿勢需連續 switch_frames 個影格勝出才切換，避免 pose_name 閃爍
+    - 只在姿勢名稱、分數或回饋文字改變時標記為需要推送
+    - 變化偵測：landmark 與上次評分的影格幾乎相同時，直接沿用上次結果
+    
+    濾波的時間來源在第一個影格決定，之後整個串流使用同一個時鐘（兩個時鐘的原點不同，混用會破壞 dt）：
+    第一個影格帶有用戶端時間時使用用戶端時鐘，缺少時間的影格以上一個用戶端時間加上伺服器經過的時間估計；
+    否則使用伺服器接收時間，之後的用戶端時間一律忽略。
+    
+    狀態大小固定（O(1)），與 session 長度無關。
+    """
+    
+    def __init__(self, switch_frames: int = POSE_SWITCH_FRAMES, landmark_filter: Optional[OneEuroFilter] = None,
+                 change_epsilon: float = POSE_CHANGE_EPSILON):
+        """
+        Args:
+            switch_frames: 切換姿勢所需的連續影格數
+            landmark_filter: landmark 濾波器（預設使用 config 的 One-Euro 參數）
+            change_epsilon: landmark 最大位移低於此值時沿用上次結果（0 表示停用）
+        """
+        self.switch_frames = max(1, switch_frames)
+        self.filter = landmark_filter if landmark_filter is not None else OneEuroFilter()
+        self.change_epsilon = change_epsilon
+        self._last_scored: Optional[np.ndarray] = None
+        self._last_pose_hint: Optional[str] = None
+        # 評分中的影格：序號 → (原始 landmarks, 姿勢提示)，評分成功後才成為變化偵測的比較基準
+        self._in_flight: Dict[int, Tuple[np.ndarray, Optional[str]]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.last_cache_hit = False
+        self.current_pose: Optional[str] = None
+        self._pending_pose: Optional[str] = None
+        self._pending_count = 0
+        self._last_emitted: Optional[Tuple] = None
+        self.last_result: Optional[Dict] = None
+        self._sequence = 0
+        self._finished_sequence = 0
+        # 時鐘選擇（None 表示尚未決定）與最後一個用戶端時間、對應的伺服器時間
+        self._client_clock: Optional[bool] = None
+        self._last_client_time = 0.0
+        self._last_server_time = 0.0
+    
+    def _detect(self, scores: np.ndarray) -> str:
+        """依單一影格的分數決定候選姿勢"""
+        best = int(np.argmax(scores))
+        if scores[best] < MIN_DETECTION_SCORE:
+            return UNKNOWN_POSE
+        return POSE_RULES.pose_names[best]
+    
+    def _apply_hysteresis(self, candidate: str) -> str:
+        """候選姿勢需連續勝出 switch_frames 個影格才會取代目前姿勢"""
+        if self.current_pose is None or candidate == self.current_pose:
+            self.current_pose = candidate
+            self._pending_pose = None
+            self._pending_count = 0
+        elif candidate == self._pending_pose:
+            self._pending_count += 1
+        else:
+            self._pending_pose = candidate
+            self._pending_count = 1
+        
+        if self._pending_pose is not None and self._pending_count >= self.switch_frames:
+            self.current_pose = self._pending_pose
+            self._pending_pose = None
+            self._pending_count = 0
+        
+        return self.current_pose
+    
+    def _is_unchanged(self, points: np.ndarray, pose_hint: Optional[str]) -> bool:
+        """
+        判斷影格是否可沿用上次結果
+        
+        條件：已有評分完成的結果，x, y 與該影格相比最大位移低於 change_epsilon，且濾波輸出已收斂到該位置、
+        沒有等待中的姿勢切換（否則遲滯與平滑會停在過時的狀態）
+        """
+        if (self.change_epsilon <= 0 or self._last_scored is None or self.last_result is None
+                or pose_hint != self._last_pose_hint or self._pending_pose is not None):
+            return False
+        for reference in (self._last_scored, self.filter.x_prev):
+            if reference is None or float(np.abs(points[:, :2] - reference[:, :2]).max()) >= self.change_epsilon:
+                return False
+        return True
+    
+    def _frame_time(self, timestamp: Optional[float]) -> float:
+        """
+        依串流的時鐘選擇取得影格時間（第一個影格決定使用用戶端或伺服器時鐘）
+        
+        Args:
+            timestamp: 用戶端影格時間（秒，可為 None）
+        
+        Returns:
+            float: 濾波使用的時間（秒）
+        """
+        now = time.monotonic()
+        if self._client_clock is None:
+            self._client_clock = timestamp is not None
+        if not self._client_clock:
+            return now
+        if timestamp is None:
+            return self._last_client_time + (now - self._last_server_time)
+        self._last_client_time = timestamp
+        self._last_server_time = now
+        return timestamp
+    
+    def cache_stats(self) -> Dict:
+        """變化偵測快取統計"""
+        return {
+            'hit': self.last_cache_hit,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+        }
+    
+    def begin(self, landmarks: LandmarksInput, pose_hint: Optional[str] = None,
+              timestamp: Optional[float] = None) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        分析的第一階段：變化偵測與濾波（輕量，需在持有串流狀態的執行緒執行）
+        
+        Args:
+            landmarks: 33 個關鍵點（dict 列表、(33, 4) 陣列或 PoseLandmarks）
+            pose_hint: 姿勢提示（可選）
+            timestamp: 用戶端影格時間（秒，可選；時鐘選擇見類別說明）
+        
+        Returns:
+            Tuple[int, Optional[np.ndarray]]: (影格序號, 濾波後的 (1, 33, 4) 陣列；沿用上次結果時為 None)
+        """
+        points = as_pose_landmarks(landmarks).array
+        t = self._frame_time(timestamp)
+        self._sequence += 1
+        
+        # 姿勢維持期間的影格幾乎相同：沿用上次結果，不重新評分
+        if self._is_unchanged(points, pose_hint):
+            self.cache_hits += 1
+            self.last_cache_hit = True
+            return self._sequence, None
+        
+        self.cache_misses += 1
+        self.last_cache_hit = False
+        # 評分完成（finish）前不更新比較基準：評分中或評分失敗的影格不能讓後續影格沿用結果
+        self._in_flight[self._sequence] = (points.copy(), pose_hint)
+        
+        return self._sequence, self.filter(points, t)[np.newaxis].copy()
+    
+    def finish(self, sequence: int, pose_hint: Optional[str],
+               scored: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> Tuple[Dict, bool]:
+        """
+        分析的最後階段：姿勢遲滯、組合回饋與變化判斷
+        
+        Args:
+            sequence: begin() 回傳的影格序號
+            pose_hint: 姿勢提示（與 begin() 相同）
+            scored: score_frames() 的結果；begin() 沿用上次結果時為 None
+        
+        Returns:
+            Tuple[Dict, bool]: (姿勢分析結果, 結果是否與上次推送的不同)
+        """
+        # 沿用上次結果，或較新的影格已先完成（評分在其他執行緒時可能亂序）
+        if scored is None or sequence < self._finished_sequence:
+            return self.last_result, False
+        self._finished_sequence = sequence
+        
+        # 以這個影格作為變化偵測的比較基準；較舊的評分中影格（含評分失敗的）不會再完成
+        self._last_scored, self._last_pose_hint = self._in_flight.pop(sequence, (None, None))
+        for stale in [key for key in self._in_flight if key < sequence]:
+            del self._in_flight[stale]
+        
+        features, scores, violations = scored
+        if pose_hint in POSE_RULES.pose_index:
+            # 指定姿勢時不需要遲滯
+            self.current_pose = pose_hint
+            self._pending_pose = None
+            self._pending_count = 0
+            pose_name = pose_hint
+        else:
+            pose_name = self._apply_hysteresis(self._detect(scores[0]))
+        if pose_name == UNKNOWN_POSE:
+            result = unknown_result()
+        else:
+            pose = POSE_RULES.pose_index[pose_name]
+            result = POSE_RULES.build_result(pose, features[0], scores[0, pose], violations[0])
+        
+        # 角度細節每個影格都會變動，只比較使用者看得到的部分
+        key = (result['pose_name'], result['score'], result['feedback'])
+        changed = key != self._last_emitted
+        if changed:
+            self._last_emitted = key
+        
+        self.last_result = result
+        return result, changed
+    
+    def update(self, landmarks: LandmarksInput, pose_hint: Optional[str] = None,
+               timestamp: Optional[float] = None) -> Tuple[Dict, bool]:
+        """
+        分析一個影格（在目前執行緒依序完成 begin、score_frames、finish）
+        
+        Args:
+            landmarks: 33 個關鍵點（dict 列表、(33, 4) 陣列或 PoseLandmarks）
+            pose_hint: 姿勢提示（可選）
+            timestamp: 影格時間（秒，預設使用伺服器接收時間）
+        
+        Returns:
+            Tuple[Dict, bool]: (姿勢分析結果, 結果是否與上次推送的不同)
+        """
+        sequence, smoothed = self.begin(landmarks, pose_hint, timestamp)
+        scored = score_frames(smoothed) if smoothed is not None else None
+        return self.finish(sequence, pose_hint, scored)
+    
+    def reset(self):
+        """清除所有串流狀態（例如切換到新的片段時）"""
+        self.filter.reset()
+        self.current_pose = None
+        self._pending_pose = None
+        self._pending_count = 0
+        self._last_emitted = None
+        self.last_result = None
+        self._last_scored = None
+        self._last_pose_hint = None
+        self._in_flight.clear()
+        self._client_clock = None
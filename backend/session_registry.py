@@ -0,0 +1,208 @@
+"""
+AI 瑜珈教練系統 - Session 登錄模組
+記錄 session 由哪個 worker 持有、WebSocket 回饋應轉送到哪裡，讓多個 worker 共用 session 狀態
+"""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import SESSION_REGISTRY_BACKEND, SESSION_REGISTRY_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRegistry:
+    """
+    行程內 session 登錄（預設，單一 worker）
+    
+    每個 session 有兩筆資料：
+    - session 資訊：由建立 session 的 worker 寫入（session_id、user_id、worker_id）
+    - 回饋路由：由持有 WebSocket 的 worker 寫入（回饋轉送位址，見 feedback_bus）
+    
+    另外記錄影片匯出工作的狀態（見 export_jobs），讓任一 worker 都能查詢。
+    
+    行程內登錄與 worker 同生共死，touch() / sweep() 不需要做任何事。
+    """
+    
+    def __init__(self):
+        self._sessions: Dict[str, Dict] = {}
+        self._routes: Dict[str, Any] = {}
+        self._jobs: Dict[str, Dict] = {}
+    
+    def register(self, session_id: str, info: Dict):
+        """登錄 session"""
+        self._sessions[session_id] = dict(info)
+    
+    def unregister(self, session_id: str):
+        """移除 session 與其回饋路由"""
+        self._sessions.pop(session_id, None)
+        self._routes.pop(session_id, None)
+    
+    def get(self, session_id: str) -> Optional[Dict]:
+        """取得 session 資訊，不存在時回傳 None"""
+        return self._sessions.get(session_id)
+    
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+    
+    def touch(self, session_id: str):
+        """持有 session 的 worker 定期呼叫，表示 session 仍然存在"""
+    
+    def sweep(self, max_age: float) -> int:
+        """
+        移除超過 max_age 秒未更新的 session（持有的 worker 已當機）
+        
+        Returns:
+            int: 移除的 session 數
+        """
+        return 0
+    
+    def set_route(self, session_id: str, address: Any):
+        """設定 session 的回饋轉送位址"""
+        self._routes[session_id] = address
+    
+    def get_route(self, session_id: str) -> Optional[Any]:
+        """取得 session 的回饋轉送位址"""
+        return self._routes.get(session_id)
+    
+    def clear_route(self, session_id: str, address: Any):
+        """移除回饋路由（只在仍指向 address 時移除，避免覆蓋其他 worker 較新的連線）"""
+        if self._routes.get(session_id) == address:
+            del self._routes[session_id]
+    
+    def set_job(self, job_id: str, job: Dict):
+        """寫入匯出工作狀態"""
+        self._jobs[job_id] = dict(job)
+    
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """取得匯出工作狀態，不存在時回傳 None"""
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+    
+    def remove_job(self, job_id: str):
+        """移除匯出工作狀態"""
+        self._jobs.pop(job_id, None)
+
+
+class FileSessionRegistry(SessionRegistry):
+    """
+    檔案 session 登錄（同一台機器上的多個 worker 共用）
+    
+    每筆資料為一個 JSON 檔，以暫存檔 + os.replace 原子寫入，讀取端不需要鎖。
+    session 資訊與回饋路由分開存放，由不同 worker 寫入時不會互相覆蓋。
+    """
+    
+    def __init__(self, directory: Path = SESSION_REGISTRY_DIR):
+        """
+        Args:
+            directory: 共用目錄
+        """
+        self.directory = Path(directory)
+        self._session_dir = self.directory / "sessions"
+        self._route_dir = self.directory / "routes"
+        self._job_dir = self.directory / "jobs"
+        self._session_dir.mkdir(parents=True, exist_ok=True)
+        self._route_dir.mkdir(parents=True, exist_ok=True)
+        self._job_dir.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def _path(directory: Path, session_id: str) -> Path:
+        # session_id 來自請求，只取檔名部分避免路徑跳脫
+        return directory / f"{Path(session_id).name}.json"
+    
+    @staticmethod
+    def _write(path: Path, data: Any):
+        """原子寫入 JSON 檔"""
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def _read(path: Path) -> Optional[Any]:
+        """讀取 JSON 檔，不存在或損毀時回傳 None"""
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.error(f"Session 登錄檔損毀：{path}，{e}")
+            return None
+    
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def register(self, session_id: str, info: Dict):
+        self._write(self._path(self._session_dir, session_id), info)
+    
+    def unregister(self, session_id: str):
+        self._remove(self._path(self._session_dir, session_id))
+        self._remove(self._path(self._route_dir, session_id))
+    
+    def get(self, session_id: str) -> Optional[Dict]:
+        return self._read(self._path(self._session_dir, session_id))
+    
+    def touch(self, session_id: str):
+        try:
+            os.utime(self._path(self._session_dir, session_id))
+        except FileNotFoundError:
+            pass
+    
+    def sweep(self, max_age: float) -> int:
+        # 以檔案修改時間判斷，持有的 worker 由 touch() 更新
+        deadline = time.time() - max_age
+        removed = 0
+        for path in self._session_dir.glob("*.json"):
+            try:
+                expired = path.stat().st_mtime < deadline
+            except FileNotFoundError:
+                continue
+            if expired:
+                logger.warning(f"移除逾時的 session 登錄：{path.stem}")
+                self.unregister(path.stem)
+                removed += 1
+        return removed
+    
+    def set_route(self, session_id: str, address: Any):
+        self._write(self._path(self._route_dir, session_id), address)
+    
+    def get_route(self, session_id: str) -> Optional[Any]:
+        return self._read(self._path(self._route_dir, session_id))
+    
+    def clear_route(self, session_id: str, address: Any):
+        path = self._path(self._route_dir, session_id)
+        if self._read(path) == address:
+            self._remove(path)
+    
+    def set_job(self, job_id: str, job: Dict):
+        self._write(self._path(self._job_dir, job_id), job)
+    
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        return self._read(self._path(self._job_dir, job_id))
+    
+    def remove_job(self, job_id: str):
+        self._remove(self._path(self._job_dir, job_id))
+
+
+def create_session_registry(backend: str = SESSION_REGISTRY_BACKEND) -> SessionRegistry:
+    """
+    依設定建立 session 登錄
+    
+    Args:
+        backend: memory 或 file
+    
+    Returns:
+        SessionRegistry: session 登錄
+    """
+    if backend == 'memory':
+        return SessionRegistry()
+    if backend == 'file':
+        return FileSessionRegistry()
+    raise ValueError(f"不支援的 session 登錄類型：{backend}（可用：memory、file）")
@@ -9,6 +9,7 @@ import logging
 from typing import Optional
 
 from config import TTS_LANGUAGE, TTS_RATE, TTS_VOLUME, AUDIO_DIR
+from metrics import TTS_SYNTHESIS_SECONDS
 
 # 設定日誌
 logger = logging.getLogger(__name__)
@@ -70,8 +71,9 @@ class TTSService:
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
             # 生成語音
-            self.engine.save_to_file(text, str(output_path))
-            self.engine.runAndWait()
+            with TTS_SYNTHESIS_SECONDS.time():
+                self.engine.save_to_file(text, str(output_path))
+                self.engine.runAndWait()
             
             logger.info(f"語音檔案已生成：{output_path}")
             return output_path
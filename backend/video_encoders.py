@@ -0,0 +1,249 @@
+"""
+AI 瑜珈教練系統 - 影片編碼器模組
+編碼預設（快速擷取、封存、預覽）與本機 OpenCV 支援的編碼器偵測
+"""
+
+import functools
+import logging
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import ENCODER_PRESETS
+
+logger = logging.getLogger(__name__)
+
+# 各編碼器（FourCC）對應的容器格式
+CODEC_CONTAINERS = {
+    'avc1': '.mp4',  # H.264
+    'mp4v': '.mp4',  # MPEG-4 Part 2
+    'MJPG': '.avi',  # Motion JPEG（每幀獨立壓縮，編碼最快）
+    'XVID': '.avi',
+    'VP80': '.webm',
+    'VP90': '.webm',
+}
+# 讀取影片時 CAP_PROP_FOURCC 回報的名稱 → 寫入時使用的 FourCC
+CODEC_ALIASES = {
+    'FMP4': 'mp4v',
+    'H264': 'avc1',
+    'h264': 'avc1',
+}
+# 所有候選編碼器都不可用時使用（OpenCV 內建 FFmpeg 後端都支援）
+FALLBACK_CODEC = 'mp4v'
+
+
+class EncoderPreset(NamedTuple):
+    """
+    編碼預設
+    
+    width / height / fps 為 None 時沿用來源影格。OpenCV 的 VideoWriter 沒有位元率設定，
+    quality（0-100）只對 MJPG 有效：設定時改用 OpenCV 內建的 MJPEG 編碼後端（比 FFmpeg 慢），其他編碼器忽略。
+    
+    codec 為已決定的編碼器（見 resolved()），設定時不再偵測；傳給 spawn 的 worker 行程前先決定，
+    worker 不必各自重新偵測（detect_codecs 的快取只在單一行程內有效）。
+    """
+    name: str
+    codecs: Tuple[str, ...]  # 依優先順序的 FourCC 候選
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    quality: Optional[int] = None
+    codec: Optional[str] = None
+    
+    def output_size(self, source_size: Tuple[int, int]) -> Tuple[int, int]:
+        """輸出尺寸 (width, height)"""
+        if self.width is None or self.height is None:
+            return source_size
+        return self.width, self.height
+    
+    def output_fps(self, source_fps: float) -> float:
+        """輸出幀率（不超過來源幀率）"""
+        if self.fps is None:
+            return source_fps
+        return min(self.fps, source_fps)
+    
+    def passthrough(self) -> 'EncoderPreset':
+        """相同編碼器但不縮放、不降幀（用於串接已依此預設編碼的影片）"""
+        return self._replace(width=None, height=None, fps=None)
+    
+    def resolved(self) -> 'EncoderPreset':
+        """決定實際使用的編碼器（在本行程偵測一次）"""
+        return self._replace(codec=resolve_codec(self))
+
+
+def _probe_codec(codec: str, directory: Path) -> bool:
+    """以寫入一幀測試編碼器是否可用"""
+    path = directory / f"probe_{codec}{CODEC_CONTAINERS[codec]}"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*codec), 30, (64, 48))
+    try:
+        if not writer.isOpened():
+            return False
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    finally:
+        writer.release()
+    return path.exists() and path.stat().st_size > 0
+
+
+@functools.lru_cache(maxsize=None)
+def detect_codecs() -> Tuple[str, ...]:
+    """
+    偵測本機 OpenCV 支援的編碼器（結果快取，啟動時呼叫一次）
+    
+    Returns:
+        Tuple[str, ...]: 可用的 FourCC
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        available = tuple(codec for codec in CODEC_CONTAINERS if _probe_codec(codec, Path(directory)))
+    logger.info(f"可用的影片編碼器：{', '.join(available) or '無'}")
+    return available
+
+
+def resolve_codec(preset: EncoderPreset) -> str:
+    """預設中第一個可用的編碼器（已決定時直接回傳）"""
+    if preset.codec is not None:
+        return preset.codec
+    available = detect_codecs()
+    for codec in preset.codecs:
+        if codec in available:
+            return codec
+    return FALLBACK_CODEC
+
+
+def container_for(preset: EncoderPreset) -> str:
+    """預設實際使用的容器副檔名（例如 .mp4）"""
+    return CODEC_CONTAINERS.get(resolve_codec(preset), '.mp4')
+
+
+def stream_codec(path: Path) -> Optional[str]:
+    """
+    讀取影片的編碼器
+    
+    Args:
+        path: 影片路徑
+    
+    Returns:
+        Optional[str]: FourCC（與 CODEC_CONTAINERS 相同的寫法），無法開啟時回傳 None
+    """
+    cap = cv2.VideoCapture(str(path))
+    try:
+        if not cap.isOpened():
+            return None
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, 'little').decode('ascii', errors='replace')
+    finally:
+        cap.release()
+    return CODEC_ALIASES.get(fourcc, fourcc)
+
+
+def get_preset(name: str) -> EncoderPreset:
+    """
+    取得編碼預設
+    
+    Args:
+        name: 預設名稱（見 config.ENCODER_PRESETS）
+    
+    Returns:
+        EncoderPreset: 編碼預設
+    
+    Raises:
+        ValueError: 預設不存在
+    """
+    if name not in ENCODER_PRESETS:
+        raise ValueError(f"不支援的編碼預設：{name}（可用：{', '.join(ENCODER_PRESETS)}）")
+    options = ENCODER_PRESETS[name]
+    return EncoderPreset(name=name, codecs=tuple(options['codecs']), width=options.get('width'),
+                         height=options.get('height'), fps=options.get('fps'), quality=options.get('quality'))
+
+
+def describe_presets() -> Dict[str, Dict]:
+    """
+    所有編碼預設與實際使用的編碼器
+    
+    Returns:
+        Dict: 預設名稱 → {codec, container, width, height, fps, quality}
+    """
+    presets = {}
+    for name in ENCODER_PRESETS:
+        preset = get_preset(name)
+        presets[name] = {
+            'codec': resolve_codec(preset),
+            'container': container_for(preset),
+            'width': preset.width,
+            'height': preset.height,
+            'fps': preset.fps,
+            'quality': preset.quality,
+        }
+    return presets
+
+
+class PresetWriter:
+    """
+    依編碼預設寫入影片
+    
+    預設尺寸與來源不同時縮放到預先配置的緩衝區；預設幀率較低時平均捨棄影格。
+    """
+    
+    def __init__(self, path: Path, preset: EncoderPreset, source_size: Tuple[int, int], source_fps: float):
+        """
+        Args:
+            path: 輸出路徑（副檔名應為 container_for(preset)）
+            preset: 編碼預設
+            source_size: 來源影格尺寸 (width, height)
+            source_fps: 來源幀率
+        """
+        self.path = path
+        self.preset = preset
+        self.codec = resolve_codec(preset)
+        self.size = preset.output_size(source_size)
+        self.fps = preset.output_fps(source_fps)
+        self._resize = self.size != tuple(source_size)
+        self._buffer = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8) if self._resize else None
+        # 降幀：每 step 個來源影格輸出一幀
+        self._step = source_fps / self.fps if self.fps > 0 else 1.0
+        self._next_frame = 0.0
+        self._source_index = 0
+        self.frame_count = 0
+        
+        fourcc = cv2.VideoWriter_fourcc(*self.codec)
+        if self.codec == 'MJPG' and preset.quality is not None:
+            # FFmpeg 後端不支援 VIDEOWRITER_PROP_QUALITY
+            self._writer = cv2.VideoWriter(str(path), cv2.CAP_OPENCV_MJPEG, fourcc, self.fps, self.size)
+            if self._writer.isOpened():
+                self._writer.set(cv2.VIDEOWRITER_PROP_QUALITY, preset.quality)
+        else:
+            self._writer = cv2.VideoWriter(str(path), fourcc, self.fps, self.size)
+    
+    def isOpened(self) -> bool:
+        return self._writer is not None and self._writer.isOpened()
+    
+    def write(self, frame: np.ndarray, transform: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> bool:
+        """
+        寫入一幀（可能因降幀而略過）
+        
+        Args:
+            frame: 來源影格
+            transform: 縮放後、寫入前套用的處理（例如原地疊加標註），只對實際輸出的影格呼叫
+        
+        Returns:
+            bool: 是否實際寫入
+        """
+        index = self._source_index
+        self._source_index += 1
+        if index < self._next_frame:
+            return False
+        self._next_frame += self._step
+        
+        if self._resize:
+            frame = cv2.resize(frame, self.size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+        if transform is not None:
+            frame = transform(frame)
+        self._writer.write(frame)
+        self.frame_count += 1
+        return True
+    
+    def release(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
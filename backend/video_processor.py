@@ -7,37 +7,96 @@ import cv2
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict
+from collections import deque
+import json
+from typing import Callable, List, Tuple, Optional, Dict, NamedTuple
+from concurrent.futures import ProcessPoolExecutor, wait
 import logging
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
 
 from config import (
-    CAMERA_INDEX, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS,
-    VIDEO_SESSIONS_DIR, VIDEO_SEGMENTS_DIR
+    CAMERA_INDEX, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS, CAMERA_THREADED, CAPTURE_RING_SIZE, ANALYSIS_FRAME_SIZE,
+    RECORDING_QUEUE_SIZE, RECORDING_QUEUE_POLICY, PREROLL_SECONDS, PREROLL_MAX_BYTES, PREROLL_JPEG_QUALITY,
+    PREROLL_SCALE, MERGE_MAX_WORKERS, MERGE_PROGRESS_INTERVAL, MERGE_PROGRESS_POLL_SECONDS, EXPORT_ANNOTATION_MODE,
+    RECORDING_PRESET, EXPORT_PRESET, VIDEO_SESSIONS_DIR, VIDEO_SEGMENTS_DIR
 )
+from metrics import VIDEO_MERGE_FPS
+from video_encoders import EncoderPreset, PresetWriter, get_preset, container_for, resolve_codec, stream_codec
+from pose_analyzer import as_pose_landmarks, LandmarksInput, LANDMARK_COUNT
 
 # 設定日誌
 logger = logging.getLogger(__name__)
 
+# 分析串流的縮放方式（擷取執行緒每幀執行；1080p → 640x360 約 1.6 ms，INTER_AREA 約 7 ms）
+ANALYSIS_INTERPOLATION = cv2.INTER_LINEAR
+
+
+class CapturedFrame(NamedTuple):
+    """環形緩衝區中的一幀（frame / analysis 為緩衝區的視圖，不是複本）"""
+    sequence: int
+    timestamp: float
+    frame: np.ndarray  # 原始解析度（錄製用）
+    analysis: Optional[np.ndarray] = None  # 縮小的分析影格（姿勢推論、預覽用），未啟用時為 None
+
 
 class CameraCapture:
-    """USB 相機即時擷取類別"""
+    """
+    USB 相機即時擷取類別
+    
+    threaded=True 時由背景執行緒持續擷取，寫入預先配置的環形緩衝區：
+    - 驅動程式緩衝區不會堆積舊影格，讀取端永遠拿到最新的一幀
+    - latest() / history() 回傳緩衝區視圖，不複製影格
+    - 單一寫入端、不需要鎖：寫入端只寫「最新影格的下一格」，最新影格發佈後才更新序號
+    - 設定 analysis_size 時，每幀同時縮小到對應的分析緩衝區（同一個序號，不另外配置陣列）
     
-    def __init__(self, camera_index=CAMERA_INDEX, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, fps=CAMERA_FPS):
+    視圖在之後 ring_size - 1 幀內有效（之後該格會被覆寫），需要保留更久時請自行複製。
+    """
+    
+    def __init__(self, camera_index=CAMERA_INDEX, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, fps=CAMERA_FPS,
+                 threaded: bool = False, ring_size: int = CAPTURE_RING_SIZE,
+                 analysis_size: Optional[Tuple[int, int]] = ANALYSIS_FRAME_SIZE):
         """
         初始化相機
         
         Args:
-            camera_index: 相機索引
+            camera_index: 相機索引（或影片檔路徑）
             width: 影像寬度
             height: 影像高度
             fps: 幀率
+            threaded: 是否使用背景擷取執行緒
+            ring_size: 環形緩衝區大小（幀數，至少 2）
+            analysis_size: 分析影格尺寸 (width, height)，None 表示不產生（僅背景擷取模式）
         """
         self.camera_index = camera_index
         self.width = width
         self.height = height
         self.fps = fps
         self.cap = None
+        self.threaded = threaded
+        self.ring_size = max(2, ring_size)
+        self.analysis_size = tuple(analysis_size) if analysis_size else None
+        
+        # 環形緩衝區（啟動後依實際解析度配置）
+        self._ring: Optional[np.ndarray] = None
+        self._analysis_ring: Optional[np.ndarray] = None
+        self._timestamps = np.zeros(self.ring_size, dtype=np.float64)
+        self._sequence = -1  # 最新已發佈影格的序號，-1 表示尚無影格
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._listeners: List[Callable[[CapturedFrame], None]] = []
         
+        # 統計
+        self.captured_count = 0
+        self.dropped_count = 0  # 讀取端沒有看到就被下一幀取代的影格
+        self.duplicated_count = 0  # 讀取端重複拿到同一幀
+        self.error_count = 0
+        self._last_read_sequence = -1
+    
     def start(self) -> bool:
         """
         啟動相機
@@ -57,20 +116,157 @@ class CameraCapture:
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
             self.cap.set(cv2.CAP_PROP_FPS, self.fps)
             
-            logger.info(f"相機已啟動：{self.width}x{self.height} @ {self.fps} FPS")
-            return True
+            if self.threaded and not self._start_capture_thread():
+                return False
             
+            logger.info(f"相機已啟動：{self.width}x{self.height} @ {self.fps} FPS"
+                        f"{'（背景擷取）' if self.threaded else ''}")
+            return True
+        
         except Exception as e:
             logger.error(f"相機啟動失敗：{e}")
             return False
     
+    def _start_capture_thread(self) -> bool:
+        """讀取第一幀以取得實際解析度、配置環形緩衝區並啟動擷取執行緒"""
+        # 背景執行緒持續取走影格，驅動程式只需保留最新一幀
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        ret, first_frame = self.cap.read()
+        if not ret:
+            logger.error("無法讀取第一幀，擷取執行緒未啟動")
+            return False
+        
+        self._ring = np.empty((self.ring_size,) + first_frame.shape, dtype=first_frame.dtype)
+        self._ring[0] = first_frame
+        if self.analysis_size is not None:
+            width, height = self.analysis_size
+            self._analysis_ring = np.empty((self.ring_size, height, width) + first_frame.shape[2:],
+                                           dtype=first_frame.dtype)
+            self._downscale(0)
+        self._timestamps[0] = time.monotonic()
+        self._sequence = 0
+        self.captured_count = 1
+        
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name=f"camera-{self.camera_index}", daemon=True)
+        self._thread.start()
+        return True
+    
+    def _downscale(self, slot: int):
+        """把該格影格縮小到對應的分析緩衝區（原地寫入）"""
+        cv2.resize(self._ring[slot], self.analysis_size, dst=self._analysis_ring[slot],
+                   interpolation=ANALYSIS_INTERPOLATION)
+    
+    def _analysis_view(self, slot: int) -> Optional[np.ndarray]:
+        return self._analysis_ring[slot] if self._analysis_ring is not None else None
+    
+    def _capture_loop(self):
+        """擷取執行緒：grab + retrieve 直接解碼到下一格緩衝區，再縮小到分析緩衝區"""
+        while self._running:
+            if not self.cap.grab():
+                self.error_count += 1
+                if self.error_count % 30 == 1:
+                    logger.warning("無法讀取影像幀")
+                time.sleep(1.0 / max(1, self.fps))
+                continue
+            
+            timestamp = time.monotonic()
+            sequence = self._sequence + 1
+            slot = sequence % self.ring_size
+            ret, _ = self.cap.retrieve(self._ring[slot])
+            if not ret:
+                self.error_count += 1
+                continue
+            if self._analysis_ring is not None:
+                self._downscale(slot)
+            
+            self._timestamps[slot] = timestamp
+            # 資料寫完後才發佈序號
+            self._sequence = sequence
+            self.captured_count += 1
+            
+            captured = CapturedFrame(sequence, timestamp, self._ring[slot], self._analysis_view(slot))
+            for listener in self._listeners:
+                try:
+                    listener(captured)
+                except Exception as e:
+                    logger.error(f"影格處理失敗：{e}")
+    
+    def add_listener(self, listener: Callable[[CapturedFrame], None]):
+        """
+        新增影格監聽器（背景擷取模式下，每擷取一幀就在擷取執行緒中呼叫）
+        
+        監聽器應盡快返回（例如只把影格放入佇列），否則會拖慢擷取。
+        
+        Args:
+            listener: 回調函數，參數為 CapturedFrame
+        """
+        self._listeners.append(listener)
+    
+    def latest(self) -> Optional[CapturedFrame]:
+        """
+        取得最新一幀（緩衝區視圖，不複製）
+        
+        Returns:
+            CapturedFrame: 最新影格，尚無影格時為 None
+        """
+        sequence = self._sequence
+        if sequence < 0:
+            return None
+        
+        if sequence == self._last_read_sequence:
+            self.duplicated_count += 1
+        elif self._last_read_sequence >= 0:
+            self.dropped_count += max(0, sequence - self._last_read_sequence - 1)
+        self._last_read_sequence = sequence
+        
+        slot = sequence % self.ring_size
+        return CapturedFrame(sequence, float(self._timestamps[slot]), self._ring[slot], self._analysis_view(slot))
+    
+    def history(self, count: int) -> List[CapturedFrame]:
+        """
+        取得最近的多幀（由舊到新，緩衝區視圖，不複製）
+        
+        Args:
+            count: 幀數（最多 ring_size - 1，保留一格給寫入端）
+        
+        Returns:
+            List[CapturedFrame]: 影格列表
+        """
+        sequence = self._sequence
+        if sequence < 0:
+            return []
+        
+        count = min(count, self.ring_size - 1, sequence + 1)
+        frames = []
+        for seq in range(sequence - count + 1, sequence + 1):
+            slot = seq % self.ring_size
+            frames.append(CapturedFrame(seq, float(self._timestamps[slot]), self._ring[slot], self._analysis_view(slot)))
+        return frames
+    
+    def stats(self) -> Dict:
+        """擷取統計"""
+        return {
+            'captured': self.captured_count,
+            'dropped': self.dropped_count,
+            'duplicated': self.duplicated_count,
+            'errors': self.error_count,
+        }
+    
     def read_frame(self) -> Optional[np.ndarray]:
         """
         讀取一幀影像
         
+        背景擷取模式下回傳最新一幀的緩衝區視圖（不阻塞、不複製）。
+        
         Returns:
             np.ndarray: 影像幀（BGR 格式）或 None
         """
+        if self.threaded:
+            captured = self.latest()
+            return captured.frame if captured is not None else None
+        
         if self.cap is None or not self.cap.isOpened():
             return None
         
@@ -81,11 +277,30 @@ class CameraCapture:
         
         return frame
     
+    def read_analysis_frame(self) -> Optional[np.ndarray]:
+        """
+        讀取最新一幀的分析影格（背景擷取模式，緩衝區視圖，不阻塞、不複製）
+        
+        Returns:
+            np.ndarray: analysis_size 的影像幀（BGR 格式），未啟用或尚無影格時為 None
+        """
+        if not self.threaded:
+            return None
+        captured = self.latest()
+        return captured.analysis if captured is not None else None
+    
     def stop(self):
         """停止相機"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        
         if self.cap is not None:
             self.cap.release()
-            logger.info("相機已停止")
+            self.cap = None
+            logger.info(f"相機已停止（擷取 {self.captured_count} 幀，丟棄 {self.dropped_count} 幀，"
+                        f"重複 {self.duplicated_count} 幀）")
     
     def __del__(self):
         """析構函數"""
@@ -95,23 +310,26 @@ class CameraCapture:
 class VideoRecorder:
     """影片錄製類別"""
     
-    def __init__(self, output_path: Path, width: int, height: int, fps: int = CAMERA_FPS):
+    def __init__(self, output_path: Path, width: int, height: int, fps: int = CAMERA_FPS,
+                 preset: Optional[EncoderPreset] = None):
         """
         初始化影片錄製器
         
         Args:
-            output_path: 輸出影片路徑
-            width: 影片寬度
-            height: 影片高度
-            fps: 幀率
+            output_path: 輸出影片路徑（副檔名應為 container_for(preset)）
+            width: 來源影格寬度
+            height: 來源影格高度
+            fps: 來源幀率
+            preset: 編碼預設（預設依 RECORDING_PRESET），決定編碼器與輸出尺寸、幀率
         """
         self.output_path = output_path
         self.width = width
         self.height = height
         self.fps = fps
-        self.writer = None
+        self.preset = preset or get_preset(RECORDING_PRESET)
+        self.writer: Optional[PresetWriter] = None
         self.frame_count = 0
-        
+    
     def start(self) -> bool:
         """
         開始錄製
@@ -123,23 +341,19 @@ class VideoRecorder:
             # 確保輸出目錄存在
             self.output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # 設定編碼器（H.264）
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # 或使用 'avc1' for H.264
-            
-            self.writer = cv2.VideoWriter(
-                str(self.output_path),
-                fourcc,
-                self.fps,
-                (self.width, self.height)
-            )
+            # 依編碼預設建立寫入器（編碼器依本機支援程度選擇）
+            self.writer = PresetWriter(self.output_path, self.preset, (self.width, self.height), self.fps)
             
             if not self.writer.isOpened():
                 logger.error(f"無法建立影片寫入器：{self.output_path}")
+                self.writer = None
                 return False
             
-            logger.info(f"開始錄製影片：{self.output_path}")
+            width, height = self.writer.size
+            logger.info(f"開始錄製影片：{self.output_path}（{self.preset.name}，{self.writer.codec}，"
+                        f"{width}x{height} @ {self.writer.fps:g} fps）")
             return True
-            
+        
         except Exception as e:
             logger.error(f"影片錄製器初始化失敗：{e}")
             return False
@@ -151,14 +365,14 @@ class VideoRecorder:
         Args:
             frame: 影像幀
         """
-        if self.writer is not None and self.writer.isOpened():
-            self.writer.write(frame)
+        if self.writer is not None and self.writer.write(frame):
             self.frame_count += 1
     
     def stop(self):
         """停止錄製"""
         if self.writer is not None:
             self.writer.release()
+            self.writer = None
             logger.info(f"影片錄製完成：{self.output_path}，共 {self.frame_count} 幀")
     
     def __del__(self):
@@ -166,10 +380,432 @@ class VideoRecorder:
         self.stop()
 
 
+class PreRollBuffer:
+    """
+    固定記憶體的預錄緩衝區
+    
+    保留最近 seconds 秒的影格，以 JPEG 壓縮（可先縮小）儲存，總大小不超過 max_bytes；
+    開始新片段時把這些影格寫在片段開頭，保留進入姿勢前的過程。
+    """
+    
+    def __init__(self, seconds: float = PREROLL_SECONDS, max_bytes: int = PREROLL_MAX_BYTES,
+                 quality: int = PREROLL_JPEG_QUALITY, scale: float = PREROLL_SCALE):
+        """
+        Args:
+            seconds: 保留秒數（0 表示停用）
+            max_bytes: 壓縮後的總大小上限
+            quality: JPEG 品質（1-100）
+            scale: 儲存前的縮放比例（1.0 表示原尺寸，寫入片段時放大回原尺寸）
+        """
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.scale = scale
+        self._frames = deque()  # (時間戳記, JPEG bytes, 原始形狀)
+        self.total_bytes = 0
+        self.evicted_count = 0
+    
+    def __len__(self) -> int:
+        return len(self._frames)
+    
+    def push(self, frame: np.ndarray, timestamp: float):
+        """
+        壓縮並加入一幀，移除超過時間或大小上限的舊影格
+        
+        Args:
+            frame: 影像幀
+            timestamp: 擷取時間（秒，time.monotonic）
+        """
+        encoded = self.encode(frame)
+        if encoded is not None:
+            self.append(timestamp, *encoded)
+    
+    def encode(self, frame: np.ndarray) -> Optional[Tuple[bytes, Tuple[int, ...]]]:
+        """
+        壓縮一幀（不修改緩衝區狀態，可在鎖外執行）
+        
+        Args:
+            frame: 影像幀
+        
+        Returns:
+            Optional[Tuple[bytes, Tuple[int, ...]]]: (JPEG bytes, 原始形狀)；停用或壓縮失敗時為 None
+        """
+        if self.seconds <= 0:
+            return None
+        
+        image = frame
+        if self.scale != 1.0:
+            image = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return None
+        return encoded.tobytes(), frame.shape
+    
+    def append(self, timestamp: float, data: bytes, shape: Tuple[int, ...]):
+        """
+        加入已壓縮的影格（encode() 的結果），移除超過時間或大小上限的舊影格
+        
+        Args:
+            timestamp: 擷取時間（秒，time.monotonic）
+            data: JPEG bytes
+            shape: 原始形狀
+        """
+        self._frames.append((timestamp, data, shape))
+        self.total_bytes += len(data)
+        
+        while self._frames and (self.total_bytes > self.max_bytes or
+                                timestamp - self._frames[0][0] > self.seconds):
+            _, old, _ = self._frames.popleft()
+            self.total_bytes -= len(old)
+            self.evicted_count += 1
+    
+    def drain(self) -> List[Tuple[bytes, Tuple[int, ...]]]:
+        """
+        取出並清空所有影格（由舊到新，仍為壓縮格式，由編碼執行緒解碼）
+        
+        Returns:
+            List: [(JPEG bytes, 原始形狀), ...]
+        """
+        frames = [(data, shape) for _, data, shape in self._frames]
+        self._frames.clear()
+        self.total_bytes = 0
+        return frames
+    
+    def clear(self):
+        """清空緩衝區"""
+        self._frames.clear()
+        self.total_bytes = 0
+    
+    @staticmethod
+    def decode(data: bytes, shape: Tuple[int, ...]) -> Optional[np.ndarray]:
+        """解碼一幀並還原為原始尺寸"""
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None and frame.shape != tuple(shape):
+            frame = cv2.resize(frame, (shape[1], shape[0]), interpolation=cv2.INTER_LINEAR)
+        return frame
+
+
+class SegmentEncoder:
+    """
+    片段錄製管線（producer / consumer）
+    
+    擷取端以 submit() 把影格複製到緩衝池並放入有上限的佇列後立即返回；
+    專屬的編碼執行緒依序處理佇列中的開始片段、影格與結束片段指令，並持有每個 VideoRecorder。
+    open_segment() / close_segment() 也只是放入指令，不會阻塞呼叫端。
+    
+    佇列中的影格數達到 queue_size 時：
+    - drop_oldest：丟棄最舊的影格（擷取端永遠不會被拖慢，適合即時錄影）
+    - block：等待編碼執行緒消化（不丟影格，但會拖慢擷取端）
+    """
+    
+    POLICIES = ('drop_oldest', 'block')
+    
+    def __init__(self, queue_size: int = RECORDING_QUEUE_SIZE, policy: str = RECORDING_QUEUE_POLICY,
+                 fps: int = CAMERA_FPS, preset: Optional[EncoderPreset] = None):
+        """
+        Args:
+            queue_size: 佇列中的影格上限
+            policy: 佇列已滿時的策略（drop_oldest 或 block）
+            fps: 來源幀率
+            preset: 片段的編碼預設（預設依 RECORDING_PRESET）
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"不支援的佇列策略：{policy}（可用：{', '.join(self.POLICIES)}）")
+        
+        self.queue_size = max(1, queue_size)
+        self.policy = policy
+        self.fps = fps
+        self.preset = preset or get_preset(RECORDING_PRESET)
+        
+        self._items = deque()  # (指令, 參數)
+        self._queued_frames = 0
+        self._busy = False
+        self._running = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: List[np.ndarray] = []  # 可重複使用的影格緩衝區
+        
+        # 編碼執行緒狀態（只在編碼執行緒中存取）
+        self._recorder: Optional[VideoRecorder] = None
+        self._segment_path: Optional[Path] = None
+        
+        # 統計
+        self.submitted_count = 0
+        self.written_count = 0
+        self.dropped_count = 0
+        self.peak_queued = 0
+    
+    def start(self):
+        """啟動編碼執行緒"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._encode_loop, name="segment-encoder", daemon=True)
+        self._thread.start()
+    
+    def _put(self, command: str, payload=None):
+        """放入控制指令（不受佇列上限限制）"""
+        with self._cond:
+            self._items.append((command, payload))
+            self._cond.notify_all()
+    
+    def open_segment(self, path: Path, preroll: Optional[List[Tuple[bytes, Tuple[int, ...]]]] = None):
+        """
+        開始新片段（立即返回；寫入器在該片段第一幀時依實際解析度建立）
+        
+        Args:
+            path: 片段影片路徑
+            preroll: 寫在片段開頭的預錄影格（PreRollBuffer.drain() 的結果，由編碼執行緒解碼）
+        """
+        self._put('open', (path, preroll or []))
+    
+    def close_segment(self, discard: bool = False):
+        """
+        結束目前片段（立即返回）
+        
+        Args:
+            discard: 是否刪除此片段檔案
+        """
+        self._put('close', discard)
+    
+    def _take_buffer(self, frame: np.ndarray) -> np.ndarray:
+        """從緩衝池取出與影格同形狀的緩衝區"""
+        with self._cond:
+            while self._pool:
+                buffer = self._pool.pop()
+                if buffer.shape == frame.shape and buffer.dtype == frame.dtype:
+                    return buffer
+        return np.empty_like(frame)
+    
+    def _drop_oldest_frame(self):
+        """丟棄佇列中最舊的影格（需持有 self._cond）"""
+        for i, (command, payload) in enumerate(self._items):
+            if command == 'frame':
+                del self._items[i]
+                self._queued_frames -= 1
+                self._pool.append(payload)
+                self.dropped_count += 1
+                return
+    
+    def submit(self, frame: np.ndarray) -> bool:
+        """
+        放入一幀（影格會被複製，呼叫端可立即重複使用原緩衝區）
+        
+        Args:
+            frame: 影像幀
+        
+        Returns:
+            bool: 是否已放入佇列
+        """
+        if not self._running:
+            return False
+        
+        buffer = self._take_buffer(frame)
+        np.copyto(buffer, frame)
+        
+        with self._cond:
+            if self._queued_frames >= self.queue_size:
+                if self.policy == 'drop_oldest':
+                    self._drop_oldest_frame()
+                else:
+                    while self._queued_frames >= self.queue_size and self._running:
+                        self._cond.wait(0.1)
+            if not self._running:
+                self._pool.append(buffer)
+                return False
+            
+            self._items.append(('frame', buffer))
+            self._queued_frames += 1
+            self.submitted_count += 1
+            self.peak_queued = max(self.peak_queued, self._queued_frames)
+            self._cond.notify_all()
+        return True
+    
+    def _encode_loop(self):
+        """編碼執行緒：依序處理佇列，停止時先處理完剩餘的指令"""
+        while True:
+            with self._cond:
+                while not self._items and self._running:
+                    self._cond.wait()
+                if not self._items:
+                    break
+                command, payload = self._items.popleft()
+                if command == 'frame':
+                    self._queued_frames -= 1
+                self._busy = True
+                self._cond.notify_all()
+            
+            try:
+                self._handle(command, payload)
+            except Exception as e:
+                logger.error(f"片段編碼失敗：{e}")
+            finally:
+                with self._cond:
+                    if command == 'frame':
+                        self._pool.append(payload)
+                    self._busy = False
+                    self._cond.notify_all()
+        
+        # 停止時關閉尚未結束的片段
+        self._handle('close', False)
+    
+    def _handle(self, command: str, payload):
+        """處理一個指令（編碼執行緒）"""
+        if command == 'open':
+            self._handle('close', False)
+            self._segment_path, preroll = payload
+            for data, shape in preroll:
+                frame = PreRollBuffer.decode(data, shape)
+                if frame is not None:
+                    self._handle('frame', frame)
+        elif command == 'frame':
+            if self._recorder is None and self._segment_path is not None:
+                height, width = payload.shape[:2]
+                recorder = VideoRecorder(self._segment_path, width, height, self.fps, self.preset)
+                if recorder.start():
+                    self._recorder = recorder
+                else:
+                    self._segment_path = None
+            if self._recorder is not None:
+                self._recorder.write_frame(payload)
+                self.written_count += 1
+        elif command == 'close':
+            if self._recorder is not None:
+                self._recorder.stop()
+                self._recorder = None
+            if payload and self._segment_path is not None:
+                self._segment_path.unlink(missing_ok=True)
+                logger.info(f"已捨棄片段：{self._segment_path}")
+            self._segment_path = None
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待佇列中的指令全部處理完
+        
+        Args:
+            timeout: 最長等待秒數（None 表示不限）
+        
+        Returns:
+            bool: 是否已處理完
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._items and not self._busy, timeout)
+    
+    def stop(self, timeout: Optional[float] = None):
+        """
+        停止編碼執行緒（先寫完佇列中剩餘的影格）
+        
+        Args:
+            timeout: 最長等待秒數（None 表示不限）
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def stats(self) -> Dict:
+        """錄製統計"""
+        with self._cond:
+            queued = self._queued_frames
+        return {
+            'queued': queued,
+            'peak_queued': self.peak_queued,
+            'submitted': self.submitted_count,
+            'written': self.written_count,
+            'dropped': self.dropped_count,
+        }
+
+
+class AnnotationOverlay:
+    """
+    預先繪製的標註圖層
+    
+    同一片段內姿勢名稱、分數與回饋不變，只在建立時繪製一次橫幅區域，
+    之後每幀以 apply() 在該區域（ROI）原地混合，不複製整個影格。
+    圖層以預乘形式儲存：輸出 = 影格 × keep / 255 + color。
+    """
+    
+    # 橫幅範圍（與原本的半透明背景框相同）
+    TOP = 10
+    BOTTOM = 150
+    MARGIN = 10
+    BACKGROUND_ALPHA = 0.6
+    
+    def __init__(self, width: int, height: int, pose_name: str, score: int, feedback: str):
+        """
+        Args:
+            width: 影格寬度
+            height: 影格高度
+            pose_name: 姿勢名稱
+            score: 分數 (0-100)
+            feedback: 回饋文字
+        """
+        self.width = width
+        self.height = height
+        # ROI：橫幅的列範圍，欄位延伸到影格右緣（窄影格時文字可能超出橫幅）
+        self.y0, self.y1 = min(self.TOP, height), min(self.BOTTOM + 1, height)
+        self.x0, self.x1 = min(self.MARGIN, width), width
+        roi_height, roi_width = self.y1 - self.y0, self.x1 - self.x0
+        
+        # 根據分數選擇顏色
+        if score >= 90:
+            color = (0, 255, 0)  # 綠色（優秀）
+        elif score >= 70:
+            color = (0, 255, 255)  # 黃色（良好）
+        else:
+            color = (0, 0, 255)  # 紅色（需改進）
+        
+        # 顯示回饋（支援中文需要使用 PIL，這裡簡化處理）
+        # 註：OpenCV 對中文支援不佳，實際應用中可使用 PIL 或自訂字體
+        texts = [
+            (f"Pose: {pose_name}", (20, 50), 1.2, (255, 255, 255), 2),
+            (f"Score: {score}", (20, 90), 1.0, color, 2),
+            (feedback[:50], (20, 130), 0.6, (255, 255, 255), 1),  # 限制長度
+        ]
+        
+        # 在黑色底圖上繪製文字：color 為預乘後的文字顏色，coverage 為反鋸齒覆蓋率
+        self.color = np.zeros((roi_height, roi_width, 3), dtype=np.uint8)
+        coverage = np.zeros((roi_height, roi_width), dtype=np.uint8)
+        for text, (x, y), scale, text_color, thickness in texts:
+            origin = (x - self.x0, y - self.y0)
+            cv2.putText(self.color, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, text_color, thickness, cv2.LINE_AA)
+            cv2.putText(coverage, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, 255, thickness, cv2.LINE_AA)
+        
+        # 半透明黑色背景：背景框內保留 (1 - BACKGROUND_ALPHA) 的原始影像，文字再蓋在上面
+        background = np.ones((roi_height, roi_width), dtype=np.float32)
+        background[:, :max(0, width - self.MARGIN + 1 - self.x0)] = 1.0 - self.BACKGROUND_ALPHA
+        keep = background * (1.0 - coverage.astype(np.float32) / 255.0)
+        self.keep = cv2.merge([np.round(keep * 255).astype(np.uint8)] * 3)
+    
+    def matches(self, frame: np.ndarray) -> bool:
+        """圖層尺寸是否與影格相同"""
+        return frame.shape[0] == self.height and frame.shape[1] == self.width
+    
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """
+        在影格的橫幅區域原地疊加標註
+        
+        Args:
+            frame: 影格（會被修改）
+        
+        Returns:
+            np.ndarray: 同一個影格
+        """
+        roi = frame[self.y0:self.y1, self.x0:self.x1]
+        cv2.multiply(roi, self.keep, dst=roi, scale=1 / 255)
+        cv2.add(roi, self.color, dst=roi)
+        return frame
+
+
 def add_annotations(frame: np.ndarray, pose_name: str, score: int, feedback: str) -> np.ndarray:
     """
     在影格上疊加文字與分數標註
     
+    逐幀處理同一片段時，建議建立一次 AnnotationOverlay 並以 apply() 原地疊加。
+    
     Args:
         frame: 原始影格
         pose_name: 姿勢名稱
@@ -179,138 +815,325 @@ def add_annotations(frame: np.ndarray, pose_name: str, score: int, feedback: str
     Returns:
         np.ndarray: 標註後的影格
     """
-    annotated_frame = frame.copy()
     height, width = frame.shape[:2]
+    return AnnotationOverlay(width, height, pose_name, score, feedback).apply(frame.copy())
+
+
+# MediaPipe 連接線定義（骨架線段的起點與終點 landmark 索引）
+POSE_CONNECTIONS = np.array([
+    # 臉部
+    (0, 1), (1, 2), (2, 3), (3, 7),
+    (0, 4), (4, 5), (5, 6), (6, 8),
+    (9, 10),
+    # 上半身
+    (11, 12),  # 肩膀
+    (11, 13), (13, 15),  # 左手臂
+    (12, 14), (14, 16),  # 右手臂
+    (11, 23), (12, 24),  # 軀幹
+    (23, 24),  # 臀部
+    # 下半身
+    (23, 25), (25, 27),  # 左腿
+    (24, 26), (26, 28),  # 右腿
+    (27, 29), (29, 31),  # 左腳
+    (28, 30), (30, 32),  # 右腳
+], dtype=np.int32)
+
+SKELETON_VISIBILITY_THRESHOLD = 0.5
+SKELETON_LINE_COLOR = (0, 255, 0)
+SKELETON_JOINT_COLOR = (255, 0, 0)
+
+
+def render_skeleton(target: np.ndarray, landmarks: LandmarksInput, thickness: int = 2, radius: int = 4) -> np.ndarray:
+    """
+    在 target 上原地繪製姿勢骨架
     
-    # 設定字體
-    font = cv2.FONT_HERSHEY_SIMPLEX
+    可見度與像素座標以 NumPy 一次計算，線段與關鍵點各以一次 cv2.polylines 繪製。
+    座標依 target 的尺寸換算，因此 target 可以是縮小的預覽緩衝區。
     
-    # 根據分數選擇顏色
-    if score >= 90:
-        color = (0, 255, 0)  # 綠色（優秀）
-    elif score >= 70:
-        color = (0, 255, 255)  # 黃色（良好）
-    else:
-        color = (0, 0, 255)  # 紅色（需改進）
-    
-    # 繪製半透明背景框
-    overlay = annotated_frame.copy()
-    cv2.rectangle(overlay, (10, 10), (width - 10, 150), (0, 0, 0), -1)
-    cv2.addWeighted(overlay, 0.6, annotated_frame, 0.4, 0, annotated_frame)
-    
-    # 顯示姿勢名稱
-    cv2.putText(
-        annotated_frame,
-        f"Pose: {pose_name}",
-        (20, 50),
-        font,
-        1.2,
-        (255, 255, 255),
-        2,
-        cv2.LINE_AA
-    )
+    Args:
+        target: 繪製目標（會被修改）
+        landmarks: 33 個關鍵點（dict 列表、PoseLandmarks 或 (33, 4) 陣列）
+        thickness: 線段粗細
+        radius: 關鍵點半徑
     
-    # 顯示分數
-    cv2.putText(
-        annotated_frame,
-        f"Score: {score}",
-        (20, 90),
-        font,
-        1.0,
-        color,
-        2,
-        cv2.LINE_AA
-    )
+    Returns:
+        np.ndarray: 同一個 target
+    """
+    points = as_pose_landmarks(landmarks).array
+    height, width = target.shape[:2]
     
-    # 顯示回饋（支援中文需要使用 PIL，這裡簡化處理）
-    # 註：OpenCV 對中文支援不佳，實際應用中可使用 PIL 或自訂字體
-    cv2.putText(
-        annotated_frame,
-        feedback[:50],  # 限制長度
-        (20, 130),
-        font,
-        0.6,
-        (255, 255, 255),
-        1,
-        cv2.LINE_AA
-    )
+    visible = points[:, 3] > SKELETON_VISIBILITY_THRESHOLD
+    pixels = (points[:, :2] * np.array([width, height], dtype=np.float32)).astype(np.int32)
     
-    return annotated_frame
+    # 繪製連接線（兩端都可見的線段）
+    edges = POSE_CONNECTIONS[visible[POSE_CONNECTIONS[:, 0]] & visible[POSE_CONNECTIONS[:, 1]]]
+    if len(edges):
+        cv2.polylines(target, list(pixels[edges]), False, SKELETON_LINE_COLOR, thickness)
+    
+    # 繪製關鍵點（長度為 0、粗細 2 × radius 的線段，與 cv2.circle 實心圓相同）
+    joints = pixels[visible]
+    if len(joints):
+        cv2.polylines(target, list(np.repeat(joints[:, None, :], 2, axis=1)), False,
+                      SKELETON_JOINT_COLOR, 2 * radius)
+    
+    return target
 
 
-def draw_pose_landmarks(frame: np.ndarray, landmarks: List[Dict]) -> np.ndarray:
+def draw_pose_landmarks(frame: np.ndarray, landmarks: LandmarksInput, copy: bool = True) -> np.ndarray:
     """
     在影格上繪製姿勢骨架
     
     Args:
         frame: 原始影格
         landmarks: 33 個關鍵點
+        copy: False 時直接繪製在 frame 上（逐幀處理時避免複製整個影格）
     
     Returns:
         np.ndarray: 繪製骨架後的影格
     """
-    if not landmarks or len(landmarks) != 33:
+    if landmarks is None or len(landmarks) != LANDMARK_COUNT:
         return frame
     
-    annotated_frame = frame.copy()
-    height, width = frame.shape[:2]
+    return render_skeleton(frame.copy() if copy else frame, landmarks)
+
+
+# 標註模式：burn_in（繪製在影片中，重新編碼）、sidecar（串接不重新編碼，標註寫入時間軸檔案）
+ANNOTATION_MODES = ('burn_in', 'sidecar')
+
+
+class MergeCancelled(Exception):
+    """影片合併已取消"""
+
+
+# 合併 worker 行程的共用狀態（由 _init_merge_worker 設定）
+_merge_cancel = None
+_merge_progress = None
+
+
+def _init_merge_worker(cancel_event, progress):
+    """
+    合併 worker 初始化
+    
+    Args:
+        cancel_event: 取消旗標（multiprocessing.Event）
+        progress: 每個片段已處理的影格數（multiprocessing.Array）
+    """
+    global _merge_cancel, _merge_progress
+    _merge_cancel = cancel_event
+    _merge_progress = progress
+    # 每個 worker 處理一個片段，避免 OpenCV 內部執行緒與其他 worker 搶 CPU
+    cv2.setNumThreads(1)
+
+
+def _annotate_segment(index: int, segment_path: Path, part_path: Path, info: Dict,
+                      size: Tuple[int, int], fps: float, preset: EncoderPreset,
+                      cancel_event=None, progress=None) -> int:
+    """
+    標註並編碼單一片段（在 worker 行程中執行）
     
-    # MediaPipe 連接線定義
-    connections = [
-        # 臉部
-        (0, 1), (1, 2), (2, 3), (3, 7),
-        (0, 4), (4, 5), (5, 6), (6, 8),
-        (9, 10),
-        # 上半身
-        (11, 12),  # 肩膀
-        (11, 13), (13, 15),  # 左手臂
-        (12, 14), (14, 16),  # 右手臂
-        (11, 23), (12, 24),  # 軀幹
-        (23, 24),  # 臀部
-        # 下半身
-        (23, 25), (25, 27),  # 左腿
-        (24, 26), (26, 28),  # 右腿
-        (27, 29), (29, 31),  # 左腳
-        (28, 30), (30, 32),  # 右腳
-    ]
-    
-    # 繪製連接線
-    for connection in connections:
-        start_idx, end_idx = connection
-        if start_idx < len(landmarks) and end_idx < len(landmarks):
-            start_point = landmarks[start_idx]
-            end_point = landmarks[end_idx]
+    Args:
+        index: 片段索引
+        segment_path: 片段影片路徑
+        part_path: 標註後的輸出路徑
+        info: 姿勢資訊 {pose_name, score, feedback}
+        size: 片段尺寸 (width, height)
+        fps: 片段 FPS
+        preset: 編碼預設（依預設縮放、降幀後才疊加標註）
+        cancel_event: 取消旗標（預設使用 worker 初始化時的共用狀態）
+        progress: 每個片段已讀取的影格數（同上）
+    
+    Returns:
+        int: 寫入的影格數（無法開啟片段時為 0）
+    """
+    cancel_event = cancel_event if cancel_event is not None else _merge_cancel
+    progress = progress if progress is not None else _merge_progress
+    
+    cap = cv2.VideoCapture(str(segment_path))
+    if not cap.isOpened():
+        logger.warning(f"無法開啟片段：{segment_path}，跳過")
+        return 0
+    
+    writer = PresetWriter(part_path, preset, size, fps)
+    # 標註在整個片段內不變，只繪製一次（輸出尺寸）
+    overlay = AnnotationOverlay(
+        writer.size[0], writer.size[1],
+        info.get('pose_name', 'Unknown'),
+        info.get('score', 0),
+        info.get('feedback', '')
+    )
+    frame = None
+    read_count = 0
+    try:
+        while True:
+            # 重複使用同一個解碼緩衝區
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+            if frame.shape[1] != size[0] or frame.shape[0] != size[1]:
+                frame = cv2.resize(frame, size)
             
-            # 檢查可見度
-            if start_point['visibility'] > 0.5 and end_point['visibility'] > 0.5:
-                start_pos = (int(start_point['x'] * width), int(start_point['y'] * height))
-                end_pos = (int(end_point['x'] * width), int(end_point['y'] * height))
-                
-                cv2.line(annotated_frame, start_pos, end_pos, (0, 255, 0), 2)
+            # 縮放後加上標註（原地疊加），降幀略過的影格不繪製
+            writer.write(frame, overlay.apply)
+            read_count += 1
+            
+            if read_count % MERGE_PROGRESS_INTERVAL == 0:
+                if progress is not None:
+                    progress[index] = read_count
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+    finally:
+        cap.release()
+        writer.release()
+    
+    if progress is not None:
+        progress[index] = read_count
+    return writer.frame_count
+
+
+def concat_videos(part_paths: List[Path], output_path: Path, size: Tuple[int, int], fps: float,
+                  cancel_event: Optional[threading.Event] = None, preset: Optional[EncoderPreset] = None,
+                  allow_copy: bool = True) -> bool:
+    """
+    依序串接多個編碼參數相同的影片
+    
+    allow_copy 且有 ffmpeg 時以 concat demuxer 串接（-c copy，不重新編碼）；否則以 OpenCV 依 preset 重新編碼。
+    
+    Args:
+        part_paths: 影片路徑（依播放順序）
+        output_path: 輸出影片路徑
+        size: 輸入影片尺寸 (width, height)
+        fps: 輸入影片 FPS
+        cancel_event: 取消旗標（僅 OpenCV 模式逐幀檢查）
+        preset: 重新編碼時的編碼預設（預設依 EXPORT_PRESET，不縮放、不降幀）
+        allow_copy: 輸入影片的編碼器與尺寸、幀率是否已符合輸出需求（可直接串接）
+    
+    Returns:
+        bool: 是否成功
+    """
+    ffmpeg = shutil.which('ffmpeg') if allow_copy else None
+    if ffmpeg:
+        list_path = output_path.with_name(f".{output_path.stem}_concat.txt")
+        list_path.write_text(''.join(f"file '{path.resolve()}'\n" for path in part_paths), encoding='utf-8')
+        try:
+            result = subprocess.run(
+                [ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                 '-i', str(list_path), '-c', 'copy', str(output_path)],
+                capture_output=True
+            )
+        finally:
+            list_path.unlink()
+        if result.returncode == 0:
+            return True
+        logger.warning(f"ffmpeg 串接失敗，改用 OpenCV：{result.stderr.decode(errors='replace').strip()}")
+    elif allow_copy:
+        logger.info("找不到 ffmpeg，以 OpenCV 逐幀串接（會重新編碼）")
     
-    # 繪製關鍵點
-    for landmark in landmarks:
-        if landmark['visibility'] > 0.5:
-            pos = (int(landmark['x'] * width), int(landmark['y'] * height))
-            cv2.circle(annotated_frame, pos, 4, (255, 0, 0), -1)
+    writer = PresetWriter(output_path, preset or get_preset(EXPORT_PRESET).passthrough(), size, fps)
+    if not writer.isOpened():
+        logger.error(f"無法建立輸出影片：{output_path}")
+        return False
+    try:
+        for path in part_paths:
+            cap = cv2.VideoCapture(str(path))
+            try:
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return False
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    writer.write(frame)
+            finally:
+                cap.release()
+    finally:
+        writer.release()
+    return True
+
+
+def timeline_path_for(video_path: Path) -> Path:
+    """影片對應的標註時間軸檔案路徑（例如 20260114_163847.timeline.json）"""
+    return video_path.with_suffix('.timeline.json')
+
+
+def write_timeline(output_path: Path, pose_info: List[Dict], frame_counts: List[int], size: Tuple[int, int],
+                   fps: float, burned_in: bool) -> Path:
+    """
+    寫入標註時間軸（JSON），由前端依播放時間顯示每個片段的姿勢、分數與回饋
+    
+    Args:
+        output_path: 影片路徑
+        pose_info: 每個片段的姿勢資訊
+        frame_counts: 每個片段在影片中的影格數（依播放順序，0 表示該片段未納入）
+        size: 影片尺寸 (width, height)
+        fps: 影片 FPS
+        burned_in: 標註是否已繪製在影片中（前端不需要再疊加）
+    
+    Returns:
+        Path: 時間軸檔案路徑
+    """
+    segments = []
+    start_frame = 0
+    for idx, frame_count in enumerate(frame_counts):
+        if frame_count <= 0:
+            continue
+        info = pose_info[idx] if idx < len(pose_info) else {}
+        segments.append({
+            'index': idx,
+            'start_seconds': round(start_frame / fps, 3),
+            'end_seconds': round((start_frame + frame_count) / fps, 3),
+            'pose_name': info.get('pose_name', 'Unknown'),
+            'score': info.get('score', 0),
+            'feedback': info.get('feedback', ''),
+        })
+        start_frame += frame_count
     
-    return annotated_frame
+    timeline = {
+        'version': 1,
+        'width': size[0],
+        'height': size[1],
+        'fps': fps,
+        'annotations_burned_in': burned_in,
+        'segments': segments,
+    }
+    path = timeline_path_for(output_path)
+    path.write_text(json.dumps(timeline, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
 
 
 def merge_segments_to_final(segment_paths: List[Path], output_path: Path, 
-                            pose_info: List[Dict]) -> bool:
+                            pose_info: List[Dict],
+                            progress_callback: Optional[Callable[[float], None]] = None,
+                            cancel_event: Optional[threading.Event] = None,
+                            max_workers: int = MERGE_MAX_WORKERS,
+                            annotation_mode: str = EXPORT_ANNOTATION_MODE,
+                            preset: Optional[EncoderPreset] = None) -> bool:
     """
     合併多個影片片段為最終影片，並加上標註
     
+    - burn_in：每個片段由行程池中的一個 worker 標註並編碼為暫存檔，全部完成後依序串接
+    - sidecar：直接串接原始片段（有 ffmpeg 且片段已符合匯出預設時不重新編碼），標註只寫入時間軸檔案
+    
+    輸出依編碼預設的編碼器、尺寸與幀率；兩種模式都會寫入標註時間軸（見 write_timeline）。
+    
     Args:
         segment_paths: 片段影片路徑列表
         output_path: 輸出影片路徑
         pose_info: 每個片段的姿勢資訊 [{pose_name, score, feedback}, ...]
+        progress_callback: 進度回呼（0.0 ~ 1.0，於呼叫端執行緒執行）
+        cancel_event: 設定後中止合併並回傳 False
+        max_workers: 同時處理的片段數上限（1 表示在呼叫端依序處理）
+        annotation_mode: burn_in 或 sidecar
+        preset: 編碼預設（預設依 EXPORT_PRESET），output_path 副檔名應為 container_for(preset)
     
     Returns:
         bool: 是否成功合併
     """
+    parts_dir = None
+    # 在本行程決定編碼器，片段 worker 行程直接使用
+    preset = (preset or get_preset(EXPORT_PRESET)).resolved()
     try:
+        if annotation_mode not in ANNOTATION_MODES:
+            raise ValueError(f"不支援的標註模式：{annotation_mode}（可用：{', '.join(ANNOTATION_MODES)}）")
         if not segment_paths:
             logger.warning("沒有影片片段可合併")
             return False
@@ -325,126 +1148,268 @@ def merge_segments_to_final(segment_paths: List[Path], output_path: Path,
         height = int(first_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = int(first_cap.get(cv2.CAP_PROP_FPS))
         first_cap.release()
+        size = (width, height)
+        output_size = preset.output_size(size)
+        output_fps = preset.output_fps(fps)
+        
+        # 各片段的影格數（用於計算進度與時間軸，無法開啟的片段為 0）
+        expected_frames = []
+        for segment_path in segment_paths:
+            cap = cv2.VideoCapture(str(segment_path))
+            expected_frames.append(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0)
+            cap.release()
+        total_frames = max(1, sum(expected_frames))
         
-        # 建立輸出寫入器
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        writer = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+        start_time = time.perf_counter()
+        cancel = cancel_event or threading.Event()
+        
+        if annotation_mode == 'sidecar':
+            # 片段由同一個錄製器以相同參數編碼；編碼器、尺寸與幀率都符合匯出預設時可直接串接
+            existing_segments = [path for path, count in zip(segment_paths, expected_frames) if count > 0]
+            if not existing_segments:
+                logger.error("所有片段都無法開啟")
+                return False
+            codec = resolve_codec(preset)
+            allow_copy = (output_size == size and output_fps == fps
+                          and all(stream_codec(path) == codec for path in existing_segments))
+            if not concat_videos(existing_segments, output_path, size, fps, cancel, preset, allow_copy):
+                if cancel.is_set():
+                    raise MergeCancelled()
+                return False
+            output_counts = [int(round(count * output_fps / fps)) for count in expected_frames]
+            write_timeline(output_path, pose_info, output_counts, output_size, output_fps, burned_in=False)
+            if progress_callback is not None:
+                progress_callback(1.0)
+            logger.info(f"影片串接完成：{output_path}（{len(existing_segments)} 個片段，"
+                        f"{time.perf_counter() - start_time:.2f} 秒）")
+            return True
+        
+        parts_dir = Path(tempfile.mkdtemp(prefix=f".{output_path.stem}_", dir=output_path.parent))
+        part_suffix = container_for(preset)
+        part_paths = [parts_dir / f"part_{idx:04d}{part_suffix}" for idx in range(len(segment_paths))]
+        
+        # 取得每個片段的姿勢資訊
+        default_info = {'pose_name': 'Unknown', 'score': 0, 'feedback': ''}
+        infos = [pose_info[idx] if idx < len(pose_info) else default_info for idx in range(len(segment_paths))]
+        
+        def report(done_frames: int, stage_weight: float = 0.9):
+            if progress_callback is not None:
+                progress_callback(min(1.0, done_frames / total_frames) * stage_weight)
+        
+        workers = max(1, min(max_workers, len(segment_paths)))
         
-        if not writer.isOpened():
-            logger.error(f"無法建立輸出影片：{output_path}")
+        if workers == 1:
+            # 依序處理（單一片段或停用平行處理）
+            counts = [0] * len(segment_paths)
+            written_counts = [0] * len(segment_paths)
+            for idx, segment_path in enumerate(segment_paths):
+                logger.info(f"處理片段 {idx + 1}/{len(segment_paths)}: {segment_path}")
+                written_counts[idx] = _annotate_segment(idx, segment_path, part_paths[idx], infos[idx],
+                                                        size, fps, preset, cancel, counts)
+                if cancel.is_set():
+                    raise MergeCancelled()
+                report(sum(counts))
+        else:
+            # server 行程中有擷取與編碼執行緒，以 spawn 建立 worker 避免 fork 複製執行緒狀態
+            context = multiprocessing.get_context('spawn')
+            shared_cancel = context.Event()
+            counts = context.Array('q', len(segment_paths), lock=False)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_merge_worker,
+                                     initargs=(shared_cancel, counts)) as pool:
+                futures = [
+                    pool.submit(_annotate_segment, idx, segment_path, part_paths[idx], infos[idx], size, fps, preset)
+                    for idx, segment_path in enumerate(segment_paths)
+                ]
+                pending = set(futures)
+                while pending:
+                    _, pending = wait(pending, timeout=MERGE_PROGRESS_POLL_SECONDS)
+                    if cancel.is_set():
+                        shared_cancel.set()
+                        for future in pending:
+                            future.cancel()
+                        raise MergeCancelled()
+                    report(sum(counts))
+                written_counts = [future.result() for future in futures]
+        
+        frame_count = sum(counts)
+        existing_parts = [path for path in part_paths if path.exists()]
+        if not existing_parts:
+            logger.error("所有片段都無法開啟")
             return False
         
-        # 逐一處理每個片段
-        for idx, segment_path in enumerate(segment_paths):
-            logger.info(f"處理片段 {idx + 1}/{len(segment_paths)}: {segment_path}")
-            
-            cap = cv2.VideoCapture(str(segment_path))
-            if not cap.isOpened():
-                logger.warning(f"無法開啟片段：{segment_path}，跳過")
-                continue
-            
-            # 取得該片段的姿勢資訊
-            info = pose_info[idx] if idx < len(pose_info) else {
-                'pose_name': 'Unknown',
-                'score': 0,
-                'feedback': ''
-            }
-            
-            # 讀取並標註每一幀
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # 加上標註
-                annotated_frame = add_annotations(
-                    frame,
-                    info.get('pose_name', 'Unknown'),
-                    info.get('score', 0),
-                    info.get('feedback', '')
-                )
-                
-                writer.write(annotated_frame)
-            
-            cap.release()
+        if not concat_videos(existing_parts, output_path, output_size, output_fps, cancel, preset.passthrough()):
+            if cancel.is_set():
+                raise MergeCancelled()
+            return False
+        write_timeline(output_path, pose_info, written_counts, output_size, output_fps, burned_in=True)
+        report(total_frames, 1.0)
         
-        writer.release()
-        logger.info(f"影片合併完成：{output_path}")
+        elapsed = time.perf_counter() - start_time
+        merge_fps = frame_count / elapsed if elapsed > 0 else 0.0
+        if frame_count:
+            VIDEO_MERGE_FPS.observe(merge_fps)
+        logger.info(f"影片合併完成：{output_path}（{frame_count} 幀，{workers} 個 worker，{merge_fps:.1f} fps）")
         return True
-        
+    
+    except MergeCancelled:
+        logger.info(f"影片合併已取消：{output_path}")
+        output_path.unlink(missing_ok=True)
+        timeline_path_for(output_path).unlink(missing_ok=True)
+        return False
+    
     except Exception as e:
         logger.error(f"影片合併失敗：{e}")
         return False
+    
+    finally:
+        if parts_dir is not None:
+            shutil.rmtree(parts_dir, ignore_errors=True)
 
 
 class VideoProcessor:
     """影片處理管理器"""
     
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, recording_preset: str = RECORDING_PRESET):
         """
         初始化
         
         Args:
             session_id: Session ID
+            recording_preset: 片段錄製的編碼預設名稱（見 config.ENCODER_PRESETS）
         """
         self.session_id = session_id
         self.camera = None
-        self.current_recorder = None
+        self.recording_preset = get_preset(recording_preset)
+        self.encoder = SegmentEncoder(preset=self.recording_preset)
+        self.preroll = PreRollBuffer()
+        self.recording = False
+        # stop_camera() 之後不再開始新片段（編碼器已停止，匯出工作正在讀取 segment_paths）
+        self.stopped = False
+        self._record_lock = threading.Lock()
         self.segment_paths = []
         self.segment_info = []
         self.segment_count = 0
-        
+    
     def start_camera(self) -> bool:
-        """啟動相機"""
-        self.camera = CameraCapture()
-        return self.camera.start()
+        """啟動相機（背景擷取模式下，擷取到的影格送入錄製管線或預錄緩衝區）"""
+        self.camera = CameraCapture(threaded=CAMERA_THREADED)
+        if CAMERA_THREADED:
+            self.camera.add_listener(self._on_frame)
+        if not self.camera.start():
+            return False
+        
+        self.encoder.start()
+        return True
     
     def stop_camera(self):
-        """停止相機"""
+        """停止相機，並等待錄製管線寫完剩餘影格"""
         if self.camera:
             self.camera.stop()
+        
+        # 最後一個片段沒有對應的姿勢資訊（尚未呼叫 stop_segment_recording），不納入合併
+        with self._record_lock:
+            self.stopped = True
+            if self.recording:
+                self.encoder.close_segment(discard=True)
+                self.segment_paths.pop()
+                self.recording = False
+            self.preroll.clear()
+        self.encoder.stop()
+    
+    def _on_frame(self, captured: CapturedFrame):
+        """
+        擷取執行緒：錄製中送入錄製佇列，否則存入預錄緩衝區
+        
+        JPEG 壓縮在鎖外進行，start_segment_recording()（事件迴圈）不必等待壓縮完成；
+        壓縮期間開始錄製時，影格改送入錄製佇列，壓縮結果捨棄。
+        """
+        encoded = None if self.recording else self.preroll.encode(captured.frame)
+        
+        with self._record_lock:
+            if self.recording:
+                self.encoder.submit(captured.frame)
+            elif encoded is not None:
+                self.preroll.append(captured.timestamp, *encoded)
     
     def start_segment_recording(self) -> bool:
-        """開始錄製新片段"""
-        self.segment_count += 1
-        segment_path = VIDEO_SEGMENTS_DIR / f"{self.session_id}_segment_{self.segment_count}.mp4"
-        
-        self.current_recorder = VideoRecorder(
-            segment_path,
-            CAMERA_WIDTH,
-            CAMERA_HEIGHT
-        )
+        """
+        開始錄製新片段（立即返回，寫入器由編碼執行緒建立），預錄緩衝區的影格寫在片段開頭
         
-        if self.current_recorder.start():
+        Returns:
+            bool: 是否已開始（錄製中或相機已停止時為 False）
+        """
+        with self._record_lock:
+            if self.stopped:
+                logger.warning(f"Session {self.session_id} 的相機已停止，不開始新片段")
+                return False
+            if self.recording:
+                logger.warning(f"片段 {self.segment_count} 尚未結束，無法開始新片段")
+                return False
+            
+            self.segment_count += 1
+            segment_suffix = container_for(self.recording_preset)
+            segment_path = VIDEO_SEGMENTS_DIR / f"{self.session_id}_segment_{self.segment_count}{segment_suffix}"
+            
+            self.encoder.open_segment(segment_path, self.preroll.drain())
             self.segment_paths.append(segment_path)
+            self.recording = True
             return True
-        return False
     
     def record_frame(self, frame: np.ndarray):
-        """錄製一幀"""
-        if self.current_recorder:
-            self.current_recorder.write_frame(frame)
-    
-    def stop_segment_recording(self, pose_name: str, score: int, feedback: str):
-        """停止當前片段錄製"""
-        if self.current_recorder:
-            self.current_recorder.stop()
+        """錄製一幀（放入錄製佇列後立即返回）"""
+        if self.recording:
+            self.encoder.submit(frame)
+    
+    def stop_segment_recording(self, pose_name: str, score: int, feedback: str) -> bool:
+        """
+        停止當前片段錄製（立即返回，檔案由編碼執行緒關閉）
+        
+        Returns:
+            bool: 是否有片段被結束（未在錄製時為 False）
+        """
+        with self._record_lock:
+            if not self.recording:
+                return False
+            self.encoder.close_segment()
             self.segment_info.append({
                 'pose_name': pose_name,
                 'score': score,
                 'feedback': feedback
             })
-            self.current_recorder = None
+            self.recording = False
+            return True
     
-    def merge_final_video(self) -> Path:
-        """合併最終影片"""
-        output_path = VIDEO_SESSIONS_DIR / f"{self.session_id}.mp4"
+    def merge_final_video(self, progress_callback: Optional[Callable[[float], None]] = None,
+                          cancel_event: Optional[threading.Event] = None,
+                          annotation_mode: str = EXPORT_ANNOTATION_MODE,
+                          export_preset: str = EXPORT_PRESET) -> Path:
+        """
+        合併最終影片
+        
+        Args:
+            progress_callback: 進度回呼（0.0 ~ 1.0）
+            cancel_event: 設定後中止合併
+            annotation_mode: burn_in 或 sidecar（見 merge_segments_to_final）
+            export_preset: 匯出的編碼預設名稱（見 config.ENCODER_PRESETS）
+        
+        Returns:
+            Path: 輸出影片路徑，失敗或取消時為 None
+        """
+        preset = get_preset(export_preset)
+        output_path = VIDEO_SESSIONS_DIR / f"{self.session_id}{container_for(preset)}"
+        
+        # 確保所有片段都已寫完
+        self.encoder.flush()
         
         success = merge_segments_to_final(
             self.segment_paths,
             output_path,
-            self.segment_info
+            self.segment_info,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            annotation_mode=annotation_mode,
+            preset=preset
         )
         
         if success:
@@ -1,17 +1,50 @@
-import React from 'react';
+import React, { useState } from 'react';
+
+/**
+ * 取得播放時間所在的標註片段
+ * @param {Object} timeline - 標註時間軸（backend/video_processor.py write_timeline）
+ * @param {number} time - 播放時間（秒）
+ * @returns {Object|null} 片段標註
+ */
+const findSegment = (timeline, time) => {
+    if (!timeline || timeline.annotations_burned_in) return null;
+    return timeline.segments.find(seg => time >= seg.start_seconds && time < seg.end_seconds) || null;
+};
+
+const scoreColor = (score) => {
+    if (score >= 90) return 'text-green-400';
+    if (score >= 70) return 'text-yellow-300';
+    return 'text-red-400';
+};
+
+const VideoPlayer = ({ src, poster, timeline = null }) => {
+    const [segment, setSegment] = useState(null);
+
+    // 影片未燒入標註時，依播放時間疊加目前片段的姿勢、分數與回饋
+    const handleTimeUpdate = (event) => {
+        const next = findSegment(timeline, event.target.currentTime);
+        if (next?.index !== segment?.index) setSegment(next);
+    };
 
-const VideoPlayer = ({ src, poster }) => {
     return (
-        <div className="w-full bg-black rounded-lg overflow-hidden shadow-lg">
+        <div className="relative w-full bg-black rounded-lg overflow-hidden shadow-lg">
             <video
                 className="w-full aspect-video"
                 controls
                 playsInline
                 poster={poster}
                 src={src}
+                onTimeUpdate={timeline ? handleTimeUpdate : undefined}
             >
                 您的瀏覽器不支援影片播放。
             </video>
+            {segment && (
+                <div className="absolute top-2 left-2 right-2 bg-black/60 text-white rounded px-3 py-2 pointer-events-none">
+                    <div className="text-lg font-semibold">Pose: {segment.pose_name}</div>
+                    <div className={`font-semibold ${scoreColor(segment.score)}`}>Score: {segment.score}</div>
+                    {segment.feedback && <div className="text-sm">{segment.feedback}</div>}
+                </div>
+            )}
         </div>
     );
 };
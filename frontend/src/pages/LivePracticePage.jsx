@@ -11,6 +11,7 @@ const LivePracticePage = () => {
     const [duration, setDuration] = useState(0);
     const [selectedPose, setSelectedPose] = useState('');
     const [isLoading, setIsLoading] = useState(false);
+    const [exportProgress, setExportProgress] = useState(null);
 
     const timerRef = useRef(null);
 
@@ -33,6 +34,11 @@ const LivePracticePage = () => {
         };
     }, [sessionId]);
 
+    // 目標姿勢改變時同步到 WebSocket 影格的姿勢提示
+    useEffect(() => {
+        websocketService.setPoseHint(selectedPose || null);
+    }, [selectedPose]);
+
     const handleStartSession = async () => {
         try {
             setIsLoading(true);
@@ -62,12 +68,18 @@ const LivePracticePage = () => {
 
         try {
             setIsLoading(true);
-            // 停止錄製並合併影片
-            await apiService.mergeAndExport(sessionId);
+            // 停止錄製並排入影片匯出工作
+            const job = await apiService.mergeAndExport(sessionId);
+            if (timerRef.current) clearInterval(timerRef.current);
+
+            // 等待匯出完成（進度也會經由 WebSocket 推送）
+            setExportProgress(0);
+            await apiService.waitForJob(job.job_id, progress => {
+                setExportProgress(prev => Math.max(prev ?? 0, progress));
+            });
 
             setIsRecording(false);
             websocketService.disconnect();
-            if (timerRef.current) clearInterval(timerRef.current);
 
             alert('練習結束！影片已儲存');
             // 可以導航到詳情頁或重置狀態
@@ -78,12 +90,15 @@ const LivePracticePage = () => {
             alert('結束練習時發生錯誤');
         } finally {
             setIsLoading(false);
+            setExportProgress(null);
         }
     };
 
     const handleWebSocketMessage = (message) => {
         if (message.type === 'pose_feedback') {
             setFeedback(message.data);
+        } else if (message.type === 'export_progress') {
+            setExportProgress(prev => Math.max(prev ?? 0, message.data.progress));
         }
     };
 
@@ -95,12 +110,13 @@ const LivePracticePage = () => {
         // 為簡化，直接發送
 
         try {
-            // 透過 WebSocket 發送還是 HTTP？
-            // 原設計是用 HTTP POST /pose_analysis，WebSocket 負責接收回饋
-            // 但頻繁 HTTP POST 效能較差。若後端有 WebSocket 接收會更好。
-            // 目前實作計畫是：前端偵測 -> HTTP POST -> WebSocket 回傳結果
-            // 為了效能，我們限制發送頻率 (例如每 200ms)
+            // 優先透過 WebSocket 以二進位格式逐幀發送，回饋由同一連線回傳
+            if (websocketService.sendLandmarks(landmarks)) {
+                return;
+            }
 
+            // WebSocket 尚未連接時改用 HTTP POST /pose_analysis
+            // 為了效能，我們限制發送頻率 (例如每 200ms)
             const now = Date.now();
             if (!handlePoseResults.lastTime || now - handlePoseResults.lastTime > 200) {
                 handlePoseResults.lastTime = now;
@@ -226,7 +242,9 @@ const LivePracticePage = () => {
                             disabled={isLoading}
                             className="btn btn-error btn-lg rounded-full px-8 shadow-lg hover:shadow-xl transform transition hover:-translate-y-1"
                         >
-                            ■ 結束練習
+                            {exportProgress !== null
+                                ? `影片匯出中 ${Math.round(exportProgress * 100)}%`
+                                : '■ 結束練習'}
                         </button>
                     )}
                 </div>
@@ -8,6 +8,7 @@ const SessionDetailPage = () => {
     const navigate = useNavigate();
     const [session, setSession] = useState(null);
     const [loading, setLoading] = useState(true);
+    const [timeline, setTimeline] = useState(null);
 
     useEffect(() => {
         const fetchDetail = async () => {
@@ -15,6 +16,10 @@ const SessionDetailPage = () => {
                 setLoading(true);
                 const data = await apiService.getSessionDetail(sessionId);
                 setSession(data);
+                // 標註時間軸（sidecar 模式匯出的影片由前端疊加標註）
+                if (data.timeline_url) {
+                    apiService.getTimeline(data.timeline_url).then(setTimeline).catch(console.error);
+                }
             } catch (error) {
                 console.error('載入詳情失敗:', error);
                 alert('無法載入 Session 資料');
@@ -88,7 +93,7 @@ const SessionDetailPage = () => {
                 <div className="lg:col-span-2 space-y-6">
                     <div className="card p-0 overflow-hidden bg-black">
                         {video_url ? (
-                            <VideoPlayer src={`http://localhost:8000${video_url}`} />
+                            <VideoPlayer src={`http://localhost:8000${video_url}`} timeline={timeline} />
                         ) : (
                             <div className="aspect-video flex items-center justify-center text-gray-400">
                                 <p>此練習未建立影片檔案</p>
@@ -61,9 +61,9 @@ export const apiService = {
     },
 
     /**
-     * 合併影片並匯出
+     * 合併影片並匯出（排入背景工作）
      * @param {string} sessionId - Session ID
-     * @returns {Promise} 影片資料
+     * @returns {Promise} 匯出工作 { job_id, status, status_url }
      */
     async mergeAndExport(sessionId) {
         const response = await apiClient.post('/merge_and_export', {
@@ -72,17 +72,46 @@ export const apiService = {
         return response.data;
     },
 
+    /**
+     * 查詢匯出工作狀態
+     * @param {string} jobId - 工作 ID
+     * @returns {Promise} 工作狀態 { status, progress, result, error }
+     */
+    async getJob(jobId) {
+        const response = await apiClient.get(`/jobs/${jobId}`);
+        return response.data;
+    },
+
+    /**
+     * 等待匯出工作結束
+     * @param {string} jobId - 工作 ID
+     * @param {Function} onProgress - 進度回呼（0 ~ 1）
+     * @param {number} intervalMs - 查詢間隔（毫秒）
+     * @returns {Promise} 匯出結果（影片資料），失敗或取消時拋出錯誤
+     */
+    async waitForJob(jobId, onProgress = null, intervalMs = 1000) {
+        for (;;) {
+            const job = await this.getJob(jobId);
+            if (onProgress) onProgress(job.progress);
+            if (job.status === 'completed') return job.result;
+            if (job.status === 'failed' || job.status === 'cancelled') {
+                throw new Error(job.error || `匯出工作${job.status === 'failed' ? '失敗' : '已取消'}`);
+            }
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    },
+
     /**
      * 取得使用者歷史記錄
      * @param {string} userId - 使用者 ID
      * @param {number} limit - 回傳筆數限制
      * @param {number} skip - 跳過筆數
-     * @returns {Promise} 歷史記錄
+     * @param {string|null} cursor - 上一頁回應的 next_cursor（提供時忽略 skip）
+     * @returns {Promise} 歷史記錄 { total, sessions, next_cursor }
      */
-    async getUserHistory(userId = 'default_user', limit = 20, skip = 0) {
-        const response = await apiClient.get('/user_history', {
-            params: { user_id: userId, limit, skip },
-        });
+    async getUserHistory(userId = 'default_user', limit = 20, skip = 0, cursor = null) {
+        const params = cursor ? { user_id: userId, limit, cursor } : { user_id: userId, limit, skip };
+        const response = await apiClient.get('/user_history', { params });
         return response.data;
     },
 
@@ -98,6 +127,16 @@ export const apiService = {
         return response.data;
     },
 
+    /**
+     * 取得影片標註時間軸
+     * @param {string} timelineUrl - 時間軸 URL（session 詳情的 timeline_url）
+     * @returns {Promise} 時間軸 { annotations_burned_in, segments: [{ start_seconds, end_seconds, pose_name, score, feedback }] }
+     */
+    async getTimeline(timelineUrl) {
+        const response = await apiClient.get(timelineUrl);
+        return response.data;
+    },
+
     /**
      * 文字轉語音
      * @param {string} text - 文字內容
@@ -1,4 +1,8 @@
-// WebSocket 服務 - 處理即時回饋推送
+// WebSocket 服務 - 處理即時回饋推送與 landmark 影格上傳
+const LANDMARK_COUNT = 33;
+const FRAME_HEADER_SIZE = 12;
+const FRAME_VERSION = 1;
+
 class WebSocketService {
     constructor() {
         this.ws = null;
@@ -6,6 +10,10 @@ class WebSocketService {
         this.listeners = [];
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
+        this.poseHint = null;
+        // 二進位 landmark 影格緩衝區（格式見 backend/landmark_codec.py）
+        this.frameBuffer = new ArrayBuffer(FRAME_HEADER_SIZE + LANDMARK_COUNT * 4 * 4);
+        this.frameView = new DataView(this.frameBuffer);
     }
 
     /**
@@ -24,7 +32,7 @@ class WebSocketService {
                 this.reconnectAttempts = 0;
 
                 // 發送 session_id
-                this.ws.send(JSON.stringify({ session_id: sessionId }));
+                this.ws.send(JSON.stringify({ session_id: sessionId, pose_hint: this.poseHint }));
             };
 
             this.ws.onmessage = (event) => {
@@ -108,6 +116,50 @@ class WebSocketService {
         }
     }
 
+    /**
+     * 設定姿勢提示（之後的 landmark 影格都使用此提示）
+     * @param {string|null} poseHint - 姿勢名稱，null 表示自動偵測
+     */
+    setPoseHint(poseHint) {
+        this.poseHint = poseHint || null;
+        if (this.isConnected()) {
+            this.ws.send(JSON.stringify({ type: 'pose_hint', pose_hint: this.poseHint }));
+        }
+    }
+
+    /**
+     * 以二進位格式發送 landmark 影格（float32，12 bytes 標頭 + 33 × 4 個數值）
+     * @param {Array} landmarks - 33 個關鍵點
+     * @returns {boolean} 是否已發送
+     */
+    sendLandmarks(landmarks) {
+        if (!this.isConnected() || !landmarks || landmarks.length !== LANDMARK_COUNT) {
+            return false;
+        }
+
+        const view = this.frameView;
+        view.setUint8(0, 0x59); // 'Y'
+        view.setUint8(1, 0x4c); // 'L'
+        view.setUint8(2, FRAME_VERSION);
+        view.setUint8(3, 0); // float32
+        view.setUint16(4, LANDMARK_COUNT, true);
+        view.setUint16(6, 0, true);
+        view.setUint32(8, Math.floor(performance.now()) >>> 0, true);
+
+        let offset = FRAME_HEADER_SIZE;
+        for (const landmark of landmarks) {
+            view.setFloat32(offset, landmark.x, true);
+            view.setFloat32(offset + 4, landmark.y, true);
+            view.setFloat32(offset + 8, landmark.z ?? 0, true);
+            // 缺少 visibility 時與後端 JSON 路徑相同視為 1.0，兩種傳輸的評分才一致
+            view.setFloat32(offset + 12, landmark.visibility ?? 1, true);
+            offset += 16;
+        }
+
+        this.ws.send(this.frameBuffer);
+        return true;
+    }
+
     /**
      * 斷開連接
      */
@@ -0,0 +1,67 @@
+"""
+AI 瑜珈教練系統 - 分析工作執行器單元測試
+"""
+
+import asyncio
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from analysis_executor import AnalysisExecutor, AnalysisQueueFull
+from pose_analyzer import score_frames
+
+
+@pytest.mark.parametrize('mode', ['inline', 'thread', 'process'])
+def test_run_modes(mode):
+    """測試各執行模式的結果一致"""
+    points = np.random.default_rng(0).random((4, 33, 4), dtype=np.float32)
+    expected = score_frames(points)
+    
+    executor = AnalysisExecutor(mode=mode, max_workers=1)
+    try:
+        result = asyncio.run(executor.run(score_frames, points))
+    finally:
+        executor.shutdown()
+    
+    for actual, wanted in zip(result, expected):
+        np.testing.assert_array_equal(actual, wanted)
+    stats = executor.stats()
+    assert stats['completed'] == 1
+    assert stats['pending'] == 0
+
+
+def test_backpressure():
+    """測試等待中的工作達上限時拒絕新工作"""
+    release = threading.Event()
+    executor = AnalysisExecutor(mode='thread', max_workers=1, max_pending=2)
+    
+    async def scenario():
+        tasks = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert executor.pending == 2
+        with pytest.raises(AnalysisQueueFull):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*tasks)
+    
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    
+    stats = executor.stats()
+    assert stats['rejected'] == 1
+    assert stats['completed'] == 2
+    assert stats['peak_pending'] == 2
+    # 第二個工作需等第一個完成才開始
+    assert stats['max_wait_ms'] > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,289 @@
+"""
+AI 瑜珈教練系統 - API 端點測試（以測試替身取代 MongoDB，不開啟相機）
+"""
+
+import json
+import pytest
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import main
+from analysis_executor import AnalysisExecutor
+from database import AsyncDatabase
+from export_jobs import ExportJobManager
+from feedback_bus import FeedbackBus
+from landmark_codec import encode_landmark_frame
+from pose_analyzer import PoseLandmark
+from session_registry import SessionRegistry
+
+
+def make_warrior():
+    """建立 Warrior II 的 landmarks（雙臂水平、左膝約 93 度、右腿伸直）"""
+    points = np.zeros((33, 4), dtype=np.float32)
+    points[:, :2] = 0.5
+    points[:, 3] = 1.0
+    coords = {
+        PoseLandmark.LEFT_SHOULDER: (0.4, 0.4),
+        PoseLandmark.LEFT_ELBOW: (0.3, 0.4),
+        PoseLandmark.LEFT_WRIST: (0.2, 0.4),
+        PoseLandmark.RIGHT_SHOULDER: (0.6, 0.4),
+        PoseLandmark.RIGHT_ELBOW: (0.7, 0.4),
+        PoseLandmark.RIGHT_WRIST: (0.8, 0.4),
+        PoseLandmark.LEFT_HIP: (0.45, 0.6),
+        PoseLandmark.LEFT_KNEE: (0.35, 0.6),
+        PoseLandmark.LEFT_ANKLE: (0.34, 0.8),
+        PoseLandmark.RIGHT_HIP: (0.55, 0.6),
+        PoseLandmark.RIGHT_KNEE: (0.65, 0.7),
+        PoseLandmark.RIGHT_ANKLE: (0.75, 0.8),
+    }
+    for index, xy in coords.items():
+        points[index, :2] = xy
+    return points
+
+
+WARRIOR = make_warrior()
+
+
+class StubDatabase:
+    """以 dict 保存 session 的同步資料庫替身"""
+    
+    def __init__(self):
+        self.sessions = {}
+    
+    def save_session(self, session_data):
+        self.sessions[session_data['session_id']] = dict(session_data)
+        return True
+    
+    def get_session(self, session_id):
+        return self.sessions.get(session_id)
+    
+    def update_session_poses(self, session_id, pose_data):
+        self.sessions[session_id].setdefault('poses', []).append(pose_data)
+        return True
+    
+    def update_session_final_info(self, session_id, duration_seconds, avg_score, video_path):
+        self.sessions[session_id].update(duration_seconds=duration_seconds, avg_score=avg_score,
+                                         final_video_path=video_path)
+        return True
+    
+    def flush(self):
+        return 0
+    
+    def cache_stats(self):
+        stats = {'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'entries': 2}
+        return {'session': stats, 'history': stats}
+
+
+class FakeProcessor:
+    """不開啟相機的 VideoProcessor 替身，merge_final_video 回傳預先建立的檔案（None 表示合併失敗）"""
+    
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.recording = False
+        self.stopped = False
+        self.encoder = SimpleNamespace(dropped_count=0)
+    
+    def stop_camera(self):
+        self.stopped = True
+    
+    def merge_final_video(self, progress_callback, cancel_event, annotation_mode, export_preset):
+        progress_callback(0.5)
+        return self.output_path
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    每個測試使用全新的資料庫替身、session 登錄、分析執行器與匯出工作管理器
+    
+    啟動事件會連線資料庫與偵測編碼器，關閉事件會關閉執行器，因此不共用模組層級的實例。
+    """
+    database = StubDatabase()
+    registry = SessionRegistry()
+    monkeypatch.setattr(main, 'async_db', AsyncDatabase(lambda: database, max_workers=2))
+    monkeypatch.setattr(main, 'get_database', lambda: database)
+    monkeypatch.setattr(main, 'detect_codecs', lambda: ('mp4v',))
+    monkeypatch.setattr(main, 'analysis_executor', AnalysisExecutor('thread', max_workers=2))
+    monkeypatch.setattr(main, 'session_registry', registry)
+    monkeypatch.setattr(main, 'feedback_bus', FeedbackBus())
+    monkeypatch.setattr(main, 'export_jobs', ExportJobManager(registry, on_update=main.on_export_job_update))
+    for name in ('active_sessions', 'websocket_connections', 'pose_streams', 'stream_last_used', 'segment_requests'):
+        monkeypatch.setattr(main, name, {})
+    
+    with TestClient(main.app) as test_client:
+        test_client.database = database
+        yield test_client
+
+
+def register_session(session_id, user_id='u1'):
+    """登錄由其他 worker 持有的 session（本 worker 沒有相機）"""
+    main.session_registry.register(session_id, {'session_id': session_id, 'user_id': user_id, 'worker_id': 'other'})
+
+
+def add_local_session(client, session_id, processor):
+    """建立由本 worker 持有的 session（含資料庫記錄）"""
+    main.active_sessions[session_id] = processor
+    main.session_registry.register(session_id, {'session_id': session_id, 'user_id': 'u1', 'worker_id': main.WORKER_ID})
+    client.database.save_session({'session_id': session_id, 'user_id': 'u1',
+                                  'poses': [{'duration_seconds': 10, 'score': 80}, {'duration_seconds': 5, 'score': 90}]})
+
+
+def wait_for(condition, timeout=5.0):
+    """等待背景工作與狀態通知完成"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待逾時"
+        time.sleep(0.01)
+
+
+def test_pose_analysis_batch(client):
+    """測試批次分析逐影格回傳結果，並檢查 session、形狀與非有限數值"""
+    register_session('s1')
+    register_session('s2')
+    frames = np.stack([WARRIOR, WARRIOR, np.zeros((33, 4), dtype=np.float32)]).tolist()
+    
+    response = client.post('/pose_analysis_batch', json={'session_ids': ['s1', 's1', 's2'], 'landmarks': frames})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['count'] == 3
+    assert [result['session_id'] for result in body['results']] == ['s1', 's1', 's2']
+    assert body['results'][0]['pose_name'] == 'Warrior II'
+    
+    response = client.post('/pose_analysis_batch', json={'session_ids': ['s1', 'missing'], 'landmarks': frames[:2]})
+    assert response.status_code == 404
+    response = client.post('/pose_analysis_batch', json={'session_ids': ['s1'], 'landmarks': [frames[0][:32]]})
+    assert response.status_code == 400
+    response = client.post('/pose_analysis_batch', json={'session_ids': ['s1', 's1'], 'landmarks': frames[:1]})
+    assert response.status_code == 400
+    # 標準 JSON 不含 NaN，httpx 也拒絕編碼，因此直接送出 json.dumps 產生的 NaN 字面值
+    broken = [row[:] for row in frames[0]]
+    broken[0][0] = float('nan')
+    payload = json.dumps({'session_ids': ['s1'], 'landmarks': [broken]})
+    response = client.post('/pose_analysis_batch', content=payload, headers={'Content-Type': 'application/json'})
+    assert response.status_code == 400
+
+
+def test_analysis_queue_full_returns_503(client):
+    """測試分析佇列已滿時批次與單一影格分析都回傳 503，且被拒絕的影格不建立串流狀態"""
+    register_session('s1')
+    main.analysis_executor.pending = main.analysis_executor.max_pending
+    try:
+        response = client.post('/pose_analysis_batch', json={'session_ids': ['s1'], 'landmarks': [WARRIOR.tolist()]})
+        assert response.status_code == 503
+        
+        landmarks = [dict(zip(('x', 'y', 'z', 'visibility'), point)) for point in WARRIOR.tolist()]
+        response = client.post('/pose_analysis', json={'session_id': 's1', 'landmarks': landmarks, 'timestamp': 0})
+        assert response.status_code == 503
+        assert 's1' not in main.pose_streams
+    finally:
+        main.analysis_executor.pending = 0
+    
+    assert main.analysis_executor.rejected == 2
+
+
+def test_metrics(client):
+    """測試 /metrics 以 Prometheus 文字格式輸出延遲分布、佇列深度與資料庫快取統計"""
+    register_session('s1')
+    client.post('/pose_analysis_batch', json={'session_ids': ['s1'], 'landmarks': [WARRIOR.tolist()]})
+    
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    lines = response.text.splitlines()
+    assert '# TYPE yoga_db_cache_hits_total counter' in lines
+    assert 'yoga_db_cache_hits_total{cache="session"} 3' in lines
+    assert 'yoga_db_cache_hit_ratio{cache="history"} 0.75' in lines
+    assert 'yoga_analysis_queue_depth 0' in lines
+    assert 'yoga_active_sessions 0' in lines
+    assert 'yoga_export_jobs{status="queued"} 0' in lines
+    # 延遲分布為全域指標，其他測試也會累積，只檢查已有樣本
+    assert any(line.startswith('yoga_pose_analysis_seconds_count{path="batch"}') for line in lines)
+
+
+def test_websocket_binary_frames(client):
+    """測試 WebSocket 二進位 landmark 影格：回覆分析結果，格式錯誤或含 NaN 時回覆錯誤"""
+    register_session('s1')
+    nan_frame = WARRIOR.copy()
+    nan_frame[0, 0] = np.nan
+    
+    with client.websocket_connect('/ws') as websocket:
+        websocket.send_json({'session_id': 's1', 'pose_hint': 'Warrior II'})
+        websocket.send_bytes(encode_landmark_frame(WARRIOR, timestamp_ms=1000))
+        reply = websocket.receive_json()
+        assert reply['type'] == 'pose_feedback'
+        assert reply['timestamp_ms'] == 1000
+        assert reply['data']['pose_name'] == 'Warrior II'
+        assert main.session_registry.get_route('s1') == main.feedback_bus.address
+        
+        websocket.send_bytes(b'not a frame')
+        assert websocket.receive_json()['type'] == 'error'
+        websocket.send_bytes(encode_landmark_frame(nan_frame, timestamp_ms=1033))
+        assert websocket.receive_json()['type'] == 'error'
+    
+    # 斷線後移除連線與回饋路由
+    assert 's1' not in main.websocket_connections
+    assert main.session_registry.get_route('s1') is None
+
+
+def test_merge_and_export_job(client, tmp_path):
+    """測試 /merge_and_export 排入匯出工作，完成後 /jobs/{job_id} 回傳結果並釋放 session"""
+    output_path = tmp_path / "final.mp4"
+    output_path.write_bytes(b'\0' * 1024)
+    processor = FakeProcessor(output_path)
+    add_local_session(client, 's1', processor)
+    
+    response = client.post('/merge_and_export', json={'session_id': 's1'})
+    assert response.status_code == 202
+    body = response.json()
+    assert body['status_url'] == f"/jobs/{body['job_id']}"
+    assert processor.stopped
+    
+    wait_for(lambda: client.get(body['status_url']).json()['status'] == 'completed')
+    job = client.get(body['status_url']).json()
+    assert job['session_id'] == 's1'
+    assert job['progress'] == 1.0
+    assert job['result']['download_path'] == str(output_path)
+    assert job['result']['duration_seconds'] == 15
+    assert client.database.sessions['s1']['avg_score'] == 85.0
+    
+    # 狀態通知在事件迴圈中執行，完成後 session 從本 worker 與登錄移除
+    wait_for(lambda: 's1' not in main.active_sessions)
+    assert 's1' not in main.session_registry
+    assert client.post('/merge_and_export', json={'session_id': 's1'}).status_code == 404
+
+
+def test_failed_export_job_releases_session(client, tmp_path):
+    """測試合併失敗時工作狀態為 failed，session 同樣被釋放"""
+    add_local_session(client, 's1', FakeProcessor(None))
+    
+    response = client.post('/merge_and_export', json={'session_id': 's1'})
+    assert response.status_code == 202
+    status_url = response.json()['status_url']
+    
+    wait_for(lambda: client.get(status_url).json()['status'] == 'failed')
+    assert client.get(status_url).json()['error'] == "影片合併失敗"
+    wait_for(lambda: 's1' not in main.active_sessions)
+    assert 's1' not in main.session_registry
+
+
+def test_job_endpoints_reject_unknown_jobs(client):
+    """測試查詢與取消不存在的工作回傳 404，其他 worker 持有的 session 不能在本 worker 匯出"""
+    assert client.get('/jobs/unknown').status_code == 404
+    assert client.delete('/jobs/unknown').status_code == 404
+    
+    register_session('s1')
+    assert client.post('/merge_and_export', json={'session_id': 's1'}).status_code == 409
+    response = client.post('/merge_and_export', json={'session_id': 's1', 'annotation_mode': 'bogus'})
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
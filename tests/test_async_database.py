@@ -0,0 +1,101 @@
+"""
+AI 瑜珈教練系統 - 非同步資料庫介面單元測試
+"""
+
+import asyncio
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from database import AsyncDatabase
+
+
+class SlowDatabase:
+    """每次查詢耗時固定時間的同步資料庫（模擬 MongoDB 往返）"""
+    
+    def __init__(self, delay):
+        self.delay = delay
+        self.threads = set()
+        self.sessions = {}
+    
+    def _wait(self):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+    
+    def save_session(self, session_data):
+        self._wait()
+        self.sessions[session_data['session_id']] = dict(session_data)
+        return True
+    
+    def get_session(self, session_id):
+        self._wait()
+        return self.sessions.get(session_id)
+    
+    def get_user_history(self, user_id, limit=20, skip=0):
+        self._wait()
+        return [s for s in self.sessions.values() if s['user_id'] == user_id][skip:skip + limit]
+    
+    def get_total_sessions_count(self, user_id):
+        self._wait()
+        return sum(1 for s in self.sessions.values() if s['user_id'] == user_id)
+
+
+def test_calls_run_off_the_event_loop():
+    """測試資料庫呼叫在 I/O 執行緒中執行，同時到達的查詢並行處理"""
+    database = SlowDatabase(0.2)
+    async_db = AsyncDatabase(lambda: database, max_workers=4)
+    
+    async def scenario():
+        await async_db.save_session({'session_id': 's1', 'user_id': 'u1', 'start_time': '2026-01-14T16:38:47'})
+        
+        # 查詢期間事件迴圈仍可執行其他工作
+        ticks = 0
+        
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        
+        tick_task = asyncio.ensure_future(ticker())
+        start = time.perf_counter()
+        results = await asyncio.gather(*[async_db.get_user_history('u1') for _ in range(4)],
+                                       async_db.get_total_sessions_count('u1'))
+        elapsed = time.perf_counter() - start
+        tick_task.cancel()
+        return results, elapsed, ticks
+    
+    try:
+        results, elapsed, ticks = asyncio.run(scenario())
+    finally:
+        async_db.shutdown()
+    
+    assert results[-1] == 1
+    assert all(len(history) == 1 for history in results[:4])
+    # 5 個查詢由 4 個執行緒處理，約 2 輪，依序執行則需要 1 秒
+    assert elapsed < 0.7
+    assert ticks >= 10
+    assert all(name.startswith('db-io') for name in database.threads)
+    assert async_db.peak_pending == 5
+    assert async_db.stats()['pending'] == 0
+
+
+def test_restart_after_shutdown():
+    """測試關閉後再次使用時重新建立執行緒池"""
+    database = SlowDatabase(0)
+    async_db = AsyncDatabase(lambda: database, max_workers=1)
+    
+    assert asyncio.run(async_db.get_session('missing')) is None
+    async_db.shutdown()
+    assert asyncio.run(async_db.save_session({'session_id': 's1', 'user_id': 'u1'}))
+    assert asyncio.run(async_db.connect()) is database
+    async_db.shutdown()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
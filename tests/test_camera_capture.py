@@ -0,0 +1,126 @@
+"""
+AI 瑜珈教練系統 - 背景擷取單元測試（以影片檔模擬相機）
+"""
+
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from video_processor import CameraCapture
+
+
+@pytest.fixture
+def video_source(tmp_path):
+    """建立 60 幀的測試影片，每幀亮度遞增"""
+    path = tmp_path / "source.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 30, (64, 48))
+    for i in range(60):
+        writer.write(np.full((48, 64, 3), i * 4, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def wait_for_frames(camera, count, timeout=5.0):
+    """等待擷取執行緒讀到指定幀數"""
+    deadline = time.monotonic() + timeout
+    while camera.captured_count < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_threaded_capture_ring_buffer(video_source):
+    """測試背景擷取寫入環形緩衝區，latest() / history() 不複製影格"""
+    camera = CameraCapture(video_source, width=64, height=48, threaded=True, ring_size=4)
+    assert camera.start()
+    try:
+        wait_for_frames(camera, 60)
+        
+        latest = camera.latest()
+        assert latest is not None
+        assert latest.frame.shape == (48, 64, 3)
+        # 視圖直接指向環形緩衝區
+        assert np.shares_memory(latest.frame, camera._ring)
+        
+        history = camera.history(10)
+        assert len(history) == 3
+        assert [f.sequence for f in history] == list(range(latest.sequence - 2, latest.sequence + 1))
+        assert all(a.timestamp <= b.timestamp for a, b in zip(history, history[1:]))
+        # 亮度遞增：較新的影格較亮
+        assert history[0].frame.mean() < history[-1].frame.mean()
+    finally:
+        camera.stop()
+
+
+def test_dropped_and_duplicated_counters(video_source):
+    """測試讀取端跳過或重複讀取時的統計"""
+    camera = CameraCapture(video_source, width=64, height=48, threaded=True, ring_size=4)
+    # 擷取執行緒等到讀取第一幀後才開始，確保 first 一定是啟動時讀取的第一幀（影片檔解碼很快，可能在讀取前就擷取完畢）
+    gate = threading.Event()
+    capture_loop = camera._capture_loop
+    
+    def gated_capture_loop():
+        gate.wait(5)
+        capture_loop()
+    
+    camera._capture_loop = gated_capture_loop
+    assert camera.start()
+    try:
+        first = camera.latest()
+        assert first.sequence == 0
+        gate.set()
+        wait_for_frames(camera, 60)
+        last = camera.latest()
+        camera.latest()
+        
+        stats = camera.stats()
+        assert stats['dropped'] == last.sequence - first.sequence - 1
+        assert stats['duplicated'] == 1
+        assert stats['captured'] == 60
+    finally:
+        camera.stop()
+
+
+def test_analysis_stream(video_source):
+    """測試每幀同時縮小到預先配置的分析緩衝區，與原始影格序號一致"""
+    camera = CameraCapture(video_source, width=64, height=48, threaded=True, ring_size=4, analysis_size=(32, 16))
+    seen = []
+    camera.add_listener(lambda captured: seen.append(
+        (captured.analysis.shape, np.shares_memory(captured.analysis, camera._analysis_ring),
+         abs(float(captured.analysis.mean()) - float(captured.frame.mean())) <= 1)
+    ))
+    assert camera.start()
+    try:
+        analysis_ring = camera._analysis_ring
+        wait_for_frames(camera, 60)
+        
+        latest = camera.latest()
+        np.testing.assert_array_equal(latest.analysis, cv2.resize(latest.frame, (32, 16)))
+        assert camera.read_analysis_frame() is not None
+        assert [f.analysis is not None for f in camera.history(3)] == [True] * 3
+    finally:
+        camera.stop()
+    
+    # 每幀都寫入同一組緩衝區，沒有重新配置（第一幀在啟動時讀取，不呼叫監聽器）
+    assert camera._analysis_ring is analysis_ring
+    assert len(seen) == 59
+    assert all(entry == ((16, 32, 3), True, True) for entry in seen)
+    
+    camera = CameraCapture(video_source, width=64, height=48, threaded=True, analysis_size=None)
+    assert camera.start()
+    try:
+        wait_for_frames(camera, 1)
+        assert camera.latest().analysis is None
+        assert camera.read_analysis_frame() is None
+    finally:
+        camera.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,109 @@
+"""
+AI 瑜珈教練系統 - 影片匯出工作單元測試
+"""
+
+import asyncio
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from export_jobs import ExportJobManager, ExportQueueFull
+from session_registry import SessionRegistry
+
+
+async def wait_finished(manager, job_id, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        job = manager.get(job_id)
+        if job['status'] in ('completed', 'failed', 'cancelled'):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"工作未結束：{manager.get(job_id)}")
+
+
+def test_concurrency_and_queue_limit():
+    """測試同時執行數與排隊上限，完成後結果與進度寫入 store"""
+    store = SessionRegistry()
+    updates = []
+    release = threading.Event()
+    
+    async def on_update(job):
+        updates.append((job['job_id'], job['status'], job['progress']))
+    
+    def export(progress, cancel):
+        release.wait(5)
+        progress(0.5)
+        return {'video_url': '/videos/sessions/a.mp4'}
+    
+    async def scenario():
+        manager = ExportJobManager(store, max_concurrent=1, max_queued=1, on_update=on_update)
+        first = manager.submit('s1', export)
+        second = manager.submit('s2', export)
+        # 同一 session 重複送出時回傳既有的工作
+        assert manager.submit('s1', export)['job_id'] == first['job_id']
+        with pytest.raises(ExportQueueFull):
+            manager.submit('s3', export)
+        
+        await asyncio.sleep(0.05)
+        stats = manager.stats()
+        assert (stats['running'], stats['queued'], stats['rejected']) == (1, 1, 1)
+        
+        release.set()
+        jobs = [await wait_finished(manager, job['job_id']) for job in (first, second)]
+        await asyncio.sleep(0.01)
+        manager.shutdown()
+        return manager, jobs
+    
+    manager, jobs = asyncio.run(scenario())
+    for job in jobs:
+        assert job['status'] == 'completed'
+        assert job['result'] == {'video_url': '/videos/sessions/a.mp4'}
+        assert store.get_job(job['job_id'])['status'] == 'completed'
+    statuses = [status for job_id, status, _ in updates if job_id == jobs[0]['job_id']]
+    assert statuses == ['running', 'running', 'completed']
+    assert manager.stats()['completed'] == 2
+
+
+def test_cancel_and_failure():
+    """測試取消排隊中的工作與工作失敗"""
+    store = SessionRegistry()
+    started = threading.Event()
+    
+    def blocking(progress, cancel):
+        started.set()
+        cancel.wait(5)
+        raise RuntimeError("影片合併失敗")
+    
+    def failing(progress, cancel):
+        raise RuntimeError("影片合併失敗")
+    
+    async def scenario():
+        manager = ExportJobManager(store, max_concurrent=1, max_queued=2, retention=2)
+        running = manager.submit('s1', blocking)
+        queued = manager.submit('s2', blocking)
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        assert manager.cancel(queued['job_id'])
+        assert manager.cancel(running['job_id'])
+        cancelled = [await wait_finished(manager, job['job_id']) for job in (running, queued)]
+        await asyncio.sleep(0.01)
+        
+        failed = await wait_finished(manager, manager.submit('s3', failing)['job_id'])
+        manager.shutdown()
+        return manager, cancelled, failed
+    
+    manager, cancelled, failed = asyncio.run(scenario())
+    assert [job['status'] for job in cancelled] == ['cancelled', 'cancelled']
+    assert failed['status'] == 'failed'
+    assert failed['error'] == "影片合併失敗"
+    # 只保留最近 retention 個已結束的工作
+    assert manager.get(cancelled[0]['job_id']) is None
+    assert store.get_job(cancelled[0]['job_id']) is None
+    assert manager.get(cancelled[1]['job_id']) is not None
+    assert not manager.cancel(failed['job_id'])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,156 @@
+"""
+AI 瑜珈教練系統 - 歷史記錄查詢單元測試
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from database import (Database, HISTORY_PROJECTION, HISTORY_SORT, ReadCache, WriteBehindBuffer, decode_history_cursor,
+                      encode_history_cursor)
+
+
+class AggregateCollection:
+    """記錄 aggregate pipeline 並回傳預設結果的 collection"""
+    
+    def __init__(self, result):
+        self.result = result
+        self.pipelines = []
+        self.writes = []
+    
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return iter(self.result)
+    
+    def bulk_write(self, requests, ordered=True):
+        self.writes.extend(requests)
+
+
+class KeysetCollection:
+    """在記憶體中執行游標分頁 pipeline（$match / $sort / $limit / $project）的 collection"""
+    
+    def __init__(self, documents):
+        self.documents = documents
+        self.pipelines = []
+    
+    @staticmethod
+    def _after(document, condition):
+        start_time = condition[0]['start_time']['$lt']
+        last_session_id = condition[1]['session_id']['$lt']
+        return (document['start_time'] < start_time or
+                (document['start_time'] == start_time and document['session_id'] < last_session_id))
+    
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        documents = list(self.documents)
+        for stage in pipeline:
+            if '$match' in stage:
+                match = stage['$match']
+                documents = [d for d in documents if d['user_id'] == match['user_id']
+                             and ('$or' not in match or self._after(d, match['$or']))]
+            elif '$sort' in stage:
+                assert stage['$sort'] == HISTORY_SORT
+                documents.sort(key=lambda d: (d['start_time'], d['session_id']), reverse=True)
+            elif '$limit' in stage:
+                documents = documents[:stage['$limit']]
+            elif '$project' in stage:
+                documents = [{'session_id': d['session_id'], 'start_time': d['start_time']} for d in documents]
+            else:
+                raise AssertionError(f"非預期的階段：{stage}")
+        return iter(documents)
+
+
+def make_database(collection, write_buffer=None, cache_size=0):
+    """不連線 MongoDB，直接使用指定的 collection（預設不快取）"""
+    database = Database.__new__(Database)
+    database.sessions = collection
+    database.write_buffer = write_buffer
+    database.session_cache = ReadCache(cache_size, 60)
+    database.history_cache = ReadCache(cache_size, 60)
+    return database
+
+
+def test_history_page_single_aggregation():
+    """測試一次 aggregation 同時取得分頁與總數，且不投影 poses 陣列"""
+    summary = {'session_id': 's2', 'start_time': '2026-01-14T16:38:47', 'avg_score': 84.7,
+               'duration_seconds': 458, 'poses_count': 3, 'video_available': True}
+    collection = AggregateCollection([{'sessions': [summary], 'total': [{'count': 45}]}])
+    buffer = WriteBehindBuffer(collection, max_ops=100, max_delay=60)
+    buffer.add('s9', 'push', {'segment_id': 1})
+    database = make_database(collection, buffer)
+    
+    assert database.get_user_history_page('u1', limit=10, skip=20) == ([summary], 45, None)
+    # 查詢前先寫入緩衝中的操作
+    assert len(collection.writes) == 1
+    
+    [pipeline] = collection.pipelines
+    assert pipeline[:2] == [{'$match': {'user_id': 'u1'}}, {'$sort': HISTORY_SORT}]
+    facet = pipeline[2]['$facet']
+    # 多取一筆判斷是否有下一頁
+    assert facet['sessions'] == [{'$skip': 20}, {'$limit': 11}, {'$project': HISTORY_PROJECTION}]
+    assert facet['total'] == [{'$count': 'count'}]
+    assert 'poses' not in HISTORY_PROJECTION
+    assert HISTORY_PROJECTION['poses_count'] == {'$size': {'$ifNull': ['$poses', []]}}
+    buffer.close()
+
+
+def test_history_page_without_sessions():
+    """測試沒有記錄時總數為 0（$count 不輸出文件），limit=0 不加入 $limit"""
+    collection = AggregateCollection([{'sessions': [], 'total': []}])
+    database = make_database(collection)
+    
+    assert database.get_user_history_page('nobody', limit=0) == ([], 0, None)
+    assert collection.pipelines[0][2]['$facet']['sessions'] == [{'$skip': 0}, {'$project': HISTORY_PROJECTION}]
+
+
+def test_keyset_pagination():
+    """測試游標分頁逐頁讀完所有記錄（含相同 start_time），後續頁不再計數"""
+    documents = [{'session_id': f's{i:02d}', 'user_id': 'u1', 'start_time': f'2026-01-{i // 2 + 1:02d}'}
+                 for i in range(7)]
+    documents.append({'session_id': 'x', 'user_id': 'u2', 'start_time': '2026-02-01'})
+    first_page = sorted(documents[:7], key=lambda d: (d['start_time'], d['session_id']), reverse=True)[:3]
+    collection = KeysetCollection(documents)
+    database = make_database(collection)
+    
+    # 第一頁走 $facet（以 AggregateCollection 的輸出模擬）
+    facet_collection = AggregateCollection([{
+        'sessions': [{'session_id': d['session_id'], 'start_time': d['start_time']} for d in first_page + documents[3:4]],
+        'total': [{'count': 7}]
+    }])
+    sessions, total, cursor = make_database(facet_collection).get_user_history_page('u1', limit=3)
+    assert [s['session_id'] for s in sessions] == ['s06', 's05', 's04']
+    assert total == 7
+    assert decode_history_cursor(cursor) == ('2026-01-03', 's04', 7)
+    
+    seen = [s['session_id'] for s in sessions]
+    while cursor:
+        sessions, total, cursor = database.get_user_history_page('u1', limit=3, cursor=cursor)
+        assert total == 7
+        seen.extend(s['session_id'] for s in sessions)
+    assert seen == ['s06', 's05', 's04', 's03', 's02', 's01', 's00']
+    # 兩個游標頁都直接以 keyset 條件查詢，沒有 $facet 計數
+    assert len(collection.pipelines) == 2
+    assert all('$facet' not in str(pipeline) for pipeline in collection.pipelines)
+    assert collection.pipelines[0][0]['$match']['$or'][1] == {'start_time': '2026-01-03', 'session_id': {'$lt': 's04'}}
+
+
+def test_invalid_cursor():
+    """測試格式錯誤或欄位型別不符（查詢運算子注入）的游標回報 ValueError，且不執行查詢"""
+    database = make_database(KeysetCollection([]))
+    injected = [
+        encode_history_cursor({'start_time': {'$ne': None}, 'session_id': 's'}, 1),
+        encode_history_cursor({'start_time': 't', 'session_id': {'$gt': ''}}, 1),
+        encode_history_cursor({'start_time': 't', 'session_id': 's'}, -1),
+        encode_history_cursor({'start_time': 't', 'session_id': 's'}, True),
+    ]
+    for cursor in ['not-a-cursor', encode_history_cursor({'start_time': 't', 'session_id': 's'}, 1)[:-2]] + injected:
+        with pytest.raises(ValueError):
+            database.get_user_history_page('u1', cursor=cursor)
+    assert database.sessions.pipelines == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,83 @@
+"""
+AI 瑜珈教練系統 - Landmark 二進位編碼單元測試
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from landmark_codec import (
+    encode_landmark_frame, decode_landmark_frame, LandmarkFrameError, FRAME_HEADER
+)
+
+
+def make_points():
+    """建立隨機 landmarks"""
+    rng = np.random.default_rng(0)
+    return rng.random((33, 4), dtype=np.float32)
+
+
+def test_roundtrip_float32():
+    """測試 float32 編碼後可完整還原"""
+    points = make_points()
+    data = encode_landmark_frame(points, timestamp_ms=12345)
+    
+    assert len(data) == FRAME_HEADER.size + 33 * 4 * 4
+    
+    frame = decode_landmark_frame(data)
+    assert frame.timestamp_ms == 12345
+    assert frame.points.dtype == np.float32
+    np.testing.assert_array_equal(frame.points, points)
+
+
+def test_roundtrip_float16():
+    """測試 float16 編碼大小減半、精度足以分析姿勢"""
+    points = make_points()
+    data = encode_landmark_frame(points, dtype=np.float16)
+    
+    assert len(data) == FRAME_HEADER.size + 33 * 4 * 2
+    
+    frame = decode_landmark_frame(data)
+    assert frame.points.shape == (33, 4)
+    assert np.abs(frame.points - points).max() < 1e-3
+
+
+def test_invalid_frames():
+    """測試格式錯誤的影格"""
+    data = encode_landmark_frame(make_points())
+    
+    with pytest.raises(LandmarkFrameError):
+        decode_landmark_frame(data[:8])
+    with pytest.raises(LandmarkFrameError):
+        decode_landmark_frame(data[:-4])
+    with pytest.raises(LandmarkFrameError):
+        decode_landmark_frame(b'XX' + data[2:])
+    with pytest.raises(LandmarkFrameError):
+        encode_landmark_frame(np.zeros((32, 4)))
+
+
+def test_non_finite_frames():
+    """測試含 NaN / inf 的影格（包含 float16 溢位）解碼時拒絕"""
+    points = make_points()
+    with pytest.raises(LandmarkFrameError):
+        decode_landmark_frame(encode_landmark_frame(np.full((33, 4), np.nan, dtype=np.float32)))
+    
+    points[5, 2] = np.inf
+    with pytest.raises(LandmarkFrameError):
+        decode_landmark_frame(encode_landmark_frame(points))
+    
+    points[5, 2] = 1e6  # 超過 float16 範圍，轉換後為 inf
+    with np.errstate(over='ignore'):
+        data = encode_landmark_frame(points, dtype=np.float16)
+    with pytest.raises(LandmarkFrameError):
+        decode_landmark_frame(data)
+    assert decode_landmark_frame(encode_landmark_frame(points)).points[5, 2] == 1e6
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
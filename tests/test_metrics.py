@@ -0,0 +1,66 @@
+"""
+AI 瑜珈教練系統 - 效能指標單元測試
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from metrics import MetricsRegistry, WINDOW_SIZE
+
+
+def test_histogram_quantiles():
+    """測試百分位數、總和與次數"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', '測試', ('operation',))
+    
+    for value in range(1, 101):
+        histogram.observe(value / 1000, operation='read')
+    
+    stats = histogram.snapshot()[('read',)]
+    assert stats['count'] == 100
+    assert stats['sum'] == pytest.approx(5.05)
+    assert stats['quantiles'][0.5] == pytest.approx(0.0505)
+    assert stats['quantiles'][0.99] == pytest.approx(0.09901)
+    
+    with pytest.raises(ValueError):
+        histogram.observe(1.0)
+
+
+def test_histogram_window_tracks_recent_samples():
+    """測試百分位數只反映最近的樣本，次數與總和持續累計"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', '測試')
+    
+    for _ in range(WINDOW_SIZE):
+        histogram.observe(1.0)
+    for _ in range(WINDOW_SIZE):
+        histogram.observe(0.001)
+    
+    stats = histogram.snapshot()[()]
+    assert stats['count'] == 2 * WINDOW_SIZE
+    assert stats['quantiles'][0.99] == pytest.approx(0.001)
+
+
+def test_prometheus_text_format():
+    """測試 Prometheus 文字格式輸出"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', '測試延遲', ('operation',))
+    with histogram.time(operation='save'):
+        pass
+    registry.gauge('test_queue_depth', '佇列深度', lambda: 3)
+    
+    text = registry.render()
+    assert '# TYPE test_seconds summary' in text
+    assert 'test_seconds{operation="save",quantile="0.95"}' in text
+    assert 'test_seconds_count{operation="save"} 1' in text
+    assert '# TYPE test_queue_depth gauge' in text
+    assert 'test_queue_depth 3' in text
+    assert text.endswith('\n')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -9,7 +9,22 @@ from pathlib import Path
 # 將 backend 目錄加入路徑
 sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
 
-from pose_analyzer import calculate_angle, check_warrior_ii, check_tree_pose, check_downward_dog, analyze_pose
+import numpy as np
+
+from pose_analyzer import (
+    calculate_angle, calculate_angles, check_warrior_ii, check_tree_pose, check_downward_dog,
+    analyze_pose, analyze_pose_batch, compute_pose_features, compile_pose_rules, CompiledPoseRules,
+    PoseLandmarks, FEATURE_INDEX, POSE_RULES, landmarks_to_array
+)
+from config import SUPPORTED_POSES
+
+
+def make_standing_landmarks():
+    """建立測試用的 33 個 landmarks（正常站立姿勢）"""
+    return [
+        {'x': 0.5, 'y': float(i) / 33.0, 'z': 0.0, 'visibility': 0.9}
+        for i in range(33)
+    ]
 
 
 def test_calculate_angle():
@@ -33,17 +48,48 @@ def test_calculate_angle():
     print("✓ 角度計算測試通過")
 
 
+def test_calculate_angles_batch():
+    """測試批次角度計算"""
+    points = np.zeros((33, 4), dtype=np.float32)
+    points[1, :2] = (0.0, 1.0)
+    points[2, :2] = (1.0, 1.0)
+    points[3, :2] = (0.5, 0.0)
+    points[4, :2] = (1.0, 0.0)
+    
+    triplets = np.array([(0, 1, 2), (0, 3, 4)])
+    angles = calculate_angles(points, triplets)
+    
+    assert angles.shape == (2,)
+    assert 89 <= angles[0] <= 91, f"90度角計算錯誤：{angles[0]}"
+    assert 179 <= angles[1] <= 180, f"180度角計算錯誤：{angles[1]}"
+    
+    # 支援額外的前置維度 (N, 33, 4)
+    stacked = calculate_angles(np.stack([points, points]), triplets)
+    assert stacked.shape == (2, 2)
+    
+    print("✓ 批次角度計算測試通過")
+
+
+def test_pose_landmarks_array():
+    """測試 PoseLandmarks 與 dict 介面結果一致"""
+    landmarks = make_standing_landmarks()
+    pose = PoseLandmarks.from_dicts(landmarks)
+    
+    assert pose.array.shape == (33, 4)
+    assert pose.array.dtype == np.float32
+    assert len(pose) == 33
+    
+    for check in (check_warrior_ii, check_tree_pose, check_downward_dog):
+        assert check(pose) == check(landmarks)
+    assert analyze_pose(pose.array) == analyze_pose(landmarks)
+    
+    print("✓ PoseLandmarks 測試通過")
+
+
 def test_analyze_pose():
     """測試姿勢分析功能"""
     # 建立測試用的 33 個 landmarks（正常站立姿勢）
-    landmarks = []
-    for i in range(33):
-        landmarks.append({
-            'x': 0.5,
-            'y': float(i) / 33.0,
-            'z': 0.0,
-            'visibility': 0.9
-        })
+    landmarks = make_standing_landmarks()
     
     # 測試分析
     result = analyze_pose(landmarks)
@@ -61,6 +107,79 @@ def test_analyze_pose():
     print(f"✓ 姿勢分析測試通過：{result['pose_name']}, 分數：{result['score']}")
 
 
+def test_compute_pose_features():
+    """測試共用特徵向量"""
+    points = PoseLandmarks.from_dicts(make_standing_landmarks()).array
+    points[25, 0] = 0.6  # 左膝往外，左腿較彎
+    features = compute_pose_features(points[np.newaxis])
+    
+    assert features.shape == (1, len(FEATURE_INDEX))
+    left_leg = features[0, FEATURE_INDEX['left_leg_angle']]
+    right_leg = features[0, FEATURE_INDEX['right_leg_angle']]
+    assert left_leg < right_leg
+    assert features[0, FEATURE_INDEX['bent_leg_angle']] == left_leg
+    assert features[0, FEATURE_INDEX['straight_leg_angle']] == right_leg
+    assert features[0, FEATURE_INDEX['left_leg_bent']] == 1.0
+    assert features[0, FEATURE_INDEX['right_leg_bent']] == 0.0
+    
+    print("✓ 共用特徵向量測試通過")
+
+
+def test_analyze_pose_batch():
+    """測試批次分析與逐影格分析結果一致"""
+    rng = np.random.default_rng(0)
+    points = rng.random((64, 33, 4), dtype=np.float32)
+    points[0] = PoseLandmarks.from_dicts(make_standing_landmarks()).array
+    
+    results = analyze_pose_batch(points)
+    assert len(results) == 64
+    assert results == [analyze_pose(frame) for frame in points]
+    
+    # 逐影格姿勢提示
+    hints = ["Warrior II", None, "Tree Pose", "Downward Dog"] * 16
+    results = analyze_pose_batch(points, hints)
+    assert results == [analyze_pose(frame, hint) for frame, hint in zip(points, hints)]
+    
+    # 形狀錯誤
+    with pytest.raises(ValueError):
+        analyze_pose_batch(points[:, :30])
+    
+    print("✓ 批次姿勢分析測試通過")
+
+
+def test_compiled_pose_rules():
+    """測試姿勢規則編譯"""
+    assert POSE_RULES.pose_names == list(SUPPORTED_POSES)
+    
+    # 自訂姿勢：所有規則以同一次矩陣運算評分
+    rules = CompiledPoseRules([
+        {
+            'name': 'Straight Arms',
+            'rules': [
+                {'feature': 'left_arm_angle', 'range': (170, 180), 'penalty': 40, 'feedback': '左手臂伸直'},
+                {'feature': 'right_arm_angle', 'range': (170, 180), 'penalty': 40, 'feedback': '右手臂伸直'},
+            ],
+            'messages': {'perfect': '完美', 'good_prefix': '不錯！', 'hold': '保持'},
+            'details': {'left_arm_angle': 'left_arm_angle'},
+        },
+    ])
+    features = compute_pose_features(PoseLandmarks.from_dicts(make_standing_landmarks()).array[np.newaxis])
+    scores, violations = rules.score(features)
+    assert scores.shape == (1, 1)
+    assert violations.shape == (1, 2)
+    assert scores[0, 0] == 100
+    assert rules.build_result(0, features[0], scores[0, 0], violations[0])['feedback'] == '完美'
+    
+    # 未知的特徵或姿勢
+    with pytest.raises(ValueError):
+        CompiledPoseRules([{'name': 'Bad', 'rules': [{'feature': 'no_such_feature', 'range': (0, 1),
+                                                    'penalty': 10, 'feedback': ''}], 'messages': {}}])
+    with pytest.raises(ValueError):
+        compile_pose_rules(['No Such Pose'])
+    
+    print("✓ 姿勢規則編譯測試通過")
+
+
 def test_landmarks_validation():
     """測試 landmarks 驗證"""
     # 測試錯誤數量的 landmarks
@@ -72,6 +191,13 @@ def test_landmarks_validation():
     assert result['score'] == 0
     assert not result['correct']
     
+    # 含 NaN / inf 的 landmark（JSON 可傳入）在轉換時拒絕
+    nan_landmarks = make_standing_landmarks()
+    nan_landmarks[3]['x'] = float('nan')
+    with pytest.raises(ValueError):
+        landmarks_to_array(nan_landmarks)
+    assert analyze_pose(nan_landmarks)['pose_name'] == 'Unknown'
+    
     print("✓ Landmarks 驗證測試通過")
 
 
@@ -80,7 +206,12 @@ if __name__ == "__main__":
     
     try:
         test_calculate_angle()
+        test_calculate_angles_batch()
+        test_pose_landmarks_array()
         test_analyze_pose()
+        test_compute_pose_features()
+        test_analyze_pose_batch()
+        test_compiled_pose_rules()
         test_landmarks_validation()
         
         print("\n所有測試通過！✓")
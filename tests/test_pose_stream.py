@@ -0,0 +1,212 @@
+"""
+AI 瑜珈教練系統 - 串流姿勢分析單元測試
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from pose_analyzer import PoseLandmark, analyze_pose, score_frames
+from pose_stream import OneEuroFilter, StreamingPoseAnalyzer
+
+
+def make_pose(left_ankle):
+    """建立雙臂水平、右腿伸直、左腿彎曲的 landmarks（左腳踝位置決定左膝角度）"""
+    points = np.zeros((33, 4), dtype=np.float32)
+    points[:, :2] = 0.5
+    points[:, 3] = 1.0
+    coords = {
+        PoseLandmark.LEFT_SHOULDER: (0.4, 0.4),
+        PoseLandmark.LEFT_ELBOW: (0.3, 0.4),
+        PoseLandmark.LEFT_WRIST: (0.2, 0.4),
+        PoseLandmark.RIGHT_SHOULDER: (0.6, 0.4),
+        PoseLandmark.RIGHT_ELBOW: (0.7, 0.4),
+        PoseLandmark.RIGHT_WRIST: (0.8, 0.4),
+        PoseLandmark.LEFT_HIP: (0.45, 0.6),
+        PoseLandmark.LEFT_KNEE: (0.35, 0.6),
+        PoseLandmark.LEFT_ANKLE: left_ankle,
+        PoseLandmark.RIGHT_HIP: (0.55, 0.6),
+        PoseLandmark.RIGHT_KNEE: (0.65, 0.7),
+        PoseLandmark.RIGHT_ANKLE: (0.75, 0.8),
+    }
+    for index, xy in coords.items():
+        points[index, :2] = xy
+    return points
+
+
+WARRIOR = make_pose((0.34, 0.8))   # 左膝約 93 度
+TREE = make_pose((0.45, 0.773))    # 左膝約 60 度
+
+
+def make_analyzer(switch_frames):
+    """建立不平滑（直接通過）的串流分析器，方便驗證遲滯"""
+    return StreamingPoseAnalyzer(switch_frames, OneEuroFilter(min_cutoff=1e9))
+
+
+def test_fixture_poses():
+    """確認測試用姿勢的單影格辨識結果"""
+    assert analyze_pose(WARRIOR)['pose_name'] == 'Warrior II'
+    assert analyze_pose(TREE)['pose_name'] == 'Tree Pose'
+
+
+def test_pose_hysteresis():
+    """測試新姿勢需連續勝出才切換，且只在結果改變時推送"""
+    analyzer = make_analyzer(switch_frames=3)
+    
+    result, changed = analyzer.update(WARRIOR, timestamp=0.0)
+    assert result['pose_name'] == 'Warrior II' and changed
+    
+    result, changed = analyzer.update(WARRIOR, timestamp=1 / 30)
+    assert not changed
+    
+    # 前兩個 Tree Pose 影格仍維持 Warrior II
+    for k in range(2):
+        result, changed = analyzer.update(TREE, timestamp=(2 + k) / 30)
+        assert result['pose_name'] == 'Warrior II'
+    
+    result, changed = analyzer.update(TREE, timestamp=4 / 30)
+    assert result['pose_name'] == 'Tree Pose' and changed
+    
+    # 單一影格的干擾不會切換姿勢
+    analyzer.update(WARRIOR, timestamp=5 / 30)
+    result, _ = analyzer.update(TREE, timestamp=6 / 30)
+    assert result['pose_name'] == 'Tree Pose'
+    
+    # 指定姿勢時立即生效
+    result, changed = analyzer.update(TREE, pose_hint='Warrior II', timestamp=7 / 30)
+    assert result['pose_name'] == 'Warrior II' and changed
+
+
+def test_change_detection_cache():
+    """測試近乎相同的連續影格沿用上次結果"""
+    analyzer = make_analyzer(switch_frames=1)
+    
+    first, _ = analyzer.update(WARRIOR, timestamp=0.0)
+    assert analyzer.cache_stats() == {'hit': False, 'hits': 0, 'misses': 1}
+    
+    # 微小抖動：命中快取，回傳同一個結果物件
+    for k in range(10):
+        jitter = WARRIOR + np.float32(0.0005 * (-1) ** k)
+        result, changed = analyzer.update(jitter, timestamp=(k + 1) / 30)
+        assert result is first and not changed
+    assert analyzer.cache_stats() == {'hit': True, 'hits': 10, 'misses': 1}
+    
+    # 姿勢改變：重新評分
+    result, changed = analyzer.update(TREE, timestamp=1.0)
+    assert result['pose_name'] == 'Tree Pose' and changed
+    assert analyzer.cache_stats()['misses'] == 2
+    
+    # 姿勢提示改變時不沿用
+    result, _ = analyzer.update(TREE, pose_hint='Warrior II', timestamp=1.1)
+    assert result['pose_name'] == 'Warrior II'
+
+
+def test_split_update_out_of_order():
+    """測試評分在其他執行緒完成時，較舊影格的結果不會覆蓋較新的結果"""
+    analyzer = make_analyzer(switch_frames=1)
+    
+    first, smoothed_first = analyzer.begin(WARRIOR, pose_hint='Warrior II', timestamp=0.0)
+    second, smoothed_second = analyzer.begin(TREE, pose_hint='Tree Pose', timestamp=0.1)
+    
+    result, changed = analyzer.finish(second, 'Tree Pose', score_frames(smoothed_second))
+    assert changed and result['pose_name'] == 'Tree Pose'
+    
+    result, changed = analyzer.finish(first, 'Warrior II', score_frames(smoothed_first))
+    assert not changed and result['pose_name'] == 'Tree Pose'
+
+
+def test_in_flight_and_failed_frames_are_not_cached():
+    """測試評分中或評分失敗的影格不會成為變化偵測的比較基準"""
+    analyzer = make_analyzer(switch_frames=1)
+    
+    # 第一幀仍在評分時，幾乎相同的第二幀也必須評分
+    first, smoothed_first = analyzer.begin(WARRIOR, timestamp=0.0)
+    second, smoothed_second = analyzer.begin(WARRIOR + np.float32(0.0005), timestamp=1 / 30)
+    assert smoothed_second is not None
+    assert analyzer.cache_stats()['hits'] == 0
+    result, changed = analyzer.finish(second, None, score_frames(smoothed_second))
+    assert result['pose_name'] == 'Warrior II' and changed
+    result, changed = analyzer.finish(first, None, score_frames(smoothed_first))
+    assert result['pose_name'] == 'Warrior II' and not changed
+    
+    # 評分失敗（finish 未被呼叫）的影格之後，下一幀重新評分
+    analyzer = make_analyzer(switch_frames=1)
+    failed, _ = analyzer.begin(TREE, timestamp=0.0)
+    sequence, smoothed = analyzer.begin(TREE, timestamp=1 / 30)
+    assert smoothed is not None
+    result, _ = analyzer.finish(sequence, None, score_frames(smoothed))
+    assert result['pose_name'] == 'Tree Pose'
+    
+    # 評分成功後才沿用結果
+    result, changed = analyzer.update(TREE, timestamp=2 / 30)
+    assert analyzer.cache_stats()['hit'] and result['pose_name'] == 'Tree Pose' and not changed
+    assert analyzer._in_flight == {}
+
+
+def test_stream_uses_one_clock(monkeypatch):
+    """測試第一個影格決定時鐘：用戶端時鐘的串流以伺服器經過時間補上缺少的時間，伺服器時鐘的串流忽略用戶端時間"""
+    import pose_stream
+    server_time = [1000.0]
+    monkeypatch.setattr(pose_stream.time, 'monotonic', lambda: server_time[0])
+    
+    analyzer = make_analyzer(switch_frames=1)
+    assert analyzer._frame_time(5.0) == 5.0
+    server_time[0] += 0.1
+    assert analyzer._frame_time(None) == pytest.approx(5.1)
+    server_time[0] += 0.1
+    assert analyzer._frame_time(5.2) == 5.2
+    
+    analyzer = make_analyzer(switch_frames=1)
+    assert analyzer._frame_time(None) == 1000.2
+    assert analyzer._frame_time(5.3) == 1000.2
+    
+    # 重設後重新決定
+    analyzer.reset()
+    assert analyzer._frame_time(7.0) == 7.0
+
+
+def test_one_euro_filter_smooths_jitter():
+    """測試 One-Euro 濾波降低靜止時的抖動"""
+    rng = np.random.default_rng(0)
+    landmark_filter = OneEuroFilter(min_cutoff=1.0, beta=0.0)
+    
+    outputs = []
+    for k in range(120):
+        noisy = WARRIOR + rng.normal(0, 0.01, WARRIOR.shape).astype(np.float32)
+        outputs.append(landmark_filter(noisy, k / 30).copy())
+    
+    assert np.std(np.array(outputs[30:]) - WARRIOR) < 0.5 * 0.01
+
+
+def test_one_euro_filter_skips_non_finite():
+    """測試單一 NaN 不會留在濾波狀態中，之後的正常影格輸出仍為有限值"""
+    landmark_filter = OneEuroFilter()
+    corrupted = WARRIOR.copy()
+    corrupted[3, 0] = np.nan
+    
+    # 尚無狀態時不初始化
+    assert np.isnan(landmark_filter(corrupted, 0.0)[3, 0])
+    assert landmark_filter.x_prev is None
+    
+    landmark_filter(WARRIOR, 1 / 30)
+    # 非有限的元素沿用上一個輸出，其他元素照常濾波
+    output = landmark_filter(corrupted, 2 / 30)
+    assert np.isfinite(output).all()
+    assert output[3, 0] == pytest.approx(WARRIOR[3, 0])
+    for k in range(3, 10):
+        assert np.isfinite(landmark_filter(WARRIOR, k / 30)).all()
+    
+    # 串流分析在 NaN 影格之後仍能辨識姿勢
+    stream = StreamingPoseAnalyzer(switch_frames=1)
+    stream.update(WARRIOR, timestamp=0.0)
+    stream.update(corrupted, timestamp=1 / 30)
+    assert stream.update(WARRIOR + 0.01, timestamp=2 / 30)[0]['pose_name'] == 'Warrior II'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
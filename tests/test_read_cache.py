@@ -0,0 +1,155 @@
+"""
+AI 瑜珈教練系統 - 資料庫讀取快取單元測試
+"""
+
+import pytest
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from database import Database, ReadCache
+
+
+class FakeClock:
+    """手動前進的時間來源"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingCollection:
+    """記錄查詢次數的 collection（session 以 session_id 保存）"""
+
+    def __init__(self, documents):
+        self.documents = {d['session_id']: d for d in documents}
+        self.reads = 0
+        self.aggregations = 0
+
+    def find_one(self, query, projection=None):
+        self.reads += 1
+        document = self.documents.get(query['session_id'])
+        return dict(document) if document else None
+
+    def aggregate(self, pipeline):
+        self.aggregations += 1
+        user_id = pipeline[0]['$match']['user_id']
+        sessions = [{'session_id': d['session_id'], 'start_time': d['start_time']}
+                    for d in self.documents.values() if d['user_id'] == user_id]
+        return iter([{'sessions': sessions, 'total': [{'count': len(sessions)}] if sessions else []}])
+
+    def update_one(self, query, update, upsert=False):
+        document = self.documents.get(query['session_id'])
+        if document is None:
+            return SimpleNamespace(modified_count=0)
+        if '$push' in update:
+            document.setdefault('poses', []).append(update['$push']['poses'])
+        else:
+            document.update(update['$set'])
+        return SimpleNamespace(modified_count=1)
+
+
+def make_database(collection):
+    """不連線 MongoDB，直接寫入 collection（不使用寫入緩衝）"""
+    database = Database.__new__(Database)
+    database.sessions = collection
+    database.write_buffer = None
+    database.session_cache = ReadCache(16, 60)
+    database.history_cache = ReadCache(16, 60)
+    return database
+
+
+def test_lru_eviction_and_ttl():
+    """測試超過容量淘汰最久未使用的項目、超過 TTL 重新讀取"""
+    clock = FakeClock()
+    cache = ReadCache(max_entries=2, ttl=10, clock=clock)
+    loads = []
+
+    def load(key):
+        loads.append(key)
+        return key.upper()
+
+    assert cache.get_or_load('a', lambda: load('a')) == 'A'
+    assert cache.get_or_load('b', lambda: load('b')) == 'B'
+    assert cache.get_or_load('a', lambda: load('a')) == 'A'  # a 變成最近使用
+    assert cache.get_or_load('c', lambda: load('c')) == 'C'  # 淘汰 b
+    assert cache.get_or_load('a', lambda: load('a')) == 'A'
+    assert cache.get_or_load('b', lambda: load('b')) == 'B'
+    assert loads == ['a', 'b', 'c', 'b']
+
+    clock.now = 10
+    assert cache.get_or_load('b', lambda: load('b')) == 'B'
+    assert loads[-1] == 'b' and len(loads) == 5
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (2, 5, 2, 2)
+    assert stats['hit_rate'] == pytest.approx(2 / 7)
+
+
+def test_failed_and_stale_loads_are_not_cached():
+    """測試 None、例外、讀取期間失效的結果不保存；max_entries=0 停用快取"""
+    cache = ReadCache(max_entries=4, ttl=60)
+    assert cache.get_or_load('missing', lambda: None) is None
+
+    def fail():
+        raise ConnectionError('down')
+
+    with pytest.raises(ConnectionError):
+        cache.get_or_load('error', fail)
+
+    def load_during_write():
+        value = {'score': 1}
+        cache.invalidate('other')  # 讀取期間有寫入
+        return value
+
+    assert cache.get_or_load('stale', load_during_write) == {'score': 1}
+    assert cache.stats()['entries'] == 0
+
+    disabled = ReadCache(max_entries=0, ttl=60)
+    assert disabled.get_or_load('a', lambda: 1) == 1
+    assert disabled.stats()['entries'] == 0
+
+
+def test_database_invalidation():
+    """測試 session 與歷史列表讀取經由快取，寫入時只使相關使用者的項目失效"""
+    collection = CountingCollection([
+        {'session_id': 's1', 'user_id': 'u1', 'start_time': '2026-01-01', 'poses': []},
+        {'session_id': 's2', 'user_id': 'u2', 'start_time': '2026-01-02', 'poses': []},
+    ])
+    database = make_database(collection)
+
+    assert database.get_session('s1')['poses'] == []
+    assert database.get_session('s1') is database.get_session('s1')
+    assert collection.reads == 1
+
+    assert database.get_user_history_page('u1')[1] == 1
+    assert database.get_user_history_page('u2')[1] == 1
+    assert database.get_user_history_page('u1')[1] == 1
+    assert collection.aggregations == 2
+
+    # 新增姿勢：s1 與 u1 的歷史失效，u2 的歷史保留
+    assert database.update_session_poses('s1', {'segment_id': 1})
+    assert database.get_session('s1')['poses'] == [{'segment_id': 1}]
+    assert collection.reads == 2
+    database.get_user_history_page('u1')
+    database.get_user_history_page('u2')
+    assert collection.aggregations == 3
+
+    # 不在快取中的 session：無法得知使用者，清除所有歷史列表
+    assert database.update_session_final_info('s2', 60, 85.0, 'final.mp4')
+    assert database.get_session('s2')['avg_score'] == 85.0
+    database.get_user_history_page('u1')
+    assert collection.aggregations == 4
+
+    stats = database.cache_stats()
+    assert stats['session']['hits'] == 2
+    assert stats['history']['hits'] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,157 @@
+"""
+AI 瑜珈教練系統 - 片段錄製管線單元測試
+"""
+
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import video_processor
+from video_processor import PreRollBuffer, SegmentEncoder, VideoProcessor
+
+
+def make_frame(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    count = 0
+    while cap.read()[0]:
+        count += 1
+    cap.release()
+    return count
+
+
+def test_segments_written_by_encoder_thread(tmp_path):
+    """測試片段由編碼執行緒寫入，start / stop 立即返回"""
+    encoder = SegmentEncoder(queue_size=100, policy='block')
+    encoder.start()
+    
+    encoder.open_segment(tmp_path / "segment_1.mp4")
+    for i in range(10):
+        assert encoder.submit(make_frame(i * 10))
+    encoder.close_segment()
+    
+    encoder.open_segment(tmp_path / "segment_2.mp4")
+    for i in range(5):
+        encoder.submit(make_frame(i * 10))
+    encoder.close_segment(discard=True)
+    
+    assert encoder.flush(timeout=10)
+    encoder.stop()
+    
+    assert count_frames(tmp_path / "segment_1.mp4") == 10
+    assert not (tmp_path / "segment_2.mp4").exists()
+    assert encoder.stats()['written'] == 15
+    assert encoder.stats()['dropped'] == 0
+
+
+def test_drop_oldest_policy(tmp_path):
+    """測試佇列已滿時丟棄最舊的影格，擷取端不會被阻塞"""
+    encoder = SegmentEncoder(queue_size=2, policy='drop_oldest')
+    release = threading.Event()
+    handle = encoder._handle
+    
+    def slow_handle(command, payload):
+        release.wait()
+        handle(command, payload)
+    
+    encoder._handle = slow_handle
+    encoder.start()
+    encoder.open_segment(tmp_path / "segment.mp4")
+    
+    start = time.perf_counter()
+    for i in range(10):
+        encoder.submit(make_frame(i * 20))
+    assert time.perf_counter() - start < 1.0
+    
+    release.set()
+    encoder.stop()
+    
+    stats = encoder.stats()
+    assert stats['dropped'] == 8
+    assert stats['written'] == 2
+    assert stats['peak_queued'] == 2
+    # 保留的是最新的兩幀
+    cap = cv2.VideoCapture(str(tmp_path / "segment.mp4"))
+    _, last = cap.read()
+    cap.release()
+    assert abs(float(last.mean()) - 160) < 10
+
+
+def test_preroll_limits():
+    """測試預錄緩衝區依時間與大小上限移除舊影格"""
+    preroll = PreRollBuffer(seconds=1.0, max_bytes=10 ** 6, quality=80)
+    for i in range(30):
+        preroll.push(make_frame(i), i * 0.25)
+    # 只保留最近 1 秒（t = 6.25 ~ 7.25）
+    assert len(preroll) == 5
+    
+    small = PreRollBuffer(seconds=10.0, max_bytes=1, quality=80)
+    small.push(make_frame(0), 0.0)
+    assert len(small) == 0
+    assert small.total_bytes == 0
+    
+    # 壓縮（擷取執行緒在鎖外執行）不修改緩衝區，加入後才計入
+    data, shape = preroll.encode(make_frame(99))
+    assert len(preroll) == 5 and shape == make_frame(99).shape
+    preroll.append(7.5, data, shape)
+    assert len(preroll) == 5 and preroll.drain()[-1] == (data, shape)
+
+
+def test_preroll_flushed_into_segment(tmp_path):
+    """測試開始片段時預錄影格寫在片段開頭，縮小儲存的影格還原為原尺寸"""
+    preroll = PreRollBuffer(seconds=10.0, max_bytes=10 ** 6, quality=90, scale=0.5)
+    for i in range(5):
+        preroll.push(make_frame(200), i * 0.1)
+    
+    encoder = SegmentEncoder(queue_size=100, policy='block')
+    encoder.start()
+    encoder.open_segment(tmp_path / "segment.mp4", preroll.drain())
+    for i in range(3):
+        encoder.submit(make_frame(50))
+    encoder.close_segment()
+    encoder.stop()
+    
+    assert len(preroll) == 0
+    cap = cv2.VideoCapture(str(tmp_path / "segment.mp4"))
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    assert len(frames) == 8
+    assert frames[0].shape == (48, 64, 3)
+    assert abs(float(frames[0].mean()) - 200) < 10
+    assert abs(float(frames[-1].mean()) - 50) < 10
+
+
+def test_no_segment_after_camera_stopped(tmp_path, monkeypatch):
+    """測試停止相機時捨棄未結束的片段，之後不再開始新片段（匯出期間偵測到姿勢）"""
+    monkeypatch.setattr(video_processor, 'VIDEO_SEGMENTS_DIR', tmp_path)
+    processor = VideoProcessor('s1', 'capture')
+    processor.encoder.start()
+    
+    assert processor.start_segment_recording()
+    processor.record_frame(make_frame(10))
+    processor.stop_camera()
+    assert processor.segment_paths == [] and not processor.recording
+    
+    assert not processor.start_segment_recording()
+    assert processor.segment_paths == [] and not processor.recording
+    assert processor.segment_count == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
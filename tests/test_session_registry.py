@@ -0,0 +1,161 @@
+"""
+AI 瑜珈教練系統 - Session 登錄與回饋轉送單元測試
+"""
+
+import asyncio
+import os
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from session_registry import SessionRegistry, FileSessionRegistry
+from feedback_bus import FeedbackBus, UdpFeedbackBus, load_shared_secret
+
+
+def test_file_registry_shared_between_workers(tmp_path):
+    """測試檔案登錄在不同 worker（不同實例）之間共用"""
+    worker_a = FileSessionRegistry(tmp_path)
+    worker_b = FileSessionRegistry(tmp_path)
+    
+    worker_a.register('s1', {'session_id': 's1', 'worker_id': 'a'})
+    assert 's1' in worker_b
+    assert worker_b.get('s1')['worker_id'] == 'a'
+    assert 's2' not in worker_b
+    
+    # 回饋路由只在仍指向自己時清除
+    worker_b.set_route('s1', ['127.0.0.1', 9000])
+    worker_a.clear_route('s1', ['127.0.0.1', 9001])
+    assert worker_a.get_route('s1') == ['127.0.0.1', 9000]
+    
+    worker_a.unregister('s1')
+    assert 's1' not in worker_b
+    assert worker_b.get_route('s1') is None
+    
+    # 匯出工作狀態可由任一 worker 查詢
+    worker_a.set_job('j1', {'job_id': 'j1', 'status': 'running', 'progress': 0.5})
+    assert worker_b.get_job('j1')['progress'] == 0.5
+    worker_b.remove_job('j1')
+    assert worker_a.get_job('j1') is None
+
+
+def test_file_registry_sweeps_crashed_workers(tmp_path):
+    """測試逾時未更新的 session（持有的 worker 已當機）連同回饋路由被清除，持續更新的保留"""
+    registry = FileSessionRegistry(tmp_path)
+    registry.register('alive', {'worker_id': 'a'})
+    registry.register('crashed', {'worker_id': 'b'})
+    registry.set_route('crashed', ['127.0.0.1', 9000])
+    
+    old = time.time() - 600
+    for session_id in ('alive', 'crashed'):
+        os.utime(tmp_path / "sessions" / f"{session_id}.json", (old, old))
+    registry.touch('alive')
+    registry.touch('missing')
+    
+    assert registry.sweep(120) == 1
+    assert 'alive' in registry
+    assert 'crashed' not in registry
+    assert registry.get_route('crashed') is None
+    assert registry.sweep(120) == 0
+
+
+def test_memory_registry():
+    """測試行程內登錄"""
+    registry = SessionRegistry()
+    registry.register('s1', {'worker_id': 'a'})
+    registry.set_route('s1', 'a')
+    
+    assert 's1' in registry
+    registry.clear_route('s1', 'b')
+    assert registry.get_route('s1') == 'a'
+    registry.clear_route('s1', 'a')
+    assert registry.get_route('s1') is None
+
+
+def test_udp_feedback_bus_routes_to_other_worker():
+    """測試回饋經由 UDP 轉送到持有 WebSocket 的 worker"""
+    async def scenario():
+        received = asyncio.Queue()
+        
+        async def handler(session_id, message):
+            await received.put((session_id, message))
+        
+        sender = UdpFeedbackBus(b'secret', worker_id='a')
+        receiver = UdpFeedbackBus(b'secret', worker_id='b')
+        await sender.start(handler=lambda *_: None)
+        await receiver.start(handler)
+        try:
+            assert await sender.publish(receiver.address, 's1', {'type': 'pose_feedback', 'data': {'score': 90}})
+            return await asyncio.wait_for(received.get(), timeout=2)
+        finally:
+            await sender.stop()
+            await receiver.stop()
+    
+    session_id, message = asyncio.run(scenario())
+    assert session_id == 's1'
+    assert message['data']['score'] == 90
+
+
+def test_udp_feedback_bus_drops_unsigned_packets(tmp_path):
+    """測試未簽章或金鑰不同的封包（例如偽造的 start_segment）不會送達，共用金鑰只建立一次"""
+    async def scenario():
+        received = []
+        
+        async def handler(session_id, message):
+            received.append(message)
+        
+        receiver = UdpFeedbackBus(b'secret', worker_id='b')
+        intruder = UdpFeedbackBus(b'guess', worker_id='x')
+        trusted = UdpFeedbackBus(b'secret', worker_id='a')
+        for bus in (receiver, intruder, trusted):
+            await bus.start(handler)
+        try:
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, local_addr=('127.0.0.1', 0))
+            transport.sendto(b'{"session_id": "s1", "message": {"type": "start_segment"}}', tuple(receiver.address))
+            await intruder.publish(receiver.address, 's1', {'type': 'start_segment'})
+            await trusted.publish(receiver.address, 's1', {'type': 'pose_feedback'})
+            for _ in range(100):
+                if received:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            transport.close()
+            return received
+        finally:
+            for bus in (receiver, intruder, trusted):
+                await bus.stop()
+    
+    assert asyncio.run(scenario()) == [{'type': 'pose_feedback'}]
+    
+    key_file = tmp_path / "feedback_bus.key"
+    secret = load_shared_secret(key_file)
+    assert len(secret) == 32
+    assert load_shared_secret(key_file) == secret
+    assert [path.name for path in tmp_path.iterdir()] == ["feedback_bus.key"]
+
+
+def test_memory_feedback_bus_local_only():
+    """測試行程內轉送只送達自己"""
+    async def scenario():
+        received = []
+        
+        async def handler(session_id, message):
+            received.append(session_id)
+        
+        bus = FeedbackBus(worker_id='a')
+        await bus.start(handler)
+        delivered = await bus.publish('a', 's1', {})
+        dropped = await bus.publish('b', 's2', {})
+        return received, delivered, dropped
+    
+    received, delivered, dropped = asyncio.run(scenario())
+    assert received == ['s1']
+    assert delivered and not dropped
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
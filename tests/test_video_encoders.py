@@ -0,0 +1,114 @@
+"""
+AI 瑜珈教練系統 - 影片編碼預設單元測試
+"""
+
+import json
+import pickle
+import pytest
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import video_encoders
+from video_encoders import (
+    EncoderPreset, PresetWriter, container_for, detect_codecs, get_preset, resolve_codec, stream_codec
+)
+from video_processor import merge_segments_to_final, timeline_path_for
+
+
+def make_segment(path, frame_count, value):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 30, (320, 240))
+    for _ in range(frame_count):
+        writer.write(np.full((240, 320, 3), value, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_detect_and_resolve_codecs():
+    """測試偵測可用編碼器，並依預設的優先順序選擇（都不可用時使用 mp4v）"""
+    available = detect_codecs()
+    assert 'mp4v' in available
+    assert detect_codecs() is available
+    
+    assert resolve_codec(EncoderPreset('test', ('NONE', 'mp4v'))) == 'mp4v'
+    assert resolve_codec(EncoderPreset('test', ('NONE',))) == 'mp4v'
+    assert container_for(EncoderPreset('test', ('mp4v',))) == '.mp4'
+    
+    assert get_preset('preview').output_size((1920, 1080)) == (640, 360)
+    assert get_preset('capture').output_size((1920, 1080)) == (1920, 1080)
+    with pytest.raises(ValueError):
+        get_preset('ultra')
+
+
+def test_resolved_preset_skips_detection(monkeypatch):
+    """測試已決定編碼器的預設（傳給 worker 行程）不再偵測編碼器"""
+    preset = EncoderPreset('test', ('NONE', 'mp4v')).resolved()
+    assert preset.codec == 'mp4v'
+    
+    def fail():
+        raise AssertionError("不應重新偵測編碼器")
+    
+    monkeypatch.setattr(video_encoders, 'detect_codecs', fail)
+    restored = pickle.loads(pickle.dumps(preset))
+    assert resolve_codec(restored) == 'mp4v'
+    assert container_for(restored.passthrough()) == '.mp4'
+
+
+def test_preset_writer_downscales_and_decimates(tmp_path):
+    """測試預設縮放到指定尺寸並平均降幀，標註處理只套用在輸出的影格"""
+    preset = EncoderPreset('small', ('mp4v',), width=160, height=120, fps=15)
+    path = tmp_path / "small.mp4"
+    writer = PresetWriter(path, preset, (320, 240), 30)
+    assert writer.isOpened()
+    
+    transformed = []
+    
+    def mark(frame):
+        transformed.append(frame.shape)
+        return frame
+    
+    for i in range(30):
+        writer.write(np.full((240, 320, 3), i * 8, dtype=np.uint8), mark)
+    writer.release()
+    
+    assert writer.frame_count == 15
+    assert len(transformed) == 15
+    assert transformed[0] == (120, 160, 3)
+    
+    cap = cv2.VideoCapture(str(path))
+    assert int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) == 160
+    assert cap.get(cv2.CAP_PROP_FPS) == 15
+    cap.release()
+    assert stream_codec(path) == 'mp4v'
+    assert stream_codec(tmp_path / "missing.mp4") is None
+
+
+@pytest.mark.parametrize('annotation_mode', ['burn_in', 'sidecar'])
+def test_merge_with_preview_preset(tmp_path, annotation_mode):
+    """測試以預覽預設匯出：輸出縮小、降幀，時間軸仍對應原片段時間"""
+    segments = [make_segment(tmp_path / f"segment_{i}.mp4", 30, 60 * (i + 1)) for i in range(2)]
+    pose_info = [{'pose_name': 'Tree Pose', 'score': 90, 'feedback': ''},
+                 {'pose_name': 'Warrior II', 'score': 70, 'feedback': ''}]
+    preset = EncoderPreset('preview', ('mp4v',), width=160, height=120, fps=15)
+    output_path = tmp_path / "final.mp4"
+    
+    assert merge_segments_to_final(segments, output_path, pose_info, max_workers=1,
+                                   annotation_mode=annotation_mode, preset=preset)
+    
+    cap = cv2.VideoCapture(str(output_path))
+    assert (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) == (160, 120)
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 30
+    cap.release()
+    
+    timeline = json.loads(timeline_path_for(output_path).read_text(encoding='utf-8'))
+    assert (timeline['width'], timeline['height'], timeline['fps']) == (160, 120, 15)
+    assert [(seg['start_seconds'], seg['end_seconds']) for seg in timeline['segments']] == [(0.0, 1.0), (1.0, 2.0)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
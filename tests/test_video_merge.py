@@ -0,0 +1,155 @@
+"""
+AI 瑜珈教練系統 - 影片合併單元測試
+"""
+
+import json
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from video_processor import (
+    AnnotationOverlay, POSE_CONNECTIONS, add_annotations, draw_pose_landmarks, merge_segments_to_final, render_skeleton,
+    timeline_path_for
+)
+
+
+def make_segment(path, frame_count, value):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 30, (320, 240))
+    for _ in range(frame_count):
+        writer.write(np.full((240, 320, 3), value, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_merge_in_order(tmp_path, max_workers):
+    """測試平行標註後依片段順序串接，並回報進度"""
+    segments = [make_segment(tmp_path / f"segment_{i}.mp4", 20 + i * 10, 60 * (i + 1)) for i in range(3)]
+    pose_info = [{'pose_name': 'Tree Pose', 'score': 80 + i, 'feedback': ''} for i in range(3)]
+    progress = []
+    output_path = tmp_path / "out" / "final.mp4"
+    
+    assert merge_segments_to_final(segments, output_path, pose_info, progress_callback=progress.append,
+                                   max_workers=max_workers)
+    
+    frames = read_frames(output_path)
+    assert len(frames) == 20 + 30 + 40
+    # 標註只覆蓋上方橫幅，下方保留原片段內容
+    bottom = [float(frame[200:, :].mean()) for frame in (frames[0], frames[25], frames[-1])]
+    assert bottom == pytest.approx([60, 120, 180], abs=10)
+    
+    assert progress == sorted(progress)
+    assert progress[-1] == 1.0
+    # 暫存檔已清除，只留下影片與標註時間軸
+    assert sorted(path.name for path in output_path.parent.iterdir()) == ["final.mp4", "final.timeline.json"]
+    timeline = json.loads((output_path.parent / "final.timeline.json").read_text(encoding='utf-8'))
+    assert timeline['annotations_burned_in']
+
+
+def test_sidecar_mode(tmp_path):
+    """測試 sidecar 模式直接串接片段（不繪製標註），標註寫入時間軸"""
+    segments = [make_segment(tmp_path / f"segment_{i}.mp4", 30, 60 * (i + 1)) for i in range(2)]
+    segments.insert(1, tmp_path / "missing.mp4")
+    pose_info = [
+        {'pose_name': 'Tree Pose', 'score': 92, 'feedback': 'good'},
+        {'pose_name': 'Warrior II', 'score': 50, 'feedback': ''},
+        {'pose_name': 'Downward Dog', 'score': 75, 'feedback': 'hips up'},
+    ]
+    output_path = tmp_path / "final.mp4"
+    
+    assert merge_segments_to_final(segments, output_path, pose_info, annotation_mode='sidecar')
+    
+    frames = read_frames(output_path)
+    assert len(frames) == 60
+    # 橫幅區域沒有被繪製
+    assert float(frames[0][:150].mean()) == pytest.approx(60, abs=10)
+    
+    timeline = json.loads(timeline_path_for(output_path).read_text(encoding='utf-8'))
+    assert not timeline['annotations_burned_in']
+    assert timeline['fps'] == 30
+    assert [(seg['index'], seg['pose_name'], seg['start_seconds'], seg['end_seconds'])
+            for seg in timeline['segments']] == [(0, 'Tree Pose', 0.0, 1.0), (2, 'Downward Dog', 1.0, 2.0)]
+    
+    assert not merge_segments_to_final(segments, tmp_path / "bad.mp4", pose_info, annotation_mode='copy')
+
+
+def test_merge_cancelled(tmp_path):
+    """測試取消合併時不產生輸出"""
+    segments = [make_segment(tmp_path / f"segment_{i}.mp4", 30, 100) for i in range(2)]
+    cancel = threading.Event()
+    cancel.set()
+    output_path = tmp_path / "final.mp4"
+    
+    assert not merge_segments_to_final(segments, output_path, [], cancel_event=cancel, max_workers=2)
+    assert not output_path.exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["segment_0.mp4", "segment_1.mp4"]
+
+
+def test_annotation_overlay_in_place():
+    """測試標註圖層只修改橫幅區域，並與 add_annotations 結果相同"""
+    frame = np.random.default_rng(0).integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    expected = add_annotations(frame, 'Tree Pose', 95, 'Keep your back straight')
+    
+    overlay = AnnotationOverlay(320, 240, 'Tree Pose', 95, 'Keep your back straight')
+    target = frame.copy()
+    assert overlay.apply(target) is target
+    np.testing.assert_array_equal(target, expected)
+    
+    # 橫幅外的像素不變；橫幅內沒有文字的位置保留 40% 原始亮度
+    np.testing.assert_array_equal(target[151:], frame[151:])
+    np.testing.assert_array_equal(target[:10], frame[:10])
+    assert abs(int(target[145, 300, 0]) - int(frame[145, 300, 0]) * 0.4) <= 1
+
+
+def test_skeleton_matches_per_joint_drawing():
+    """測試批次繪製骨架與逐條 cv2.line / cv2.circle 的結果相同"""
+    rng = np.random.default_rng(1)
+    landmarks = [
+        {'x': float(x), 'y': float(y), 'z': 0.0, 'visibility': float(v)}
+        for x, y, v in rng.random((33, 3))
+    ]
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    
+    expected = frame.copy()
+    for start, end in POSE_CONNECTIONS:
+        a, b = landmarks[start], landmarks[end]
+        if a['visibility'] > 0.5 and b['visibility'] > 0.5:
+            cv2.line(expected, (int(a['x'] * 320), int(a['y'] * 240)), (int(b['x'] * 320), int(b['y'] * 240)),
+                     (0, 255, 0), 2)
+    for lm in landmarks:
+        if lm['visibility'] > 0.5:
+            cv2.circle(expected, (int(lm['x'] * 320), int(lm['y'] * 240)), 4, (255, 0, 0), -1)
+    
+    result = draw_pose_landmarks(frame, landmarks)
+    np.testing.assert_array_equal(result, expected)
+    assert not frame.any()
+    
+    # 原地繪製到縮小的預覽緩衝區
+    points = np.array([[lm['x'], lm['y'], 0.0, lm['visibility']] for lm in landmarks], dtype=np.float32)
+    preview = np.zeros((120, 160, 3), dtype=np.uint8)
+    assert render_skeleton(preview, points, thickness=1, radius=2) is preview
+    assert preview.any()
+    assert draw_pose_landmarks(frame, landmarks[:10]) is frame
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,182 @@
+"""
+AI 瑜珈教練系統 - 資料庫寫入緩衝單元測試
+"""
+
+import pytest
+import sys
+import time
+from pathlib import Path
+
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+# 將 backend 目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from database import WriteBehindBuffer
+
+
+class RecordingCollection:
+    """記錄 bulk_write 請求的 collection，可指定接下來幾次寫入失敗"""
+    
+    def __init__(self):
+        self.batches = []
+        self.errors = []
+    
+    def bulk_write(self, requests, ordered=True):
+        assert ordered
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(list(requests))
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_flush_merges_operations_per_session():
+    """測試同一 session 的連續 $set / $push 合併，所有 session 在同一個 bulk_write 中寫入"""
+    collection = RecordingCollection()
+    buffer = WriteBehindBuffer(collection, max_ops=100, max_delay=60)
+    buffer.add('s1', 'set', {'session_id': 's1', 'user_id': 'u1', 'poses': []}, upsert=True)
+    buffer.add('s2', 'push', {'segment_id': 1})
+    buffer.add('s1', 'push', {'segment_id': 1})
+    buffer.add('s1', 'push', {'segment_id': 2})
+    buffer.add('s1', 'set', {'avg_score': 80})
+    buffer.add('s1', 'set', {'duration_seconds': 30})
+    assert buffer.pending == 6
+    
+    assert buffer.flush() == 6
+    assert buffer.pending == 0
+    assert collection.batches == [[
+        UpdateOne({'session_id': 's1'}, {'$set': {'session_id': 's1', 'user_id': 'u1', 'poses': []}}, upsert=True),
+        UpdateOne({'session_id': 's1'}, {'$push': {'poses': {'$each': [{'segment_id': 1}, {'segment_id': 2}]}}}),
+        UpdateOne({'session_id': 's1'}, {'$set': {'avg_score': 80, 'duration_seconds': 30}}, upsert=False),
+        UpdateOne({'session_id': 's2'}, {'$push': {'poses': {'segment_id': 1}}}),
+    ]]
+    assert buffer.flush() == 0
+    assert len(collection.batches) == 1
+    buffer.close()
+
+
+def test_flush_for_one_user():
+    """測試歷史查詢前只寫入該使用者（與擁有者不明）的 session，其他使用者的操作繼續累積"""
+    collection = RecordingCollection()
+    buffer = WriteBehindBuffer(collection, max_ops=100, max_delay=60)
+    buffer.add('a1', 'set', {'session_id': 'a1', 'user_id': 'u1'}, upsert=True)
+    buffer.add('b1', 'set', {'session_id': 'b1', 'user_id': 'u2'}, upsert=True)
+    buffer.add('a1', 'push', {'segment_id': 1})
+    buffer.add('b1', 'push', {'segment_id': 1})
+    buffer.add('other', 'push', {'segment_id': 1})
+    
+    assert buffer.flush('u1') == 3
+    assert collection.batches == [[
+        UpdateOne({'session_id': 'a1'}, {'$set': {'session_id': 'a1', 'user_id': 'u1'}}, upsert=True),
+        UpdateOne({'session_id': 'a1'}, {'$push': {'poses': {'segment_id': 1}}}),
+        UpdateOne({'session_id': 'other'}, {'$push': {'poses': {'segment_id': 1}}}),
+    ]]
+    assert buffer.pending == 2
+    assert not buffer.has_pending('a1') and buffer.has_pending('b1')
+    
+    # 已寫入的 session 之後的操作仍知道擁有者
+    buffer.add('a1', 'push', {'segment_id': 2})
+    assert buffer.flush('u2') == 2
+    assert buffer.pending == 1
+    assert buffer.flush() == 1
+    buffer.close()
+
+
+def test_size_and_time_triggers():
+    """測試操作數達上限或等待逾時時由背景執行緒寫入，關閉時寫入剩餘操作"""
+    collection = RecordingCollection()
+    buffer = WriteBehindBuffer(collection, max_ops=3, max_delay=60)
+    for i in range(3):
+        buffer.add(f's{i}', 'push', {'segment_id': i})
+    assert wait_until(lambda: len(collection.batches) == 1)
+    buffer.add('s9', 'push', {'segment_id': 9})
+    buffer.close()
+    assert [len(batch) for batch in collection.batches] == [3, 1]
+    
+    collection = RecordingCollection()
+    buffer = WriteBehindBuffer(collection, max_ops=100, max_delay=0.05)
+    buffer.add('s1', 'push', {'segment_id': 1})
+    assert wait_until(lambda: len(collection.batches) == 1)
+    assert buffer.stats()['flushed'] == 1
+    buffer.close()
+
+
+def test_overlay_sees_unflushed_writes():
+    """測試讀取 session 時套用尚未寫入的操作，且不影響緩衝內容"""
+    buffer = WriteBehindBuffer(RecordingCollection(), max_ops=100, max_delay=60)
+    buffer.add('new', 'set', {'session_id': 'new', 'user_id': 'u1', 'poses': []}, upsert=True)
+    buffer.add('new', 'push', {'segment_id': 1})
+    buffer.add('old', 'push', {'segment_id': 2})
+    buffer.add('missing', 'push', {'segment_id': 3})
+    
+    new = buffer.overlay('new', lambda: None)
+    assert new == {'session_id': 'new', 'user_id': 'u1', 'poses': [{'segment_id': 1}]}
+    new['poses'].append({'segment_id': 99})
+    assert buffer.overlay('new', lambda: None)['poses'] == [{'segment_id': 1}]
+    
+    stored = {'session_id': 'old', 'poses': [{'segment_id': 1}]}
+    assert buffer.overlay('old', lambda: dict(stored))['poses'] == [{'segment_id': 1}, {'segment_id': 2}]
+    # 不存在且沒有 upsert 的 session 維持不存在（與 $push 相同）
+    assert buffer.overlay('missing', lambda: None) is None
+    # 沒有緩衝操作時直接回傳讀取結果
+    assert buffer.overlay('other', lambda: stored) is stored
+    
+    assert buffer.discard('missing') == 1
+    assert buffer.pending == 3
+
+
+def test_failed_writes_are_retried():
+    """測試寫入失敗時保留操作；批次中被拒絕的操作只捨棄該筆"""
+    collection = RecordingCollection()
+    buffer = WriteBehindBuffer(collection, max_ops=100, max_delay=60)
+    buffer.add('s1', 'push', {'segment_id': 1})
+    buffer.add('s2', 'push', {'segment_id': 1})
+    
+    collection.errors.append(AutoReconnect('connection refused'))
+    assert buffer.flush() == 0
+    assert buffer.pending == 2
+    buffer.add('s1', 'set', {'avg_score': 90})
+    
+    # 第 2 個請求（s1 的 $set）被拒絕：第 1 個已寫入，之後的重新排入
+    collection.errors.append(BulkWriteError({'writeErrors': [{'index': 1, 'code': 121, 'errmsg': 'invalid'}]}))
+    assert buffer.flush() == 1
+    assert buffer.pending == 1
+    assert buffer.overlay('s2', lambda: {'session_id': 's2'})['poses'] == [{'segment_id': 1}]
+    
+    assert buffer.flush() == 1
+    assert collection.batches == [[UpdateOne({'session_id': 's2'}, {'$push': {'poses': {'segment_id': 1}}})]]
+    assert buffer.stats()['failed_batches'] == 2
+
+
+
+def test_failed_merged_sets_are_requeued():
+    """測試合併後的 $set 寫入失敗時，所有原始操作都放回緩衝（包含建立 session 的 upsert）"""
+    collection = RecordingCollection()
+    buffer = WriteBehindBuffer(collection, max_ops=100, max_delay=60)
+    buffer.add('s1', 'set', {'session_id': 's1', 'user_id': 'u1', 'poses': []}, upsert=True)
+    buffer.add('s1', 'set', {'avg_score': 90, 'final_video_path': 'final.mp4'})
+    
+    collection.errors.append(AutoReconnect('connection refused'))
+    assert buffer.flush() == 0
+    assert buffer.pending == 2
+    assert buffer.overlay('s1', lambda: None) == {
+        'session_id': 's1', 'user_id': 'u1', 'poses': [], 'avg_score': 90, 'final_video_path': 'final.mp4'
+    }
+    
+    assert buffer.flush() == 2
+    assert collection.batches == [[UpdateOne(
+        {'session_id': 's1'},
+        {'$set': {'session_id': 's1', 'user_id': 'u1', 'poses': [], 'avg_score': 90, 'final_video_path': 'final.mp4'}},
+        upsert=True
+    )]]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])